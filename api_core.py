@@ -0,0 +1,1733 @@
+"""
+Madilu Event Booking System - API Core
+Endpoint handlers and the process-wide state they share
+
+Every front end calls dispatch(): server.py (the development server),
+wsgi_app.py and asgi_app.py. Handlers take the request's query string or
+body and return {'status', 'body'} (or 'stream' or 'raw' bytes) dicts;
+front ends only translate those to and from their own request and
+response objects.
+"""
+
+import time
+
+# Startup is measured from here; see warm_up()
+PROCESS_START = time.perf_counter()
+
+import base64
+import hashlib
+import hmac
+import json
+import urllib.parse
+import os
+import tempfile
+from db_connection import get_db_connection, close_connection, close_pool, load_env, warm_pool, pool_size, pool_stats, pin_to_primary
+from catalog_cache import CatalogCache
+from booking_reference import generate_booking_reference
+from idempotency import IdempotencyStore
+from availability_stream import AvailabilityBroadcaster, StreamClosed
+from sales_analytics import record_sale, query_sales, parse_range, GRANULARITIES
+from view_counter import ViewCounter
+from merchant_cache import MerchantCache
+from venue_index import VenueIndex
+from image_variants import ImageVariants
+from uploads import ImageStore, UploadError
+from seat_inventory import SeatInventory, SeatConflict, load_sections, to_blob
+from ticket_holds import HoldExpiry, new_hold_token, lock_hold, held_quantities, end_hold
+from payment_pipeline import PaymentPipeline, SimulatedProvider, callback_signature
+from receipts import ReceiptService, FORMATS
+from change_feed import ChangeFeed
+from streaming import stream_query, started, csv_chunks, json_chunks, ReleasingStream
+from rate_limiter import create_limiter, retry_after_header
+from load_shedder import create_admission_controller, classify_route, Overloaded
+from datetime import datetime, timedelta
+
+# Server settings below come from the environment, so read .env first.
+# The MySQL driver itself is only imported when warm_up() opens the pool.
+load_env()
+
+# Per-client rate limiting, checked before a request can reach the database
+rate_limiter = create_limiter()
+
+# Bounded in-flight admission per route class
+admission = create_admission_controller()
+
+# Live remaining-ticket counts pushed to /api_availability_stream.py subscribers
+availability = AvailabilityBroadcaster(
+    heartbeat=float(os.getenv('SSE_HEARTBEAT', 15)),
+    max_subscribers=int(os.getenv('SSE_MAX_STREAMS', 5000))
+)
+
+# POST routes whose body front ends pass as an uploads.RequestBody stream
+# instead of reading it into memory
+UPLOAD_ROUTES = ('/api_upload_image.py',)
+
+# POST routes that honour the Idempotency-Key header
+IDEMPOTENT_ROUTES = ('/api_book_ticket.py', '/api_hold_tickets.py', '/api_create_event.py')
+idempotency_store = IdempotencyStore(
+    max_entries=int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 10000)),
+    wait_timeout=float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 10)),
+    retention_hours=int(os.getenv('IDEMPOTENCY_RETENTION_HOURS', 24))
+)
+
+# Event views, counted in memory and flushed to event_view_counts in batches
+view_counter = ViewCounter(
+    shards=int(os.getenv('VIEW_COUNTER_SHARDS', 16)),
+    flush_interval=float(os.getenv('VIEW_FLUSH_INTERVAL', 5))
+)
+
+# DateTime Encoder for JSON
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return super().default(obj)
+
+# API Router
+def handle_request(path, method, headers, post_data=None):
+    """Route request to appropriate handler"""
+    
+    # For GET requests, use query_string from post_data if provided
+    query_string = post_data if method == 'GET' and post_data else ''
+    
+    # For GET requests, also check path for query string (fallback)
+    if method == 'GET' and '?' in path and not query_string:
+        parts = path.split('?', 1)
+        path = parts[0]
+        query_string = parts[1] if len(parts) > 1 else ''
+    
+    # Retried POSTs carrying an Idempotency-Key replay the first response
+    idempotency_key = headers.get('Idempotency-Key') if headers else None
+    if method == 'POST' and idempotency_key and path in IDEMPOTENT_ROUTES:
+        return idempotency_store.run(path, idempotency_key, post_data,
+                                     lambda: route_request(path, method, query_string, post_data, headers))
+    
+    return route_request(path, method, query_string, post_data, headers)
+
+def route_request(path, method, query_string, post_data, headers=None):
+    """Dispatch to the handler for path and method"""
+    
+    # API: Resized image variants
+    if path == '/api_image.py' and method == 'GET':
+        return handle_image(query_string, headers or {})
+    
+    # API: Get Events
+    if path == '/api_get_events.py' and method == 'GET':
+        return handle_get_events(query_string, headers or {})
+    
+    # API: Seat map and seat state
+    if path == '/api_get_seats.py' and method == 'GET':
+        return handle_get_seats(query_string)
+    
+    # API: Best available adjacent seats
+    if path == '/api_best_seats.py' and method == 'GET':
+        return handle_best_seats(query_string)
+    
+    # API: Live availability (Server-Sent Events)
+    if path == '/api_availability_stream.py' and method == 'GET':
+        return handle_availability_stream(query_string)
+    
+    # API: Get Merchant Events
+    if path == '/api_get_merchant_events.py' and method == 'GET':
+        return handle_get_merchant_events(query_string)
+    
+    # API: Sales Analytics
+    if path == '/api_get_sales_analytics.py' and method == 'GET':
+        return handle_get_sales_analytics(query_string)
+    
+    # API: Export Bookings (CSV)
+    if path == '/api_export_bookings.py' and method == 'GET':
+        return handle_export_bookings(query_string)
+    
+    # API: Upload Event Image
+    if path == '/api_upload_image.py' and method == 'POST':
+        return handle_upload_image(post_data, headers or {})
+    
+    # API: Record Event View
+    if path == '/api_record_view.py' and method == 'POST':
+        return handle_record_view(post_data)
+    
+    # API: Create Event
+    if path == '/api_create_event.py' and method == 'POST':
+        return handle_create_event(post_data)
+    
+    # API: Update Event
+    if path == '/api_update_event.py' and method == 'POST':
+        return handle_update_event(post_data)
+    
+    # API: Delete Event
+    if path == '/api_delete_event.py' and method == 'POST':
+        return handle_delete_event(post_data)
+    
+    # API: Register Merchant
+    if path == '/api_register_merchant.py' and method == 'POST':
+        return handle_register_merchant(post_data)
+    
+    # API: Login Merchant
+    if path == '/api_login_merchant.py' and method == 'POST':
+        return handle_login_merchant(post_data)
+    
+    # API: Hold Tickets during checkout
+    if path == '/api_hold_tickets.py' and method == 'POST':
+        return handle_hold_tickets(post_data)
+    
+    # API: Release a Hold
+    if path == '/api_release_hold.py' and method == 'POST':
+        return handle_release_hold(post_data)
+    
+    # API: Book Ticket
+    if path == '/api_book_ticket.py' and method == 'POST':
+        return handle_book_ticket(post_data)
+    
+    # API: Payment Status of a booking
+    if path == '/api_payment_status.py' and method == 'GET':
+        return handle_payment_status(query_string)
+    
+    # API: Payment Provider Callback
+    if path == '/api_payment_callback.py' and method == 'POST':
+        return handle_payment_callback(post_data)
+    
+    # API: Receipt document of a paid booking
+    if path == '/api_receipt.py' and method == 'GET':
+        return handle_receipt(query_string)
+    
+    # API: Email a Receipt
+    if path == '/api_email_receipt.py' and method == 'POST':
+        return handle_email_receipt(post_data)
+    
+    return {'status': 404, 'body': {'success': False, 'message': 'Not found'}}
+
+# Read-your-writes keys: reads made with these go to the primary right
+# after a write (see note_event_write)
+CATALOG_PIN = 'catalog'
+
+def merchant_pin(merchant_id):
+    return f"merchant:{merchant_id}"
+
+def note_event_write(organizer_id):
+    """
+    After a committed event write: pin the catalog and the merchant's
+    own reads to the primary, then drop the cached catalog
+    """
+    pin_to_primary(CATALOG_PIN)
+    pin_to_primary(merchant_pin(organizer_id))
+    catalog_cache.invalidate()
+    merchant_cache.invalidate(organizer_id)
+
+# Change feed: every write records what it changed in change_feed, and
+# each process applies the other processes' changes to its own caches
+change_feed = ChangeFeed(
+    os.getenv('CHANGE_BUS_DIR', os.path.join(tempfile.gettempdir(), 'itech-events-bus')),
+    poll_interval=float(os.getenv('CHANGE_FEED_POLL', 1))
+)
+
+def event_changed(change):
+    """Another process created, updated or deleted an event"""
+    note_event_write(change['organizer_id'])
+    seat_inventory.forget(change['entity_id'])
+
+def tickets_changed(change):
+    """Another process booked, held or released an event's tickets, or settled a payment"""
+    seat_inventory.forget(change['entity_id'])
+    if change['organizer_id'] is not None:
+        merchant_cache.invalidate(change['organizer_id'])
+    conn = get_db_connection()
+    try:
+        publish_availability(conn, change['entity_id'])
+    finally:
+        close_connection(conn)
+
+def merchant_changed(change):
+    merchant_cache.invalidate(change['organizer_id'])
+
+change_feed.subscribe('event', event_changed)
+change_feed.subscribe('booking', tickets_changed)
+change_feed.subscribe('hold', tickets_changed)
+change_feed.subscribe('merchant', merchant_changed)
+
+CATALOG_SQL = """
+    SELECT e.*, v.name as venue_name, v.address, v.city
+    FROM events e
+    JOIN venues v ON e.venue_id = v.id
+    WHERE e.status = 'published' AND e.event_date >= NOW()
+    ORDER BY e.event_date ASC
+"""
+
+# Catalogs with more events than this are streamed from the database
+# instead of being held in the catalog cache
+CATALOG_CACHE_MAX_ROWS = int(os.getenv('CATALOG_CACHE_MAX_ROWS', 5000))
+
+def catalog_rows(offset=0, limit=None):
+    """Yield upcoming published events, formatted for the API, straight from the database"""
+    if limit is None:
+        rows = stream_query(CATALOG_SQL, replica=True, pin=CATALOG_PIN)
+    else:
+        rows = stream_query(CATALOG_SQL + " LIMIT %s OFFSET %s", (limit, offset), replica=True, pin=CATALOG_PIN)
+    try:
+        for event in rows:
+            event['standard_price'] = float(event['standard_price'])
+            event['vip_price'] = float(event['vip_price'])
+            event['event_date_formatted'] = event['event_date'].strftime('%b %d, %Y') if event['event_date'] else ''
+            event['event_date'] = event['event_date'].isoformat() if event['event_date'] else None
+            yield event
+    finally:
+        rows.close()
+
+def load_catalog():
+    """Query and format all upcoming published events; None if there are too many to cache"""
+    rows = catalog_rows()
+    events = []
+    try:
+        for event in rows:
+            if len(events) >= CATALOG_CACHE_MAX_ROWS:
+                return None
+            events.append(event)
+    finally:
+        rows.close()
+    return events
+
+# Published events listing, shared by every request until a write or TTL expiry
+catalog_cache = CatalogCache(load_catalog, ttl=float(os.getenv('CATALOG_TTL', 30)))
+
+# Events per page for paged listings and the bootstrap embedded in index.html
+EVENTS_PAGE_SIZE = int(os.getenv('EVENTS_PAGE_SIZE', 12))
+EVENTS_MAX_PAGE_SIZE = 100
+
+def events_page(offset, limit):
+    """
+    One page of the catalog as {'data', 'total', 'nextOffset'}. Served from
+    the catalog cache; an oversized catalog is paged in SQL, and its total
+    is then unknown (None).
+    """
+    events = catalog_cache.get()
+    if events is not None:
+        page = events[offset:offset + limit]
+        total = len(events)
+        more = offset + len(page) < total
+    else:
+        page = list(catalog_rows(offset, limit + 1))
+        total = None
+        more = len(page) > limit
+        page = page[:limit]
+    return {'data': page, 'total': total, 'nextOffset': offset + len(page) if more else None}
+
+def page_etag(page):
+    """Strong ETag for a page of events, derived from its content"""
+    encoded = json.dumps(page, cls=DateTimeEncoder, sort_keys=True).encode()
+    return '"' + hashlib.sha1(encoded).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value names etag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
+
+def render_index(html):
+    """
+    Embed the first page of events in index.html as JSON, so script.js can
+    draw the catalog without waiting for an API call. If the catalog cannot
+    be read the page is returned unchanged and the client fetches it.
+    """
+    try:
+        page = events_page(0, EVENTS_PAGE_SIZE)
+    except Exception as e:
+        print(f"Catalog bootstrap skipped: {e}")
+        return html
+    # The client keeps this page, and revalidates it with the ETag
+    page['etag'] = page_etag(page)
+    # Escaping '<' keeps '</script>' in event text from ending the element
+    data = json.dumps(page, cls=DateTimeEncoder).replace('<', '\\u003c')
+    tag = f'<script id="catalogBootstrap" type="application/json">{data}</script>\n'
+    return html.replace('</body>', tag + '</body>', 1)
+
+def handle_get_events(query_string='', headers=None):
+    """
+    Handle GET /api_get_events.py - all events, or one page with
+    ?offset=&limit=. Pages carry an ETag and honour If-None-Match.
+    """
+    params = urllib.parse.parse_qs(query_string)
+    if 'offset' in params or 'limit' in params:
+        try:
+            offset = max(0, int(params.get('offset', ['0'])[0]))
+            limit = min(max(1, int(params.get('limit', [str(EVENTS_PAGE_SIZE)])[0])), EVENTS_MAX_PAGE_SIZE)
+        except ValueError:
+            return {'status': 400, 'body': {'success': False, 'message': 'Invalid offset or limit'}}
+        try:
+            page = events_page(offset, limit)
+        except Exception as e:
+            return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+        
+        etag = page_etag(page)
+        cache_headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches((headers or {}).get('If-None-Match'), etag):
+            return {'status': 304, 'raw': b'', 'headers': cache_headers}
+        return {'status': 200, 'body': {'success': True, **page}, 'headers': cache_headers}
+    
+    try:
+        events = catalog_cache.get()
+        if events is not None:
+            return {'status': 200, 'body': {'success': True, 'data': events}}
+        
+        # Too large to cache: encode rows as they arrive from the database
+        rows = started(catalog_rows())
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+    
+    return {'status': 200, 'stream': json_chunks(rows, cls=DateTimeEncoder),
+            'headers': {'Content-Type': 'application/json'}}
+
+# Resized WebP/AVIF copies of images/ and uploads/ files, cached on disk under image_cache/
+image_variants = ImageVariants(source_dirs=('images', 'uploads'),
+                               cache_dir=os.getenv('IMAGE_CACHE_DIR', 'image_cache'))
+
+# Uploaded event images, stored once per distinct content
+image_store = ImageStore(max_bytes=int(os.getenv('UPLOAD_MAX_BYTES', 5 * 1024 * 1024)))
+
+def handle_upload_image(body, headers):
+    """Handle POST /api_upload_image.py - multipart 'image' field, streamed to uploads/"""
+    try:
+        stored = image_store.save_upload(body, headers.get('Content-Type', ''))
+    except UploadError as e:
+        return {'status': e.status, 'body': {'success': False, 'message': str(e)}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+    
+    return {'status': 200, 'body': {
+        'success': True,
+        'message': 'Image uploaded successfully',
+        'data': stored
+    }}
+
+def handle_image(query_string, headers):
+    """Handle GET /api_image.py?src=images/x.jpg&w=320 - best image variant for the client"""
+    params = urllib.parse.parse_qs(query_string)
+    src = params.get('src', [''])[0]
+    try:
+        width = int(params.get('w', ['0'])[0])
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid width'}}
+    
+    try:
+        variant = image_variants.get(src, width, headers.get('Accept', ''))
+    except FileNotFoundError:
+        return {'status': 404, 'body': {'success': False, 'message': 'Image not found'}}
+    except Exception as e:
+        print(f"Image variant failed for {src}: {e}")
+        return {'status': 500, 'body': {'success': False, 'message': 'Could not process image'}}
+    
+    cache_headers = {
+        'ETag': variant.etag,
+        'Cache-Control': 'public, max-age=86400',
+        'Vary': 'Accept'
+    }
+    if etag_matches(headers.get('If-None-Match'), variant.etag):
+        return {'status': 304, 'raw': b'', 'headers': cache_headers}
+    with open(variant.path, 'rb') as f:
+        data = f.read()
+    cache_headers['Content-Type'] = variant.content_type
+    return {'status': 200, 'raw': data, 'headers': cache_headers}
+
+def handle_record_view(post_data):
+    """Handle POST /api_record_view.py - count one view of a published event"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        event_id = int(data.get('eventId', ['0'])[0])
+        
+        # Only count published events, so arbitrary ids cannot grow the counter
+        catalog = catalog_cache.get()
+        if catalog is not None:
+            published = any(event['id'] == event_id for event in catalog)
+        else:
+            conn = get_db_connection(replica=True)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM events WHERE id = %s AND status = 'published'", (event_id,))
+                published = cursor.fetchone() is not None
+            finally:
+                close_connection(conn)
+        if not published:
+            return {'status': 404, 'body': {'success': False, 'message': 'Event not found'}}
+        
+        view_counter.record(event_id)
+        return {'status': 202, 'body': {'success': True}}
+    
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_create_event(post_data):
+    """Handle POST /api_create_event.py"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        required_fields = ['organizerId', 'title', 'description', 'category', 'eventDate', 'standardPrice', 'vipPrice']
+        for field in required_fields:
+            if field not in data:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        organizer_id = int(data['organizerId'])
+        venue_id = data.get('venueId')
+        venue_name = data.get('venueName', '')
+        title = data['title']
+        description = data['description']
+        category = data['category']
+        event_date = data['eventDate']
+        standard_price = float(data['standardPrice'])
+        vip_price = float(data['vipPrice'])
+        image_url = data.get('imageUrl', '')
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            
+            # Verify organizer
+            cursor.execute("SELECT id, user_type FROM users WHERE id = %s AND user_type = 'organizer'", (organizer_id,))
+            if not cursor.fetchone():
+                return {'status': 400, 'body': {'success': False, 'message': 'Organizer not found'}}
+            
+            # Use the given venue id if it exists, otherwise the venue by name
+            # (created if needed, or the shared default venue when unnamed)
+            if venue_id and str(venue_id).isdigit() and venue_index.exists(int(venue_id)):
+                venue_id = int(venue_id)
+            else:
+                venue_id = venue_index.resolve(venue_name)
+            
+            # Insert event
+            cursor.execute("""
+                INSERT INTO events (organizer_id, venue_id, title, description, category, event_date, standard_price, vip_price, image_url, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'published')
+            """, (organizer_id, venue_id, title, description, category, event_date, standard_price, vip_price, image_url))
+            
+            event_id = cursor.lastrowid
+            
+            # Insert ticket types
+            cursor.execute("""
+                INSERT INTO ticket_types (event_id, type_name, price, available_quantity, sold_quantity)
+                VALUES (%s, 'standard', %s, 1000, 0), (%s, 'vip', %s, 100, 0)
+            """, (event_id, standard_price, event_id, vip_price))
+            change_feed.record(cursor, 'event', event_id, organizer_id)
+            
+            conn.commit()
+        finally:
+            close_connection(conn)
+        change_feed.notify()
+        note_event_write(organizer_id)
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Event created successfully',
+            'data': {'eventId': event_id, 'title': title, 'eventDate': event_date}
+        }}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_register_merchant(post_data):
+    """Handle POST /api_register_merchant.py"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        required_fields = ['fullName', 'email', 'phone', 'idNumber', 'password', 'companyName']
+        for field in required_fields:
+            if field not in data or not data[field]:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        full_name = data['fullName']
+        email = data['email']
+        phone = data['phone']
+        id_number = data['idNumber']
+        password = data['password']
+        company_name = data['companyName']
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            
+            # Check email exists
+            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
+            if cursor.fetchone():
+                return {'status': 400, 'body': {'success': False, 'message': 'Email already registered'}}
+            
+            # Insert user
+            cursor.execute("""
+                INSERT INTO users (full_name, email, phone, id_number, password, user_type)
+                VALUES (%s, %s, %s, %s, %s, 'organizer')
+            """, (full_name, email, phone, id_number, password))
+            
+            user_id = cursor.lastrowid
+            change_feed.record(cursor, 'merchant', organizer_id=user_id)
+            conn.commit()
+        finally:
+            close_connection(conn)
+        change_feed.notify()
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Merchant registered successfully',
+            'data': {'id': user_id, 'fullName': full_name, 'email': email, 'companyName': company_name, 'userType': 'organizer'}
+        }}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_login_merchant(post_data):
+    """Handle POST /api_login_merchant.py"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        required_fields = ['email', 'password']
+        for field in required_fields:
+            if field not in data:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        email = data['email']
+        password = data['password']
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            
+            # Verify merchant credentials
+            cursor.execute("""
+                SELECT id, full_name, email, phone, user_type 
+                FROM users 
+                WHERE email = %s AND password = %s AND user_type = 'organizer'
+            """, (email, password))
+            
+            merchant = cursor.fetchone()
+        finally:
+            close_connection(conn)
+        
+        if not merchant:
+            return {'status': 401, 'body': {'success': False, 'message': 'Invalid email or password'}}
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Login successful',
+            'data': {
+                'id': merchant['id'],
+                'fullName': merchant['full_name'],
+                'email': merchant['email'],
+                'phone': merchant['phone'],
+                'userType': merchant['user_type']
+            }
+        }}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def load_merchant_events(merchant_id):
+    """
+    Query a merchant's events with sales and views. Returns the events and,
+    per event, how many views this process had recorded at load time.
+    """
+    conn = get_db_connection(replica=True, pin=merchant_pin(merchant_id))
+    try:
+        cursor = conn.cursor(dictionary=True)
+        
+        # Get all events for this merchant
+        cursor.execute("""
+            SELECT e.*, v.name as venue_name, v.address, v.city, COALESCE(vc.views, 0) as views
+            FROM events e
+            LEFT JOIN venues v ON e.venue_id = v.id
+            LEFT JOIN event_view_counts vc ON vc.event_id = e.id
+            WHERE e.organizer_id = %s
+            ORDER BY e.created_at DESC
+        """, (merchant_id,))
+        
+        events = cursor.fetchall()
+        view_marks = {}
+
+        # Get ticket sales for each event
+        for event in events:
+            event['standard_price'] = float(event['standard_price'])
+            event['vip_price'] = float(event['vip_price'])
+            event['event_date'] = event['event_date'].isoformat() if event['event_date'] else None
+            event['created_at'] = event['created_at'].isoformat() if event['created_at'] else None
+
+            # Get ticket sales count; declined payments are not sales, pending ones
+            # count as they do in sold_quantity and the rollups
+            cursor.execute("""
+                SELECT SUM(bt.quantity) as total_sold
+                FROM booking_tickets bt
+                JOIN ticket_types tt ON bt.ticket_type_id = tt.id
+                JOIN bookings b ON b.id = bt.booking_id
+                WHERE tt.event_id = %s AND b.payment_status <> 'failed'
+            """, (event['id'],))
+            
+            ticket_sales = cursor.fetchone()
+            event['tickets_sold'] = ticket_sales['total_sold'] or 0
+
+            # Calculate revenue
+            event['revenue'] = float(event['standard_price']) * event['tickets_sold']
+            # Flushed views plus those still waiting in memory
+            event['views'] = int(event['views']) + view_counter.pending(event['id'])
+            view_marks[event['id']] = view_counter.recorded(event['id'])
+    finally:
+        close_connection(conn)
+    return events, view_marks
+
+# Venue name/id lookups for event writes, loaded by warm_up()
+venue_index = VenueIndex()
+
+# Merchant events responses, invalidated by the merchant's writes and bookings
+merchant_cache = MerchantCache(
+    max_bytes=int(os.getenv('MERCHANT_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    ttl=float(os.getenv('MERCHANT_CACHE_TTL', 60))
+)
+
+def handle_get_merchant_events(query_string):
+    """Handle GET /api_get_merchant_events.py"""
+    try:
+        # Parse query parameters
+        params = urllib.parse.parse_qs(query_string)
+        merchant_id = params.get('merchantId', [None])[0]
+
+        if not merchant_id:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing merchantId parameter'}}
+        merchant_id = int(merchant_id)
+
+        events, view_marks = merchant_cache.get(merchant_id, lambda: load_merchant_events(merchant_id))
+        
+        # Views keep counting while the entry is cached; add those since it was loaded
+        events = [dict(event, views=event['views'] + view_counter.recorded(event['id']) - view_marks[event['id']])
+                  for event in events]
+        
+        return {'status': 200, 'body': {'success': True, 'data': events}}
+    
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid merchantId parameter'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+# Columns of the bookings export as (CSV header, row key)
+EXPORT_COLUMNS = [
+    ('Booking Reference', 'booking_reference'),
+    ('Event', 'event_title'),
+    ('Booked At', 'created_at'),
+    ('Full Name', 'full_name'),
+    ('Email', 'email'),
+    ('Phone', 'phone'),
+    ('Ticket Type', 'type_name'),
+    ('Quantity', 'quantity'),
+    ('Unit Price', 'unit_price'),
+    ('Subtotal', 'subtotal'),
+    ('Payment Status', 'payment_status'),
+]
+
+def handle_export_bookings(query_string):
+    """Handle GET /api_export_bookings.py - stream a merchant's bookings as CSV"""
+    params = urllib.parse.parse_qs(query_string)
+    try:
+        merchant_id = int(params.get('merchantId', ['0'])[0])
+        event_id = int(params.get('eventId', ['0'])[0])
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid merchantId or eventId'}}
+    
+    if not merchant_id:
+        return {'status': 400, 'body': {'success': False, 'message': 'Missing merchantId parameter'}}
+    
+    sql = """
+        SELECT b.booking_reference, e.title AS event_title, b.created_at, b.full_name, b.email,
+               b.phone, tt.type_name, bt.quantity, bt.unit_price, bt.subtotal, b.payment_status
+        FROM bookings b
+        JOIN events e ON e.id = b.event_id
+        JOIN booking_tickets bt ON bt.booking_id = b.id
+        JOIN ticket_types tt ON tt.id = bt.ticket_type_id
+        WHERE e.organizer_id = %s
+    """
+    sql_params = [merchant_id]
+    if event_id:
+        sql += " AND b.event_id = %s"
+        sql_params.append(event_id)
+    sql += " ORDER BY b.id, bt.id"
+    
+    try:
+        rows = started(stream_query(sql, tuple(sql_params), replica=True, pin=merchant_pin(merchant_id)))
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+    
+    filename = f"bookings-event-{event_id}.csv" if event_id else f"bookings-merchant-{merchant_id}.csv"
+    return {'status': 200, 'stream': csv_chunks(EXPORT_COLUMNS, rows), 'headers': {
+        'Content-Type': 'text/csv; charset=utf-8',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store'
+    }}
+
+def handle_get_sales_analytics(query_string):
+    """Handle GET /api_get_sales_analytics.py"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        merchant_id = params.get('merchantId', [None])[0]
+        granularity = params.get('granularity', ['day'])[0]
+        event_id = params.get('eventId', [None])[0]
+        
+        if not merchant_id:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing merchantId parameter'}}
+        if granularity not in GRANULARITIES:
+            return {'status': 400, 'body': {'success': False, 'message': 'granularity must be hour or day'}}
+        try:
+            start_at, end_at = parse_range(granularity, params.get('from', [None])[0], params.get('to', [None])[0])
+        except ValueError:
+            return {'status': 400, 'body': {'success': False, 'message': 'from/to must be ISO dates'}}
+        
+        conn = get_db_connection(replica=True, pin=merchant_pin(merchant_id))
+        try:
+            cursor = conn.cursor(dictionary=True)
+            analytics = query_sales(cursor, merchant_id, granularity, start_at, end_at, event_id)
+        finally:
+            close_connection(conn)
+        
+        return {'status': 200, 'body': {'success': True, 'data': analytics}}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_update_event(post_data):
+    """Handle POST /api_update_event.py"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        required_fields = ['eventId', 'title', 'description', 'category', 'eventDate', 'standardPrice', 'vipPrice']
+        for field in required_fields:
+            if field not in data:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        event_id = data['eventId']
+        title = data['title']
+        description = data['description']
+        category = data['category']
+        event_date = data['eventDate']
+        standard_price = float(data['standardPrice'])
+        vip_price = float(data['vipPrice'])
+        venue_name = data.get('venueName', '')
+        status = data.get('status', 'published')
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            
+            # Verify event exists
+            cursor.execute("SELECT id, organizer_id, venue_id FROM events WHERE id = %s", (event_id,))
+            event = cursor.fetchone()
+            
+            if not event:
+                return {'status': 404, 'body': {'success': False, 'message': 'Event not found'}}
+            
+            # Handle venue update
+            if venue_name:
+                venue_id = venue_index.resolve(venue_name)
+            else:
+                venue_id = event['venue_id']
+            
+            # Update event
+            cursor.execute("""
+                UPDATE events 
+                SET title = %s, description = %s, category = %s, event_date = %s,
+                    standard_price = %s, vip_price = %s, venue_id = %s, status = %s
+                WHERE id = %s
+            """, (title, description, category, event_date, standard_price, vip_price, venue_id, status, event_id))
+            change_feed.record(cursor, 'event', event_id, event['organizer_id'])
+            
+            conn.commit()
+        finally:
+            close_connection(conn)
+        change_feed.notify()
+        note_event_write(event['organizer_id'])
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Event updated successfully',
+            'data': {'eventId': event_id, 'title': title, 'status': status}
+        }}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_delete_event(post_data):
+    """Handle POST /api_delete_event.py"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        if 'eventId' not in data:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing eventId parameter'}}
+        
+        event_id = data['eventId']
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            
+            # Verify event exists
+            cursor.execute("SELECT id, title, organizer_id FROM events WHERE id = %s", (event_id,))
+            event = cursor.fetchone()
+            
+            if not event:
+                return {'status': 404, 'body': {'success': False, 'message': 'Event not found'}}
+            
+            # Delete related booking tickets
+            cursor.execute("""
+                DELETE bt FROM booking_tickets bt
+                JOIN ticket_types tt ON bt.ticket_type_id = tt.id
+                WHERE tt.event_id = %s
+            """, (event_id,))
+            
+            # Delete ticket holds, whatever their status, and the seat state
+            cursor.execute("SELECT id FROM ticket_holds WHERE event_id = %s", (event_id,))
+            hold_ids = [row['id'] for row in cursor.fetchall()]
+            cursor.execute("""
+                DELETE hs FROM ticket_hold_seats hs
+                JOIN ticket_holds h ON hs.hold_id = h.id
+                WHERE h.event_id = %s
+            """, (event_id,))
+            cursor.execute("DELETE FROM ticket_holds WHERE event_id = %s", (event_id,))
+            cursor.execute("DELETE FROM event_seat_state WHERE event_id = %s", (event_id,))
+            
+            # Delete ticket types
+            cursor.execute("DELETE FROM ticket_types WHERE event_id = %s", (event_id,))
+            
+            # Delete the event
+            cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+            change_feed.record(cursor, 'event', event['id'], event['organizer_id'])
+            
+            conn.commit()
+        finally:
+            close_connection(conn)
+        for hold_id in hold_ids:
+            hold_expiry.cancel(hold_id)
+        seat_inventory.forget(event['id'])
+        change_feed.notify()
+        note_event_write(event['organizer_id'])
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Event deleted successfully',
+            'data': {'eventId': event_id, 'title': event['title']}
+        }}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+# Reserved seating: seat maps plus per-event sold/held bitsets, cached
+# briefly for searches; bookings lock and re-check them
+seat_inventory = SeatInventory(ttl=float(os.getenv('SEAT_STATE_TTL', 2)))
+
+MAX_SEATS_PER_BOOKING = 20
+
+def parse_seats(value):
+    """'12,13,14' -> [12, 13, 14]"""
+    return [int(seat) for seat in value.split(',') if seat.strip()]
+
+def handle_get_seats(query_string):
+    """Handle GET /api_get_seats.py - an event's sections with sold/held bitsets"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        event_id = int(params.get('eventId', [''])[0])
+        sections, state = seat_inventory.event_state(event_id)
+        data = []
+        for section in sections:
+            sold, held = state.get(section.id, (0, 0))
+            entry = section.as_dict()
+            entry.update({
+                'available': seat_inventory.free_seats(section, state).bit_count(),
+                # Bit i (little-endian, base64) is seat i
+                'sold': base64.b64encode(to_blob(sold, section.size)).decode('ascii'),
+                'held': base64.b64encode(to_blob(held, section.size)).decode('ascii')
+            })
+            data.append(entry)
+        return {'status': 200, 'body': {'success': True, 'data': {'eventId': event_id, 'sections': data}}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId parameter'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_best_seats(query_string):
+    """Handle GET /api_best_seats.py - best block of count adjacent free seats"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        event_id = int(params.get('eventId', [''])[0])
+        count = int(params.get('count', ['1'])[0])
+        section_id = params.get('sectionId', [''])[0]
+        section_id = int(section_id) if section_id else None
+        ticket_type = params.get('ticketType', [''])[0] or None
+        if not 1 <= count <= MAX_SEATS_PER_BOOKING:
+            return {'status': 400, 'body': {'success': False, 'message': f'count must be between 1 and {MAX_SEATS_PER_BOOKING}'}}
+        
+        found = seat_inventory.best_available(event_id, count, section_id, ticket_type)
+        if found is None:
+            return {'status': 404, 'body': {'success': False, 'message': f'No {count} adjacent seats available'}}
+        section, seats = found
+        return {'status': 200, 'body': {'success': True, 'data': {
+            'sectionId': section.id,
+            'section': section.name,
+            'ticketType': section.ticket_type,
+            'seats': seats,
+            'labels': [section.label(seat) for seat in seats]
+        }}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId, count or sectionId'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+class OrderError(Exception):
+    """A booking or hold that cannot be made; status is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_order(data):
+    """
+    (event id, {'standard': n, 'vip': n}, section id, seats) from a
+    booking or hold form. Raises ValueError or OrderError.
+    """
+    event_id = int(data['eventId'])
+    requested = {'standard': int(data.get('standardQty', 0)), 'vip': int(data.get('vipQty', 0))}
+    
+    # Optional chosen seats (one section); otherwise seated tickets are assigned
+    chosen_section = int(data['sectionId']) if data.get('sectionId') else None
+    chosen_seats = parse_seats(data.get('seats', ''))
+    if bool(chosen_section) != bool(chosen_seats) or len(chosen_seats) > MAX_SEATS_PER_BOOKING:
+        raise OrderError(400, f'Choose 1 to {MAX_SEATS_PER_BOOKING} seats in one section')
+    
+    if min(requested.values()) < 0 or (sum(requested.values()) == 0 and not chosen_seats):
+        raise OrderError(400, 'At least one ticket required')
+    return event_id, requested, chosen_section, chosen_seats
+
+def load_order(cursor, event_id, requested, chosen_section=None, chosen_seats=()):
+    """
+    Check an order against the event, its seat map and ticket types.
+    Chosen seats become the requested quantity of their section's type.
+    Returns (event, sections, ticket_types, chosen) where chosen is
+    (section, seats) or None. Raises OrderError.
+    """
+    cursor.execute("SELECT id, organizer_id, title FROM events WHERE id = %s AND status = 'published'", (event_id,))
+    event = cursor.fetchone()
+    if not event:
+        raise OrderError(400, 'Event not found or not available')
+    
+    # Seated ticket types come from the venue's seat map, if it has one
+    sections = load_sections(cursor, event_id)
+    chosen = None
+    if chosen_seats:
+        section = next((sec for sec in sections if sec.id == chosen_section), None)
+        if section is None:
+            raise OrderError(400, 'Unknown section for this event')
+        try:
+            section.mask(chosen_seats)
+        except ValueError as e:
+            raise OrderError(400, str(e))
+        requested[section.ticket_type] = len(chosen_seats)
+        chosen = (section, chosen_seats)
+    
+    # Price the order from the ticket types, never from the client
+    cursor.execute("SELECT id, type_name, price FROM ticket_types WHERE event_id = %s", (event_id,))
+    ticket_types = {tt['type_name']: tt for tt in cursor.fetchall()}
+    for type_name, quantity in requested.items():
+        if quantity > 0 and type_name not in ticket_types:
+            raise OrderError(400, f'No {type_name} tickets for this event')
+    return event, sections, ticket_types, chosen
+
+def order_total(ticket_types, requested):
+    return sum(quantity * float(ticket_types[type_name]['price'])
+               for type_name, quantity in requested.items() if quantity > 0)
+
+def reserve_tickets(cursor, event_id, sections, ticket_types, requested, chosen, hold=False):
+    """
+    Take the requested tickets out of stock inside the caller's
+    transaction: into sold_quantity for a booking, or held_quantity for a
+    hold, with seats at seated venues claimed the same way. Returns the
+    seats as [(section, seats)]. Raises OrderError if anything ran out.
+    """
+    column = 'held_quantity' if hold else 'sold_quantity'
+    for type_name, quantity in requested.items():
+        if quantity <= 0:
+            continue
+        # Claim stock atomically; fails if another booking or hold took it first
+        cursor.execute(f"""
+            UPDATE ticket_types SET {column} = {column} + %s
+            WHERE id = %s AND available_quantity - sold_quantity - held_quantity >= %s
+        """, (quantity, ticket_types[type_name]['id'], quantity))
+        if cursor.rowcount == 0:
+            raise OrderError(409, f"Not enough {type_name} tickets left")
+    
+    assigned = []
+    try:
+        for type_name, quantity in requested.items():
+            typed = [sec for sec in sections if sec.ticket_type == type_name]
+            if quantity <= 0 or not typed:
+                continue
+            if chosen and chosen[0].ticket_type == type_name:
+                seat_inventory.claim(cursor, event_id, chosen[0], chosen[1], hold=hold)
+                assigned.append(chosen)
+            else:
+                assigned.append(seat_inventory.claim_best(cursor, event_id, typed, quantity, hold=hold))
+    except SeatConflict as e:
+        seat_inventory.forget(event_id)
+        raise OrderError(409, str(e))
+    return assigned
+
+def seat_summary(assigned):
+    return [{'sectionId': sec.id, 'section': sec.name, 'seats': [sec.label(seat) for seat in seats]}
+            for sec, seats in assigned]
+
+# Checkout holds: tickets kept for HOLD_TTL seconds while the customer
+# pays, expired by a timer heap rather than by scanning ticket_holds
+HOLD_TTL = int(os.getenv('HOLD_TTL', 600))
+
+def expire_hold(hold_id):
+    """Return an expired hold's tickets to stock (called by hold_expiry)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        hold = lock_hold(cursor, hold_id=hold_id)
+        if hold is None or hold['status'] != 'active':
+            return
+        end_hold(cursor, hold, 'expired', load_sections(cursor, hold['event_id']))
+        change_feed.record(cursor, 'hold', hold['event_id'])
+        conn.commit()
+        change_feed.notify()
+        seat_inventory.forget(hold['event_id'])
+        publish_availability(conn, hold['event_id'])
+    finally:
+        close_connection(conn)
+
+hold_expiry = HoldExpiry(expire_hold, sweep_interval=float(os.getenv('HOLD_SWEEP_INTERVAL', 30)))
+
+def handle_hold_tickets(post_data):
+    """Handle POST /api_hold_tickets.py - hold tickets (and seats) during checkout"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        if 'eventId' not in data:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing required field: eventId'}}
+        event_id, requested, chosen_section, chosen_seats = parse_order(data)
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            event, sections, ticket_types, chosen = load_order(cursor, event_id, requested, chosen_section, chosen_seats)
+            
+            token = new_hold_token()
+            expires_at = datetime.now().replace(microsecond=0) + timedelta(seconds=HOLD_TTL)
+            cursor.execute("""
+                INSERT INTO ticket_holds (hold_token, event_id, standard_qty, vip_qty, expires_at)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (token, event_id, requested['standard'], requested['vip'], expires_at))
+            hold_id = cursor.lastrowid
+            
+            assigned = reserve_tickets(cursor, event_id, sections, ticket_types, requested, chosen, hold=True)
+            if assigned:
+                cursor.executemany("""
+                    INSERT INTO ticket_hold_seats (hold_id, section_id, seat_index) VALUES (%s, %s, %s)
+                """, [(hold_id, sec.id, seat) for sec, seats in assigned for seat in seats])
+            change_feed.record(cursor, 'hold', event_id)
+            
+            conn.commit()
+            change_feed.notify()
+            hold_expiry.schedule(hold_id, expires_at.timestamp())
+            if assigned:
+                seat_inventory.forget(event_id)
+            publish_availability(conn, event_id)
+        finally:
+            # Rolls back anything left uncommitted by an OrderError
+            close_connection(conn)
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Tickets held',
+            'data': {
+                'holdToken': token,
+                'expiresAt': expires_at,
+                'ttlSeconds': HOLD_TTL,
+                'totalAmount': order_total(ticket_types, requested),
+                'eventTitle': event['title'],
+                'tickets': requested,
+                'seats': seat_summary(assigned)
+            }
+        }}
+    
+    except OrderError as e:
+        return {'status': e.status, 'body': {'success': False, 'message': str(e)}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId, ticket quantity or seat'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_release_hold(post_data):
+    """Handle POST /api_release_hold.py - give held tickets back before the hold expires"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        token = data.get('holdToken', [''])[0]
+        if not token:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing required field: holdToken'}}
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            hold = lock_hold(cursor, token=token)
+            if hold is None:
+                return {'status': 404, 'body': {'success': False, 'message': 'Hold not found'}}
+            if hold['status'] == 'active':
+                end_hold(cursor, hold, 'released', load_sections(cursor, hold['event_id']))
+                change_feed.record(cursor, 'hold', hold['event_id'])
+                conn.commit()
+                change_feed.notify()
+                hold_expiry.cancel(hold['id'])
+                seat_inventory.forget(hold['event_id'])
+                publish_availability(conn, hold['event_id'])
+        finally:
+            close_connection(conn)
+        
+        return {'status': 200, 'body': {'success': True, 'message': 'Hold released'}}
+    
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def take_hold(conn, cursor, token, event_id):
+    """
+    Lock the active hold a booking is confirming. A hold past its expiry
+    is expired on the spot. Returns the hold row; raises OrderError.
+    """
+    hold = lock_hold(cursor, token=token)
+    if hold is None or hold['event_id'] != event_id:
+        raise OrderError(404, 'Hold not found')
+    if hold['status'] == 'active' and hold['expires_at'] <= datetime.now():
+        end_hold(cursor, hold, 'expired', load_sections(cursor, event_id))
+        change_feed.record(cursor, 'hold', event_id)
+        conn.commit()
+        change_feed.notify()
+        hold_expiry.cancel(hold['id'])
+        seat_inventory.forget(event_id)
+        publish_availability(conn, event_id)
+        hold['status'] = 'expired'
+    if hold['status'] != 'active':
+        raise OrderError(410, f"Your ticket hold has {'expired' if hold['status'] == 'expired' else 'ended'}, please start again")
+    return hold
+
+def handle_book_ticket(post_data):
+    """
+    Handle POST /api_book_ticket.py. With holdToken the held tickets and
+    seats are booked; otherwise the requested ones are taken from stock.
+    """
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        
+        required_fields = ['eventId', 'fullName', 'email', 'phone', 'idNumber']
+        for field in required_fields:
+            if field not in data:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        full_name = data['fullName']
+        email = data['email']
+        phone = data['phone']
+        id_number = data['idNumber']
+        payment_method = data.get('paymentMethod', 'mpesa')
+        hold_token = data.get('holdToken')
+        if hold_token:
+            event_id = int(data['eventId'])
+        else:
+            event_id, requested, chosen_section, chosen_seats = parse_order(data)
+        
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            if hold_token:
+                hold = take_hold(conn, cursor, hold_token, event_id)
+                requested = held_quantities(hold)
+                event, sections, ticket_types, chosen = load_order(cursor, event_id, requested)
+            else:
+                event, sections, ticket_types, chosen = load_order(cursor, event_id, requested, chosen_section, chosen_seats)
+            total_amount = order_total(ticket_types, requested)
+            
+            # Book under the customer's account, creating it on first booking
+            cursor.execute("""
+                INSERT INTO users (full_name, email, phone, id_number, password, user_type)
+                VALUES (%s, %s, %s, %s, '', 'customer')
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """, (full_name, email, phone, id_number))
+            user_id = cursor.lastrowid
+            
+            # Generate booking reference (unique by construction, no retry needed)
+            ref = generate_booking_reference()
+            
+            # Insert booking; it stays pending until the provider reports back
+            cursor.execute("""
+                INSERT INTO bookings (user_id, event_id, booking_reference, full_name, email, phone, id_number, total_amount, payment_method, payment_status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending')
+            """, (user_id, event_id, ref, full_name, email, phone, id_number, total_amount, payment_method))
+            
+            booking_id = cursor.lastrowid
+            cursor.execute("""
+                INSERT INTO payments (booking_id, amount, payment_method, payment_status)
+                VALUES (%s, %s, %s, 'pending')
+            """, (booking_id, total_amount, payment_method))
+            payment_id = cursor.lastrowid
+            
+            # Held tickets and seats become sold in one step; without a hold
+            # they are claimed now
+            if hold_token:
+                assigned = end_hold(cursor, hold, 'booked', sections, booking_id)
+            else:
+                assigned = reserve_tickets(cursor, event_id, sections, ticket_types, requested, chosen)
+            
+            for type_name, quantity in requested.items():
+                if quantity <= 0:
+                    continue
+                tt = ticket_types[type_name]
+                unit_price = float(tt['price'])
+                cursor.execute("""
+                    INSERT INTO booking_tickets (booking_id, ticket_type_id, quantity, unit_price, subtotal)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (booking_id, tt['id'], quantity, unit_price, quantity * unit_price))
+                
+                # Keep the dashboard's hourly/daily rollups current in the same transaction
+                record_sale(cursor, event['organizer_id'], event_id, type_name, quantity, quantity * unit_price)
+            
+            if assigned:
+                cursor.executemany("""
+                    INSERT INTO booking_seats (booking_id, section_id, seat_index) VALUES (%s, %s, %s)
+                """, [(booking_id, sec.id, seat) for sec, seats in assigned for seat in seats])
+            change_feed.record(cursor, 'booking', event_id, event['organizer_id'])
+            
+            conn.commit()
+            change_feed.notify()
+            # The provider is called from the payment worker, never from here
+            payment_pipeline.submit(payment_id)
+            if hold_token:
+                hold_expiry.cancel(hold['id'])
+            if assigned:
+                seat_inventory.forget(event_id)
+            publish_availability(conn, event_id)
+        finally:
+            # Rolls back anything left uncommitted by an OrderError
+            close_connection(conn)
+        merchant_cache.invalidate(event['organizer_id'])
+        
+        return {'status': 200, 'body': {
+            'success': True,
+            'message': 'Booking received, awaiting payment',
+            'data': {
+                'bookingReference': ref,
+                'bookingId': booking_id,
+                'paymentId': payment_id,
+                'paymentStatus': 'pending',
+                'totalAmount': total_amount,
+                'eventTitle': event['title'],
+                'tickets': requested,
+                'seats': seat_summary(assigned)
+            }
+        }}
+    
+    except OrderError as e:
+        return {'status': e.status, 'body': {'success': False, 'message': str(e)}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId, ticket quantity or seat'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+# Payments: bookings return while their payment is pending; a worker
+# talks to the provider and settles callbacks in batches
+PAYMENT_CALLBACK_SECRET = os.getenv('PAYMENT_CALLBACK_SECRET', '')
+
+def payments_settled(rows):
+    """Refresh caches and availability for bookings whose payment was just settled"""
+    for row in rows:
+        merchant_cache.invalidate(row['organizer_id'])
+        if row['status'] == 'completed':
+            receipt_service.request_render(row['booking_reference'])
+    failed_events = {row['event_id'] for row in rows if row['status'] == 'failed'}
+    if not failed_events:
+        return
+    conn = get_db_connection()
+    try:
+        for event_id in failed_events:
+            seat_inventory.forget(event_id)
+            publish_availability(conn, event_id)
+    finally:
+        close_connection(conn)
+
+payment_pipeline = PaymentPipeline(
+    SimulatedProvider(delay=float(os.getenv('PAYMENT_SIM_DELAY', 2)),
+                      failure_rate=float(os.getenv('PAYMENT_SIM_FAILURE_RATE', 0))),
+    batch_size=int(os.getenv('PAYMENT_BATCH_SIZE', 100)),
+    on_settled=payments_settled,
+    feed=change_feed,
+    submit_lease=int(os.getenv('PAYMENT_SUBMIT_LEASE', 600))
+)
+
+def handle_payment_status(query_string):
+    """Handle GET /api_payment_status.py - payment state of a booking"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        ref = params.get('bookingReference', [''])[0]
+        if not ref:
+            return {'status': 400, 'body': {'success': False, 'message': 'Missing bookingReference parameter'}}
+        
+        # The payment worker writes to the primary, so read it there
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT b.booking_reference, b.payment_status, p.transaction_id
+                FROM bookings b LEFT JOIN payments p ON p.booking_id = b.id
+                WHERE b.booking_reference = %s
+                ORDER BY p.id DESC LIMIT 1
+            """, (ref,))
+            row = cursor.fetchone()
+        finally:
+            close_connection(conn)
+        if row is None:
+            return {'status': 404, 'body': {'success': False, 'message': 'Booking not found'}}
+        
+        return {'status': 200, 'headers': {'Cache-Control': 'no-store'}, 'body': {'success': True, 'data': {
+            'bookingReference': row['booking_reference'],
+            'paymentStatus': row['payment_status'],
+            'transactionId': row['transaction_id']
+        }}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_payment_callback(post_data):
+    """Handle POST /api_payment_callback.py - a provider reporting a payment outcome"""
+    try:
+        if not PAYMENT_CALLBACK_SECRET:
+            return {'status': 403, 'body': {'success': False, 'message': 'Payment callbacks are not configured'}}
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        for field in ('paymentId', 'status', 'transactionId', 'signature'):
+            if field not in data:
+                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
+        
+        expected = callback_signature(PAYMENT_CALLBACK_SECRET, data['paymentId'], data['status'], data['transactionId'])
+        if not hmac.compare_digest(expected, data['signature']):
+            return {'status': 403, 'body': {'success': False, 'message': 'Invalid signature'}}
+        if data['status'] not in ('completed', 'failed'):
+            return {'status': 400, 'body': {'success': False, 'message': 'status must be completed or failed'}}
+        
+        # Acknowledge at once; the worker applies it with the next batch
+        payment_pipeline.callback(int(data['paymentId']), data['status'], data['transactionId'])
+        return {'status': 202, 'body': {'success': True, 'message': 'Callback accepted'}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid paymentId'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+# Receipts: rendered by receipt_service's workers once a booking is paid,
+# never on the booking request itself
+receipt_service = ReceiptService(
+    os.getenv('RECEIPT_DIR', os.path.join(tempfile.gettempdir(), 'itech-events-receipts')),
+    workers=int(os.getenv('RECEIPT_WORKERS', 2))
+)
+
+def find_paid_booking(reference, email):
+    """
+    (status, message) if the booking reference and email do not name a
+    paid booking, else None
+    """
+    if not reference or not email:
+        return 400, 'bookingReference and email are required'
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT email, payment_status FROM bookings WHERE booking_reference = %s", (reference,))
+        row = cursor.fetchone()
+    finally:
+        close_connection(conn)
+    if row is None or row['email'].lower() != email.lower():
+        return 404, 'Booking not found'
+    if row['payment_status'] != 'completed':
+        return 409, 'Payment has not completed for this booking'
+    return None
+
+def handle_receipt(query_string):
+    """Handle GET /api_receipt.py?bookingReference=&email=&format=pdf - a booking's receipt"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        ref = params.get('bookingReference', [''])[0]
+        fmt = params.get('format', ['pdf'])[0]
+        if fmt not in FORMATS:
+            return {'status': 400, 'body': {'success': False, 'message': 'format must be html or pdf'}}
+        
+        problem = find_paid_booking(ref, params.get('email', [''])[0])
+        if problem:
+            return {'status': problem[0], 'body': {'success': False, 'message': problem[1]}}
+        path = receipt_service.cached(ref, fmt)
+        if path is None:
+            # Normally rendered when the payment settled; queue it again if not
+            receipt_service.request_render(ref)
+            return {'status': 202, 'headers': {'Retry-After': '1'}, 'body': {
+                'success': True, 'message': 'Receipt is being prepared'
+            }}
+        
+        with open(path, 'rb') as f:
+            data = f.read()
+        headers = {'Content-Type': FORMATS[fmt], 'Cache-Control': 'private, max-age=3600'}
+        if fmt == 'pdf':
+            headers['Content-Disposition'] = f'attachment; filename="iTech_Events_Receipt_{ref}.pdf"'
+        return {'status': 200, 'raw': data, 'headers': headers}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def handle_email_receipt(post_data):
+    """Handle POST /api_email_receipt.py - queue a paid booking's receipt for email"""
+    try:
+        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
+        data = {k: v[0] for k, v in data.items()}
+        ref = data.get('bookingReference', '')
+        problem = find_paid_booking(ref, data.get('email', ''))
+        if problem:
+            return {'status': problem[0], 'body': {'success': False, 'message': problem[1]}}
+        
+        receipt_service.request_email(ref)
+        return {'status': 202, 'body': {'success': True, 'message': 'Receipt will be emailed shortly'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+def read_availability(cursor, event_ids=None):
+    """Remaining standard/VIP tickets per event, for all published events when event_ids is None"""
+    query = """
+        SELECT tt.event_id, tt.type_name, tt.available_quantity - tt.sold_quantity - tt.held_quantity AS remaining
+        FROM ticket_types tt
+    """
+    if event_ids:
+        placeholders = ', '.join(['%s'] * len(event_ids))
+        cursor.execute(query + f" WHERE tt.event_id IN ({placeholders})", tuple(event_ids))
+    else:
+        cursor.execute(query + """
+            JOIN events e ON e.id = tt.event_id
+            WHERE e.status = 'published' AND e.event_date >= NOW()
+        """)
+    remaining = {}
+    for row in cursor.fetchall():
+        remaining.setdefault(row['event_id'], {})[row['type_name']] = int(row['remaining'])
+    return remaining
+
+def publish_availability(conn, event_id):
+    """Push an event's committed remaining counts to availability streams"""
+    def read_counts():
+        cursor = conn.cursor(dictionary=True)
+        counts = read_availability(cursor, [event_id]).get(event_id, {})
+        conn.commit()
+        return counts
+    try:
+        availability.refresh(event_id, read_counts)
+    except Exception as e:
+        print(f"Availability publish failed for event {event_id}: {e}")
+
+def handle_availability_stream(query_string):
+    """Handle GET /api_availability_stream.py - Server-Sent Events of remaining tickets"""
+    try:
+        params = urllib.parse.parse_qs(query_string)
+        event_ids = [int(value) for value in params.get('eventId', [''])[0].split(',') if value.strip()]
+        
+        def load_initial():
+            conn = get_db_connection(replica=True)
+            try:
+                cursor = conn.cursor(dictionary=True)
+                return read_availability(cursor, event_ids or None)
+            finally:
+                close_connection(conn)
+        
+        stream = availability.stream(event_ids or None, load_initial)
+    except StreamClosed:
+        return {'status': 503, 'headers': {'Retry-After': '5'},
+                'body': {'success': False, 'message': 'Availability stream unavailable'}}
+    except ValueError:
+        return {'status': 400, 'body': {'success': False, 'message': 'Invalid eventId parameter'}}
+    except Exception as e:
+        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+    
+    return {'status': 200, 'stream': stream, 'headers': {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }}
+
+# CORS headers sent with every JSON response and preflight
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'POST, GET, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type, Idempotency-Key, If-None-Match'),
+    ('Access-Control-Expose-Headers', 'ETag'),
+]
+
+def client_ip(headers, peer):
+    """Client address, taken from X-Forwarded-For when behind a trusted proxy"""
+    if os.getenv('TRUST_PROXY_HEADERS') == '1':
+        forwarded = headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return peer
+
+def check_rate_limit(client, path):
+    """Return a 429 result if this client has exhausted its bucket for path"""
+    if not path.startswith('/api_'):
+        return None
+    allowed, retry_after = rate_limiter.check(client, path)
+    if allowed:
+        return None
+    return {
+        'status': 429,
+        'headers': {'Retry-After': retry_after_header(retry_after)},
+        'body': {'success': False, 'message': 'Too many requests, please slow down'}
+    }
+
+def dispatch(path, method, headers, peer, read_data):
+    """
+    Rate limit, admit and route an API request. read_data() returns the
+    query string (GET) or body (POST); it is only called once the request
+    has been admitted, so shed requests never cost a read or a database
+    connection. A 429 or 503 result means the request was shed.
+    """
+    limited = check_rate_limit(client_ip(headers, peer), path)
+    if limited:
+        return limited
+    
+    route_class = classify_route(path, method)
+    try:
+        admission.acquire(route_class)
+    except Overloaded as e:
+        return {
+            'status': 503,
+            'headers': {'Retry-After': retry_after_header(e.retry_after)},
+            'body': {'success': False, 'message': 'Server is busy, please retry shortly'}
+        }
+    
+    try:
+        result = handle_request(path, method, headers, read_data())
+    except BaseException:
+        admission.release(route_class)
+        raise
+    stream = result.get('stream')
+    if stream is not None and not hasattr(stream, '__anext__'):
+        # Query streams (exports, catalog pages) read the database as the
+        # client reads, so they keep their slot until the stream is closed.
+        # Availability streams have their own cap and hold no connection.
+        result['stream'] = ReleasingStream(stream, lambda: admission.release(route_class))
+    else:
+        admission.release(route_class)
+    return result
+
+def encode_result(result):
+    """Return (headers, body bytes) for a non-streaming result"""
+    if 'raw' in result:
+        # Already encoded (e.g. an image); its Content-Type is in result['headers']
+        body = result['raw']
+        headers = [] if result['status'] == 304 else [('Content-Length', str(len(body)))]
+    else:
+        body = json.dumps(result['body'], cls=DateTimeEncoder).encode()
+        headers = [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+    headers += CORS_HEADERS
+    headers += list(result.get('headers', {}).items())
+    return headers, body
+
+def stream_headers(result):
+    """Headers for a streaming result; the front end adds any framing headers"""
+    return [('Access-Control-Allow-Origin', '*')] + list(result.get('headers', {}).items())
+
+# Filled in by warm_up() and reported by /ready
+startup_state = {'ready': False, 'startupMs': None, 'phasesMs': {}}
+
+def warm_up():
+    """
+    Open pooled DB connections and load the catalog cache before the
+    server starts accepting, so first requests run at full speed
+    """
+    phases = {}
+    mark = time.perf_counter()
+    phases['imports'] = round((mark - PROCESS_START) * 1000, 1)
+    
+    try:
+        warm_pool(int(os.getenv('DB_POOL_WARM', 4)))
+    except Exception as e:
+        print(f"DB pool warm-up failed: {e}")
+    now = time.perf_counter()
+    phases['pool'] = round((now - mark) * 1000, 1)
+    mark = now
+    
+    try:
+        # Caches loaded from here on already include every earlier change
+        change_feed.seek()
+    except Exception as e:
+        print(f"Change feed seek failed: {e}")
+    
+    try:
+        venue_index.load()
+    except Exception as e:
+        print(f"Venue index warm-up failed: {e}")
+    now = time.perf_counter()
+    phases['venues'] = round((now - mark) * 1000, 1)
+    mark = now
+    
+    try:
+        catalog_cache.warm()
+    except Exception as e:
+        print(f"Catalog warm-up failed: {e}")
+    now = time.perf_counter()
+    phases['catalog'] = round((now - mark) * 1000, 1)
+    
+    startup_state['phasesMs'] = phases
+    startup_state['startupMs'] = round((now - PROCESS_START) * 1000, 1)
+    startup_state['ready'] = True
+    print(f"Warm in {startup_state['startupMs']} ms "
+          f"(imports {phases['imports']} ms, pool {phases['pool']} ms, venues {phases['venues']} ms, "
+          f"catalog {phases['catalog']} ms)")
+
+def handle_ready():
+    """Handle GET /ready - readiness and warm state for load balancers"""
+    ready = startup_state['ready']
+    return {'status': 200 if ready else 503, 'body': {
+        'success': ready,
+        'data': {
+            'ready': ready,
+            'startupMs': startup_state['startupMs'],
+            'phasesMs': startup_state['phasesMs'],
+            'poolConnections': pool_size(),
+            'pools': pool_stats(),
+            'merchantCache': merchant_cache.stats(),
+            'pendingHolds': hold_expiry.pending(),
+            'paymentBacklog': payment_pipeline.backlog(),
+            'receiptJobs': receipt_service.stats(),
+            'changeFeed': change_feed.stats(),
+            'catalogWarm': catalog_cache.is_warm
+        }
+    }}
+
+def shutdown_resources():
+    """Release process-wide resources once requests have drained"""
+    view_counter.stop()
+    hold_expiry.stop()
+    payment_pipeline.stop()
+    receipt_service.stop()
+    change_feed.stop()
+    close_pool()
+
+def start():
+    """Warm up and start background work before serving"""
+    warm_up()
+    view_counter.start()
+    try:
+        print(f"Scheduled expiry for {hold_expiry.load()} active ticket holds")
+    except Exception as e:
+        print(f"Could not load active ticket holds: {e}")
+    hold_expiry.start()
+    try:
+        print(f"Queued {payment_pipeline.recover()} pending payments")
+    except Exception as e:
+        print(f"Could not load pending payments: {e}")
+    payment_pipeline.start()
+    receipt_service.start()
+    change_feed.start()
+
+def close_streams():
+    """End long-lived streams so a drain does not wait on them"""
+    availability.close()
@@ -0,0 +1,182 @@
+"""
+Madilu Event Booking System - ASGI Application
+Serves the API from api_core under any ASGI server
+
+Usage: uvicorn asgi_app:app --workers 4
+
+Handlers are blocking (MySQL), so each request runs on a thread from a
+dedicated pool of ASGI_THREADS threads. Request bodies are read from
+that thread only once dispatch has admitted the request. Open
+availability streams wait on the event loop and hold no thread; other
+streamed responses (exports) hold one while they produce chunks.
+Startup and shutdown run through the ASGI lifespan protocol. Static
+files are not served here.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import api_core
+from uploads import RequestBody
+
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('ASGI_THREADS', 64)), thread_name_prefix='api')
+
+def request_headers(scope):
+    """Request headers from an ASGI scope, keyed like 'Idempotency-Key'"""
+    headers = {}
+    for name, value in scope.get('headers', []):
+        key = '-'.join(part.capitalize() for part in name.decode('latin-1').split('-'))
+        headers[key] = value.decode('latin-1')
+    return headers
+
+def _encode_headers(headers):
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        await http(scope, receive, send)
+
+async def lifespan(receive, send):
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await loop.run_in_executor(executor, api_core.start)
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            api_core.close_streams()
+            await loop.run_in_executor(executor, api_core.shutdown_resources)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+class ReceiveStream:
+    """
+    Blocking file-like reader over an ASGI body, for handlers running on
+    the thread pool; each read waits on receive() on the event loop
+    """
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.more = True
+        self.disconnected = False
+
+    def read_all(self):
+        """The whole remaining body; raises ConnectionResetError if the client left mid-body"""
+        chunks = []
+        while True:
+            chunk = self.read(65536)
+            if not chunk:
+                if self.disconnected:
+                    raise ConnectionResetError('Client disconnected')
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def read(self, size):
+        while not self.buffer and self.more:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                self.more = False
+                self.disconnected = True
+                break
+            self.buffer += message.get('body', b'')
+            self.more = message.get('more_body', False)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+async def http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    path = scope['path']
+    method = scope['method']
+
+    if method == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': _encode_headers(api_core.CORS_HEADERS + [('Content-Length', '0')])})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    if path == '/ready':
+        result = api_core.handle_ready()
+    elif path.startswith('/api_') and method in ('GET', 'POST'):
+        headers = request_headers(scope)
+        if method == 'GET':
+            query = scope.get('query_string', b'').decode('latin-1')
+            read_data = lambda: query
+        elif path in api_core.UPLOAD_ROUTES:
+            # Streamed by the handler on its worker thread
+            read_data = lambda: RequestBody(ReceiveStream(receive, loop), int(headers.get('Content-Length') or 0))
+        else:
+            # Called by dispatch on the worker thread, after admission
+            read_data = ReceiveStream(receive, loop).read_all
+        client = scope.get('client') or ('', 0)
+        try:
+            result = await loop.run_in_executor(
+                executor, api_core.dispatch, path, method, headers, client[0], read_data)
+        except ConnectionResetError:
+            return
+    else:
+        result = {'status': 404, 'body': {'success': False, 'message': 'Not found'}}
+
+    if 'stream' in result:
+        await send_stream(result, receive, send)
+        return
+
+    headers, body = api_core.encode_result(result)
+    await send({'type': 'http.response.start', 'status': result['status'], 'headers': _encode_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_stream(result, receive, send):
+    """Send each chunk as it is produced; stop when the client goes away"""
+    loop = asyncio.get_running_loop()
+    stream = result['stream']
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': result['status'],
+                    'headers': _encode_headers(api_core.stream_headers(result))})
+        while not disconnected.is_set():
+            chunk = await next_chunk(stream, loop)
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    except Exception as e:
+        print(f"Stream aborted: {e}")
+    finally:
+        watcher.cancel()
+        if hasattr(stream, '__anext__'):
+            stream.close()
+        else:
+            await loop.run_in_executor(executor, stream.close)
+
+async def next_chunk(stream, loop):
+    """
+    The stream's next chunk, or None at its end. Availability streams are
+    awaited on the loop and hold no thread while idle; other streams are
+    read on the thread pool.
+    """
+    if not hasattr(stream, '__anext__'):
+        return await loop.run_in_executor(executor, next, stream, None)
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+# Some servers look for "application" by default
+application = app
@@ -0,0 +1,235 @@
+"""
+Availability Stream Module
+Fans out remaining ticket counts to Server-Sent Events subscribers
+
+The booking path publishes once per change; every open stream is fed
+from the same in-process state, so subscribers never poll the database.
+Subscribers are indexed by the events they watch, so a publish wakes
+only the streams for that event plus the unfiltered ones.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+class StreamClosed(Exception):
+    """Raised when subscribing to a broadcaster that is shutting down"""
+
+class AvailabilityBroadcaster:
+    """
+    Keeps the latest counts per event plus a short change log. Each
+    subscriber remembers the last sequence number it has seen and, when
+    woken, sends only the newest counts for events that changed since.
+    """
+
+    def __init__(self, history=4096, heartbeat=15.0, max_subscribers=5000):
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._changes = deque(maxlen=history)
+        self._seq = 0
+        self._closed = False
+        self._event_locks = {}
+        # Open subscriptions: by watched event id, and those watching every event
+        self._by_event = {}
+        self._unfiltered = set()
+
+    def publish(self, event_id, counts):
+        """Record new counts for an event and wake the subscribers watching it"""
+        with self._lock:
+            self._seq += 1
+            self._latest[event_id] = (self._seq, counts)
+            self._changes.append((self._seq, event_id))
+            for subscription in self._by_event.get(event_id, ()):
+                subscription._wake()
+            for subscription in self._unfiltered:
+                subscription._wake()
+
+    def refresh(self, event_id, read_counts):
+        """
+        Call read_counts() and publish the result. Reads for one event are
+        serialised with their publish, so a slower reader can never
+        overwrite newer counts with older ones.
+        """
+        with self._lock:
+            lock = self._event_locks.setdefault(event_id, threading.Lock())
+        with lock:
+            self.publish(event_id, read_counts())
+
+    def snapshot(self, event_ids):
+        """Return {event_id: counts} for known events among event_ids"""
+        with self._lock:
+            return {event_id: self._latest[event_id][1] for event_id in event_ids if event_id in self._latest}
+
+    def stream(self, event_ids=None, load_initial=None):
+        """
+        Return a Subscription yielding SSE-formatted bytes for the given
+        events (all events when event_ids is None). load_initial() supplies
+        the starting counts; it is called after the subscription point is
+        fixed, so no change published in between can be missed.
+        """
+        with self._lock:
+            if self._closed or self.subscribers >= self.max_subscribers:
+                raise StreamClosed()
+            last_seen = self._seq
+        initial = load_initial() if load_initial else {}
+        return Subscription(self, set(event_ids) if event_ids else None, last_seen, initial)
+
+    def _changed_since(self, last_seen, wanted):
+        """Newest counts for events changed after last_seen (caller holds the lock)"""
+        if self._changes and self._changes[0][0] > last_seen + 1:
+            # Fell behind the change log; resend everything we know
+            event_ids = self._latest.keys()
+        else:
+            event_ids = set()
+            for seq, event_id in reversed(self._changes):
+                if seq <= last_seen:
+                    break
+                event_ids.add(event_id)
+        changed = []
+        for event_id in event_ids:
+            if wanted is None or event_id in wanted:
+                seq, counts = self._latest[event_id]
+                changed.append((seq, event_id, counts))
+        changed.sort()
+        return changed
+
+    def close(self):
+        """End every open stream, e.g. before draining on shutdown"""
+        with self._lock:
+            self._closed = True
+            for subscription in self._all_subscriptions():
+                subscription._wake()
+
+    def _all_subscriptions(self):
+        """Every open subscription once (caller holds the lock)"""
+        subscriptions = set(self._unfiltered)
+        for watching in self._by_event.values():
+            subscriptions.update(watching)
+        return subscriptions
+
+    def _add(self, subscription):
+        """Index a new subscription (caller holds the lock)"""
+        self.subscribers += 1
+        if subscription.wanted is None:
+            self._unfiltered.add(subscription)
+        for event_id in subscription.wanted or ():
+            self._by_event.setdefault(event_id, set()).add(subscription)
+
+    def _remove(self, subscription):
+        """Drop a closed subscription from the index (caller holds the lock)"""
+        self.subscribers -= 1
+        self._unfiltered.discard(subscription)
+        for event_id in subscription.wanted or ():
+            watching = self._by_event.get(event_id)
+            if watching is not None:
+                watching.discard(subscription)
+                if not watching:
+                    del self._by_event[event_id]
+
+class Subscription:
+    """
+    One open stream. Iterate it from a thread (blocking on its own
+    condition over the broadcaster's lock) or with async for on an event
+    loop, where waiting holds no thread. close() ends the subscription.
+    """
+
+    def __init__(self, broadcaster, wanted, last_seen, initial):
+        self.broadcaster = broadcaster
+        self.wanted = wanted
+        self.last_seen = last_seen
+        self._pending = [b'retry: 2000\n\n']
+        self._pending += [format_event(last_seen, event_id, counts) for event_id, counts in initial.items()]
+        self._done = False
+        self._cond = threading.Condition(broadcaster._lock)
+        # (loop, asyncio.Event) while awaiting on an event loop
+        self._waiter = None
+        with broadcaster._lock:
+            broadcaster._add(self)
+
+    def _wake(self):
+        """End a blocked or awaiting wait (caller holds the broadcaster's lock)"""
+        self._cond.notify()
+        if self._waiter is not None:
+            loop, event = self._waiter
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Its loop has closed; the subscription is being torn down
+                pass
+
+    def _take(self):
+        """Chunks for changes since last_seen, or None if there are none (caller holds the lock)"""
+        if self.broadcaster._closed:
+            self._close_locked()
+            return None
+        if self.broadcaster._seq == self.last_seen:
+            return None
+        changed = self.broadcaster._changed_since(self.last_seen, self.wanted)
+        self.last_seen = self.broadcaster._seq
+        # Changes to other events only: keep waiting (the heartbeat sends a keep-alive)
+        return [format_event(seq, event_id, counts) for seq, event_id, counts in changed] or None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cond = self._cond
+        while not self._pending:
+            with cond:
+                if self._done:
+                    raise StopIteration
+                chunks = self._take()
+                if chunks is None and not self._done:
+                    cond.wait(self.broadcaster.heartbeat)
+                    chunks = self._take() or ([] if self._done else [KEEP_ALIVE])
+            self._pending = chunks or []
+        return self._pending.pop(0)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        lock = self.broadcaster._lock
+        while not self._pending:
+            event = asyncio.Event()
+            with lock:
+                if self._done:
+                    raise StopAsyncIteration
+                chunks = self._take()
+                if chunks is None and not self._done:
+                    self._waiter = (asyncio.get_running_loop(), event)
+            if chunks is None and not self._done:
+                try:
+                    await asyncio.wait_for(event.wait(), self.broadcaster.heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with lock:
+                        self._waiter = None
+                with lock:
+                    chunks = self._take() or ([] if self._done else [KEEP_ALIVE])
+            self._pending = chunks or []
+        return self._pending.pop(0)
+
+    def _close_locked(self):
+        if not self._done:
+            self._done = True
+            self._pending = []
+            self.broadcaster._remove(self)
+            self._wake()
+
+    def close(self):
+        with self.broadcaster._lock:
+            self._close_locked()
+
+# Comment line keeps proxies from timing out and detects dead clients
+KEEP_ALIVE = b': keep-alive\n\n'
+
+def format_event(seq, event_id, counts):
+    """Encode one availability update as an SSE message"""
+    data = json.dumps(dict(counts, eventId=event_id))
+    return f"id: {seq}\nevent: availability\ndata: {data}\n\n".encode()
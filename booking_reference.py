@@ -0,0 +1,93 @@
+"""
+Booking Reference Generator
+Collision-free booking references without database lookups or retries
+
+A reference is ITECH- followed by 14 base-36 characters (20 characters in
+total, matching bookings.booking_reference VARCHAR(20)) encoding 72 bits:
+
+    40 bits  milliseconds since 2024-01-01 UTC (good until 2058)
+    22 bits  worker id - the process id, or MADILU_WORKER_ID
+    10 bits  sequence within the millisecond (1024 per ms per process)
+
+Two live processes never share a worker id, and a process never issues a
+timestamp later than the clock it has read. A new process waits for the
+clock to tick once before its first reference, so it cannot reuse a
+(timestamp, worker) pair issued by an earlier process with the same pid.
+"""
+
+import os
+import threading
+import time
+
+PREFIX = 'ITECH-'
+EPOCH_MS = 1704067200000
+WORKER_BITS = 22
+SEQUENCE_BITS = 10
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ENCODED_LENGTH = 14
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+def _now_ms():
+    return time.time_ns() // 1000000 - EPOCH_MS
+
+def _encode(value):
+    chars = ['0'] * ENCODED_LENGTH
+    for i in range(ENCODED_LENGTH - 1, -1, -1):
+        value, digit = divmod(value, 36)
+        chars[i] = ALPHABET[digit]
+    return ''.join(chars)
+
+class BookingReferenceGenerator:
+    """Thread-safe, fork-aware generator of unique booking references"""
+
+    def __init__(self, worker_id=None):
+        self._explicit_worker = worker_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        worker = self._explicit_worker
+        if worker is None:
+            worker = int(os.getenv('MADILU_WORKER_ID', self._pid))
+        if not 0 <= worker <= MAX_WORKER:
+            # Only reachable on platforms with pids above 2^22
+            worker &= MAX_WORKER
+        self.worker_id = worker
+        # Mark the current millisecond as used up so the first reference
+        # waits for the next tick (see module docstring)
+        self._last_ms = _now_ms()
+        self._sequence = MAX_SEQUENCE + 1
+
+    def next(self):
+        """Return a new unique booking reference"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+
+            now = _now_ms()
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            # If the clock steps backwards keep using the last timestamp
+            # until the sequence runs out
+            while self._sequence > MAX_SEQUENCE:
+                now = _now_ms()
+                if now > self._last_ms:
+                    self._last_ms = now
+                    self._sequence = 0
+
+            sequence = self._sequence
+            self._sequence += 1
+            value = (((self._last_ms << WORKER_BITS) | self.worker_id) << SEQUENCE_BITS) | sequence
+        return PREFIX + _encode(value)
+
+_generator = BookingReferenceGenerator()
+
+def generate_booking_reference():
+    """Return a new unique booking reference from the process-wide generator"""
+    return _generator.next()
+
+def _generate_many(count):
+    return [generate_booking_reference() for _ in range(count)]
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Frontend Asset Build
+Minifies the site's CSS and JavaScript and fingerprints them by content hash
+
+Usage: python build_assets.py
+
+Writes dist/<name>.<hash>.<ext> for each asset, copies of the HTML pages
+that reference those files, and dist/manifest.json. A fingerprinted
+file's content never changes, so it can be cached forever; the pages
+themselves are served with no-cache so a new build is picked up on the
+next visit. Files from the previous build are kept for pages still open
+in browsers, and older ones are removed.
+
+The minifiers are deliberately conservative: they remove comments and
+whitespace and leave strings, template literals and regular expressions
+untouched, so no JavaScript parser is needed.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = 'dist'
+MANIFEST = os.path.join(DIST_DIR, 'manifest.json')
+
+ASSETS = ['styles.css', 'script.js', 'merchant_dashboard.js']
+PAGES = ['index.html', 'merchant_dashboard.html']
+
+FINGERPRINTED = re.compile(r'^/dist/[\w-]+\.[0-9a-f]{10}\.(css|js)$')
+
+# --- CSS ---
+
+def minify_css(source):
+    """Strip comments and insignificant whitespace from a stylesheet"""
+    out = []
+    i, n = 0, len(source)
+    space = False
+    while i < n:
+        c = source[i]
+        if c in '"\'':
+            end = _string_end(source, i)
+            out.append(_css_space(out, space, source[i]))
+            out.append(source[i:end])
+            space = False
+            i = end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            space = True
+        elif c.isspace():
+            space = True
+            i += 1
+        else:
+            out.append(_css_space(out, space, c))
+            out.append(c)
+            space = False
+            i += 1
+    return re.sub(r';}', '}', ''.join(out)).strip() + '\n'
+
+def _css_space(out, space, following):
+    """A single space, unless it sits next to a character that never needs one"""
+    if not space or not out:
+        return ''
+    previous = out[-1][-1:] if out[-1] else ''
+    if previous in '{};,:' or following in '{};,':
+        return ''
+    return ' '
+
+# --- JavaScript ---
+
+# A '/' after one of these starts a regular expression, not a division
+REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                  'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+def minify_js(source):
+    """
+    Strip comments, indentation and blank lines from a script. Line breaks
+    are kept wherever automatic semicolon insertion could depend on them.
+    """
+    scanner = _JsScanner(source)
+    scanner.scan(0)
+    return ''.join(scanner.out).strip() + '\n'
+
+def _is_word(c):
+    return c.isalnum() or c in '_$' or ord(c) > 127
+
+class _JsScanner:
+    def __init__(self, source):
+        self.source = source
+        self.out = []
+        self.last = ''       # last significant character written
+        self.last_word = ''  # last identifier or keyword written
+        self.gap = ''        # pending whitespace: '', ' ' or '\n'
+
+    def write(self, text):
+        if self.gap and self.out:
+            first = text[0]
+            if self.gap == '\n' and not (self.last in '{;,([' or first in ')]}.,'):
+                self.out.append('\n')
+            elif (_is_word(self.last) and _is_word(first)) or (self.last + first) in ('++', '--', '+-', '-+'):
+                self.out.append(' ')
+            elif self.last == '/' and first == '/':
+                self.out.append(' ')
+        self.gap = ''
+        self.out.append(text)
+        self.last = text[-1]
+
+    def scan(self, i, in_template=False):
+        """Minify code from i; inside a template's ${...} stop at its closing brace"""
+        source, n = self.source, len(self.source)
+        depth = 0
+        while i < n:
+            c = source[i]
+            if c in '"\'':
+                end = _string_end(source, i)
+                self.write(source[i:end])
+                self.last_word = ''
+                i = end
+            elif c == '`':
+                i = self.template(i)
+            elif source.startswith('//', i):
+                end = source.find('\n', i)
+                i = n if end < 0 else end
+            elif source.startswith('/*', i):
+                end = source.find('*/', i + 2)
+                end = n if end < 0 else end + 2
+                if '\n' in source[i:end]:
+                    self.gap = '\n'
+                elif not self.gap:
+                    self.gap = ' '
+                i = end
+            elif c == '/' and (self.last in REGEX_AFTER or not self.last or self.last_word in REGEX_KEYWORDS):
+                end = _regex_end(source, i)
+                self.write(source[i:end])
+                self.last_word = ''
+                i = end
+            elif c.isspace():
+                if c == '\n' or self.gap == '\n':
+                    self.gap = '\n'
+                else:
+                    self.gap = ' '
+                i += 1
+            elif _is_word(c):
+                end = i + 1
+                while end < n and _is_word(source[end]):
+                    end += 1
+                word = source[i:end]
+                self.write(word)
+                # A number such as 1.5 is one token; this only tracks keywords
+                self.last_word = word
+                i = end
+            else:
+                if in_template:
+                    if c == '{':
+                        depth += 1
+                    elif c == '}':
+                        if depth == 0:
+                            return i
+                        depth -= 1
+                self.write(c)
+                self.last_word = ''
+                i += 1
+        return i
+
+    def template(self, i):
+        """Copy a template literal verbatim, minifying its ${...} expressions"""
+        source, n = self.source, len(self.source)
+        start = i
+        i += 1
+        while i < n:
+            c = source[i]
+            if c == '\\':
+                i += 2
+            elif c == '`':
+                self.write(source[start:i + 1])
+                self.last_word = ''
+                return i + 1
+            elif source.startswith('${', i):
+                self.write(source[start:i + 2])
+                self.last_word = ''
+                i = self.scan(i + 2, in_template=True)
+                self.write('}')
+                start = i + 1
+                i += 1
+            else:
+                i += 1
+        raise ValueError('Unterminated template literal')
+
+def _string_end(source, i):
+    """Index just past the quoted string starting at i"""
+    quote = source[i]
+    i += 1
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+        elif source[i] == quote:
+            return i + 1
+        elif source[i] == '\n':
+            break
+        else:
+            i += 1
+    raise ValueError(f'Unterminated string at offset {i}')
+
+def _regex_end(source, i):
+    """Index just past the regular expression literal (and flags) starting at i"""
+    i += 1
+    in_class = False
+    while i < len(source):
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            raise ValueError(f'Unterminated regular expression at offset {i}')
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    raise ValueError('Unterminated regular expression')
+
+# --- Build ---
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def fingerprint(name, content):
+    """dist/ path for an asset: its name plus a hash of its built content"""
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+    return f"{DIST_DIR}/{stem}.{digest}{ext}"
+
+def rewrite_references(html, assets):
+    """Point href/src attributes that name a source asset at its built file"""
+    def replace(match):
+        built = assets.get(match.group(2))
+        return f'{match.group(1)}"{built}"' if built else match.group(0)
+    return re.sub(r'((?:href|src)=)"([^"?#]+)"', replace, html)
+
+def build():
+    """Build every asset and page; returns the manifest"""
+    dist = os.path.join(BASE_DIR, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    previous = load_manifest() or {}
+
+    assets = {}
+    for name in ASSETS:
+        with open(os.path.join(BASE_DIR, name), encoding='utf-8') as f:
+            source = f.read()
+        content = MINIFIERS[os.path.splitext(name)[1]](source)
+        built = fingerprint(name, content)
+        _write(built, content)
+        assets[name] = built
+        print(f"{name}: {len(source.encode('utf-8'))} -> {len(content.encode('utf-8'))} bytes  {built}")
+
+    pages = {}
+    for name in PAGES:
+        with open(os.path.join(BASE_DIR, name), encoding='utf-8') as f:
+            html = rewrite_references(f.read(), assets)
+        pages[name] = f"{DIST_DIR}/{name}"
+        _write(pages[name], html)
+
+    manifest = {'assets': assets, 'pages': pages}
+    _write(MANIFEST, json.dumps(manifest, indent=2) + '\n')
+
+    # Keep this build's and the previous build's files; remove the rest
+    keep = set(assets.values()) | set(previous.get('assets', {}).values())
+    for entry in os.listdir(dist):
+        path = f"{DIST_DIR}/{entry}"
+        if FINGERPRINTED.match('/' + path) and path not in keep:
+            os.remove(os.path.join(BASE_DIR, path))
+    return manifest
+
+def _write(path, content):
+    full = os.path.join(BASE_DIR, path)
+    temp = full + '.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(temp, full)
+
+# --- Serving ---
+
+def load_manifest():
+    """The current build's manifest, or None if nothing has been built"""
+    try:
+        with open(os.path.join(BASE_DIR, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_fingerprinted(path):
+    """True for a URL path of a built asset, which may be cached forever"""
+    return bool(FINGERPRINTED.match(path))
+
+def built_page(name):
+    """
+    dist/ path of the built copy of page name (e.g. 'index.html'), or None
+    if there is no build or a source has changed since it was made.
+    """
+    manifest = load_manifest()
+    if not manifest or name not in manifest.get('pages', {}):
+        return None
+    built_at = os.path.getmtime(os.path.join(BASE_DIR, MANIFEST))
+    for source in ASSETS + PAGES:
+        try:
+            if os.path.getmtime(os.path.join(BASE_DIR, source)) > built_at:
+                return None
+        except OSError:
+            return None
+    return manifest['pages'][name]
+
+if __name__ == '__main__':
+    build()
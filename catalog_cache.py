@@ -0,0 +1,63 @@
+"""
+Catalog Cache Module
+Keeps the published events listing in memory between requests
+"""
+
+import threading
+import time
+
+class CatalogCache:
+    """
+    Caches the result of `loader()` for `ttl` seconds. Concurrent misses
+    share a single load, and writes call invalidate() so the next read
+    reloads immediately. A loader returns None when the result is too
+    large to keep; get() then returns None until the TTL passes, so
+    callers stream from the database instead.
+    """
+
+    def __init__(self, loader, ttl=30):
+        self.loader = loader
+        self.ttl = ttl
+        self._events = None
+        self._loaded_at = 0.0
+        self._oversized_until = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the cached catalog, loading it if missing or expired; None if too large to cache"""
+        events = self._events
+        if events is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return events
+        if time.monotonic() < self._oversized_until:
+            return None
+
+        with self._lock:
+            # Another thread may have reloaded while we waited
+            if self._events is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._events
+            if time.monotonic() < self._oversized_until:
+                return None
+            generation = self._generation
+            events = self.loader()
+            # Only publish if nothing invalidated the cache mid-load
+            if generation == self._generation:
+                self._events = events
+                self._loaded_at = time.monotonic()
+                if events is None:
+                    self._oversized_until = self._loaded_at + self.ttl
+            return events
+
+    def invalidate(self):
+        """Drop the cached catalog after a write"""
+        self._generation += 1
+        self._events = None
+        self._oversized_until = 0.0
+
+    def warm(self):
+        """Load the catalog ahead of the first request"""
+        self.get()
+
+    @property
+    def is_warm(self):
+        return self._events is not None
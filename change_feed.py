@@ -0,0 +1,238 @@
+"""
+Change Feed Module
+Keeps each API process's in-memory caches in step with the other processes' writes
+
+Every write path records what it changed in the change_feed table inside
+its own transaction (an outbox), so a change is in the feed exactly when
+it commits. After committing, the writer rings a doorbell on a local bus:
+one Unix datagram socket per process in bus_dir. Each process's
+subscriber thread wakes on the doorbell, reads the feed rows after the
+last one it applied and runs the handlers for their topics, so processes
+on the same host catch up within milliseconds of the commit. The table
+is the source of truth: a lost doorbell, or a writer on another host, is
+picked up by the next poll (every poll_interval seconds).
+
+A process skips its own changes, since it updates its caches as it
+writes. Ids are assigned at insert but become visible at commit, so a
+row can appear after a higher id has been read; ids skipped over are
+checked again for gap_wait seconds.
+"""
+
+import os
+import secrets
+import socket
+import threading
+import time
+
+from db_connection import get_db_connection, close_connection
+
+HAS_UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+# Jumps in ids larger than this (e.g. after a server restart) are not gaps
+MAX_GAPS = 1000
+
+class ChangeFeed:
+    """
+    Outbox writer plus subscriber thread. Handlers registered with
+    subscribe(topic, handler) are called with each change row (id, topic,
+    entity_id, organizer_id) made by another process; identical changes
+    in one poll are applied once.
+    """
+
+    def __init__(self, bus_dir, poll_interval=1.0, gap_wait=10.0, retention=3600, batch_size=500):
+        self.bus_dir = bus_dir
+        self.poll_interval = poll_interval
+        self.gap_wait = gap_wait
+        self.retention = retention
+        self.batch_size = batch_size
+        self.origin = f"{socket.gethostname()[:40]}:{os.getpid()}:{secrets.token_hex(4)}"
+        self.position = None
+        self.applied = 0
+        self._handlers = {}
+        self._gaps = {}
+        self._sock = None
+        self._path = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._pruned_at = 0.0
+
+    def subscribe(self, topic, handler):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    def record(self, cursor, topic, entity_id=None, organizer_id=None):
+        """Add a change to the feed inside the caller's transaction; call notify() after commit"""
+        cursor.execute("""
+            INSERT INTO change_feed (topic, entity_id, organizer_id, origin) VALUES (%s, %s, %s, %s)
+        """, (topic, entity_id, organizer_id, self.origin))
+
+    def notify(self):
+        """Ring every other process's doorbell after committing recorded changes"""
+        if not HAS_UNIX_SOCKETS:
+            return
+        try:
+            names = os.listdir(self.bus_dir)
+        except OSError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            sender.setblocking(False)
+            for name in names:
+                path = os.path.join(self.bus_dir, name)
+                if not name.endswith('.sock') or path == self._path:
+                    continue
+                try:
+                    sender.sendto(b'1', path)
+                except BlockingIOError:
+                    # Its queue is full of doorbells, so it is awake already
+                    pass
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a process that did not stop cleanly
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except OSError:
+                    pass
+
+    def seek(self):
+        """Skip to the newest change; caches loaded after this see everything before it"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed")
+            self.position = cursor.fetchone()[0]
+            conn.commit()
+        finally:
+            close_connection(conn)
+        self._gaps.clear()
+
+    def poll(self):
+        """Apply changes committed since the last poll; True if there may be more"""
+        where, params = "id > %s", [self.position]
+        if self._gaps:
+            where += f" OR id IN ({', '.join(['%s'] * len(self._gaps))})"
+            params += list(self._gaps)
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT id, topic, entity_id, organizer_id, origin FROM change_feed
+                WHERE {where} ORDER BY id LIMIT %s
+            """, (*params, self.batch_size))
+            rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            close_connection(conn)
+
+        now = time.monotonic()
+        changes = {}
+        for row in rows:
+            if row['id'] in self._gaps:
+                del self._gaps[row['id']]
+            elif row['id'] > self.position:
+                if row['id'] - self.position <= MAX_GAPS:
+                    for missing in range(self.position + 1, row['id']):
+                        self._gaps[missing] = now + self.gap_wait
+                self.position = row['id']
+            if row['origin'] != self.origin:
+                changes.setdefault((row['topic'], row['entity_id'], row['organizer_id']), row)
+        for gap, deadline in list(self._gaps.items()):
+            if deadline < now:
+                del self._gaps[gap]
+
+        for change in changes.values():
+            for handler in self._handlers.get(change['topic'], ()):
+                try:
+                    handler(change)
+                except Exception as e:
+                    print(f"Change feed handler for {change['topic']} {change['entity_id']} failed: {e}")
+            self.applied += 1
+        return len(rows) == self.batch_size
+
+    def prune(self):
+        """Delete changes older than retention seconds"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM change_feed WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 10000",
+                           (self.retention,))
+            conn.commit()
+        finally:
+            close_connection(conn)
+
+    def stats(self):
+        return {'position': self.position, 'applied': self.applied, 'gaps': len(self._gaps)}
+
+    def start(self):
+        """Listen on the bus and apply changes on a background thread"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        if HAS_UNIX_SOCKETS:
+            try:
+                os.makedirs(self.bus_dir, exist_ok=True)
+                self._path = os.path.join(self.bus_dir, f"{os.getpid()}-{secrets.token_hex(4)}.sock")
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sock.bind(self._path)
+            except OSError as e:
+                print(f"Change bus unavailable, polling every {self.poll_interval}s: {e}")
+                self._close_socket()
+        self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sock is not None:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as waker:
+                    waker.sendto(b'1', self._path)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close_socket()
+
+    def _close_socket(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def _wait(self):
+        """Sleep until a doorbell rings or poll_interval passes"""
+        if self._sock is None:
+            self._stopped.wait(self.poll_interval)
+            return
+        self._sock.settimeout(self.poll_interval)
+        try:
+            self._sock.recv(16)
+        except socket.timeout:
+            return
+        # One poll answers a whole burst of doorbells
+        self._sock.setblocking(False)
+        try:
+            while True:
+                self._sock.recv(16)
+        except BlockingIOError:
+            pass
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wait()
+            if self._stopped.is_set():
+                return
+            try:
+                if self.position is None:
+                    self.seek()
+                while self.poll():
+                    pass
+                if time.monotonic() - self._pruned_at > 60:
+                    self._pruned_at = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                print(f"Change feed poll failed: {e}")
@@ -24,7 +24,9 @@ CREATE TABLE venues (
     city VARCHAR(100) NOT NULL,
     capacity INT NOT NULL,
     description TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    name_normalized VARCHAR(150) AS (LOWER(TRIM(name))) STORED,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_venues_name_normalized (name_normalized)
 );
 
 -- Events table
@@ -53,6 +55,7 @@ CREATE TABLE ticket_types (
     price DECIMAL(10,2) NOT NULL,
     available_quantity INT NOT NULL,
     sold_quantity INT DEFAULT 0,
+    held_quantity INT NOT NULL DEFAULT 0,
     FOREIGN KEY (event_id) REFERENCES events(id)
 );
 
@@ -94,10 +97,124 @@ CREATE TABLE payments (
     payment_method VARCHAR(50) NOT NULL,
     transaction_id VARCHAR(100),
     payment_status ENUM('pending', 'completed', 'failed') DEFAULT 'pending',
+    submitted_at DATETIME NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (booking_id) REFERENCES bookings(id)
 );
 
+-- Idempotency keys for retried POST requests
+CREATE TABLE idempotency_keys (
+    route VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(128) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status ENUM('in_progress', 'completed') DEFAULT 'in_progress',
+    response_status INT,
+    response_body MEDIUMTEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (route, idempotency_key),
+    INDEX idx_idempotency_created (created_at)
+);
+
+-- Sales rollups maintained by the booking path (dashboard analytics)
+CREATE TABLE sales_rollup_hourly (
+    organizer_id INT NOT NULL,
+    event_id INT NOT NULL,
+    ticket_type ENUM('standard', 'vip') NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    tickets INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, bucket_start, ticket_type),
+    INDEX idx_rollup_hourly_merchant (organizer_id, bucket_start)
+);
+
+CREATE TABLE sales_rollup_daily (
+    organizer_id INT NOT NULL,
+    event_id INT NOT NULL,
+    ticket_type ENUM('standard', 'vip') NOT NULL,
+    bucket_date DATE NOT NULL,
+    tickets INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, bucket_date, ticket_type),
+    INDEX idx_rollup_daily_merchant (organizer_id, bucket_date)
+);
+
+-- Event view counts, flushed in batches by the API server
+CREATE TABLE event_view_counts (
+    event_id INT PRIMARY KEY,
+    views BIGINT NOT NULL DEFAULT 0
+);
+
+-- Reserved seating: rectangular sections of a venue's seat map (row 0 is the front)
+CREATE TABLE venue_sections (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    venue_id INT NOT NULL,
+    name VARCHAR(50) NOT NULL,
+    ticket_type ENUM('standard', 'vip') NOT NULL,
+    seat_rows INT NOT NULL,
+    seats_per_row INT NOT NULL,
+    UNIQUE KEY uq_venue_sections_name (venue_id, name),
+    FOREIGN KEY (venue_id) REFERENCES venues(id)
+);
+
+-- Per-event seat state: sold/held bitsets, one bit per seat (see seat_inventory.py)
+CREATE TABLE event_seat_state (
+    event_id INT NOT NULL,
+    section_id INT NOT NULL,
+    sold MEDIUMBLOB,
+    held MEDIUMBLOB,
+    version INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, section_id),
+    FOREIGN KEY (event_id) REFERENCES events(id),
+    FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+);
+
+-- Seats assigned to each booking
+CREATE TABLE booking_seats (
+    booking_id INT NOT NULL,
+    section_id INT NOT NULL,
+    seat_index INT NOT NULL,
+    PRIMARY KEY (booking_id, section_id, seat_index),
+    FOREIGN KEY (booking_id) REFERENCES bookings(id),
+    FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+);
+
+-- Checkout holds: tickets kept for a customer while they pay (see ticket_holds.py)
+CREATE TABLE ticket_holds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    hold_token CHAR(32) NOT NULL UNIQUE,
+    event_id INT NOT NULL,
+    standard_qty INT NOT NULL DEFAULT 0,
+    vip_qty INT NOT NULL DEFAULT 0,
+    status ENUM('active', 'booked', 'released', 'expired') DEFAULT 'active',
+    expires_at DATETIME NOT NULL,
+    booking_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_ticket_holds_active (status, expires_at),
+    FOREIGN KEY (event_id) REFERENCES events(id)
+);
+
+-- Seats held by each hold (reserved seating only)
+CREATE TABLE ticket_hold_seats (
+    hold_id INT NOT NULL,
+    section_id INT NOT NULL,
+    seat_index INT NOT NULL,
+    PRIMARY KEY (hold_id, section_id, seat_index),
+    FOREIGN KEY (hold_id) REFERENCES ticket_holds(id),
+    FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+);
+
+-- Change feed: one row per committed write, applied by every API process to its caches (see change_feed.py)
+CREATE TABLE change_feed (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    topic VARCHAR(20) NOT NULL,
+    entity_id INT,
+    organizer_id INT,
+    origin VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_change_feed_created (created_at)
+);
+
 -- Categories table
 CREATE TABLE categories (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -121,3 +238,4 @@ CREATE INDEX idx_events_category ON events(category);
 CREATE INDEX idx_bookings_reference ON bookings(booking_reference);
 CREATE INDEX idx_bookings_user ON bookings(user_id);
 CREATE INDEX idx_payments_booking ON payments(booking_id);
+CREATE INDEX idx_payments_status ON payments(payment_status);
@@ -3,46 +3,276 @@ Database Connection Module
 Using MySQL Connector Python
 """
 
-import mysql.connector
-from mysql.connector import Error
+import itertools
 import os
-from dotenv import load_dotenv
+import queue
+import threading
+import time
 
-# Load environment variables from .env file
-load_dotenv()
+# mysql.connector and python-dotenv are imported on first use so that
+# importing this module (and server.py) stays cheap
+mysql_connector = None
+_env_loaded = False
+_init_lock = threading.Lock()
 
-def get_db_connection():
+# Connection pools: the primary (DB_HOST) takes all writes; replicas
+# (DB_REPLICAS) serve reads that ask for one. Created by load_driver().
+_primary = None
+_replicas = []
+_pool_closed = False
+_checked_out = {}
+_route_lock = threading.Lock()
+_round_robin = itertools.count()
+
+# Read-your-writes: key -> monotonic time until which reads go to the primary
+_pins = {}
+
+class _Pool:
+    """Idle connections to one MySQL server, and how many are checked out"""
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.in_use = 0
+        self.down_until = 0.0
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+def load_env():
+    """
+    Load environment variables from the .env file (once)
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+def parse_replicas(spec, default_port=3306):
+    """Parse a DB_REPLICAS spec such as "10.0.0.2,10.0.0.3:3307" into [(host, port)]"""
+    replicas = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(':') if ':' in item else (item, '', '')
+        replicas.append((host, int(port or default_port)))
+    return replicas
+
+def load_driver():
+    """
+    Import the MySQL driver and create the connection pools on first use
     """
-    Create and return a database connection
+    global mysql_connector, _primary, _replicas
+    if mysql_connector is None:
+        with _init_lock:
+            if mysql_connector is None:
+                load_env()
+                import mysql.connector
+                size = int(os.getenv('DB_POOL_SIZE', 8))
+                port = int(os.getenv('DB_PORT', 3306))
+                _primary = _Pool(os.getenv('DB_HOST', 'localhost'), port, size)
+                _replicas = [_Pool(host, replica_port, size)
+                             for host, replica_port in parse_replicas(os.getenv('DB_REPLICAS', ''), port)]
+                mysql_connector = mysql.connector
+    return mysql_connector
+
+def pin_to_primary(key, seconds=None):
+    """
+    Send reads made with this key to the primary for a while, e.g. a
+    merchant right after they change an event, so they see their write
+    even if the replicas lag behind
+    """
+    if seconds is None:
+        seconds = float(os.getenv('DB_PIN_SECONDS', 5))
+    with _route_lock:
+        now = time.monotonic()
+        # Drop expired pins so the map stays as small as the write rate
+        for expired in [k for k, until in _pins.items() if until <= now]:
+            del _pins[expired]
+        _pins[key] = now + seconds
+
+def _choose_pool(replica, pin):
+    """Pick the pool for a request (caller holds _route_lock)"""
+    if not replica or not _replicas:
+        return _primary
+    if pin is not None and _pins.get(pin, 0) > time.monotonic():
+        return _primary
+
+    now = time.monotonic()
+    healthy = [pool for pool in _replicas if pool.down_until <= now]
+    if not healthy:
+        return _primary
+    # Rotate the starting point so ties are spread evenly
+    offset = next(_round_robin) % len(healthy)
+    rotated = healthy[offset:] + healthy[:offset]
+    if os.getenv('DB_REPLICA_STRATEGY', 'least_load') == 'round_robin':
+        return rotated[0]
+    return min(rotated, key=lambda pool: pool.in_use)
+
+def get_db_connection(replica=False, pin=None):
+    """
+    Return a pooled database connection, opening a new one if none are idle.
+    Read-only callers pass replica=True to be routed to a replica (when
+    DB_REPLICAS is set) unless pin was recently passed to pin_to_primary().
     """
+    driver = load_driver()
+    with _route_lock:
+        pool = _choose_pool(replica, pin)
+        pool.in_use += 1
+
+    try:
+        connection = _connect(driver, pool)
+    except driver.Error:
+        with _route_lock:
+            pool.in_use -= 1
+            if pool is _primary:
+                raise
+            # Leave a failing replica alone for a while and read from the primary
+            pool.down_until = time.monotonic() + float(os.getenv('DB_REPLICA_RETRY', 10))
+            print(f"Replica {pool.name} unavailable, reading from primary")
+        return get_db_connection()
+
+    with _route_lock:
+        _checked_out[id(connection)] = pool
+    return connection
+
+def _connect(driver, pool):
+    while True:
+        try:
+            connection = pool.idle.get_nowait()
+        except queue.Empty:
+            break
+        if connection.is_connected():
+            return connection
+
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
+        return driver.connect(
+            host=pool.host,
             database=os.getenv('DB_NAME', 'itech_events'),
             user=os.getenv('DB_USER', 'root'),
             password=os.getenv('DB_PASS', ''),
-            port=int(os.getenv('DB_PORT', 3306))
+            port=pool.port
         )
-        return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+    except driver.Error as e:
+        print(f"Error connecting to MySQL at {pool.name}: {e}")
         raise e
 
+def _check_in(connection):
+    """Stop tracking a connection and return the pool it came from"""
+    with _route_lock:
+        pool = _checked_out.pop(id(connection), None)
+        if pool is not None:
+            pool.in_use -= 1
+    return pool or _primary
+
 def close_connection(connection):
     """
-    Close database connection
+    Return a database connection to its pool, or close it if the pool is
+    full or shut down
     """
-    if connection and connection.is_connected():
+    if not connection:
+        return
+    pool = _check_in(connection)
+    if not connection.is_connected():
+        return
+
+    if not _pool_closed:
+        try:
+            # Never hand out a connection with an open transaction (or
+            # a stale REPEATABLE READ snapshot) to the next caller
+            if connection.in_transaction:
+                connection.rollback()
+            pool.idle.put_nowait(connection)
+            return
+        except (mysql_connector.Error, queue.Full):
+            pass
+
+    connection.close()
+
+def discard_connection(connection):
+    """Close a connection that must not be reused, e.g. one with unread rows"""
+    if not connection:
+        return
+    _check_in(connection)
+    try:
         connection.close()
+    except mysql_connector.Error:
+        pass
+
+def warm_pool(size):
+    """
+    Open up to size connections concurrently to the primary and to each
+    replica, and park them in their pools. Returns the number of idle
+    primary connections afterwards.
+    """
+    load_driver()
+    opened = []
+    lock = threading.Lock()
+
+    def open_one(pool):
+        try:
+            connection = _connect(mysql_connector, pool)
+        except Exception:
+            return
+        with lock:
+            opened.append((pool, connection))
+
+    threads = [threading.Thread(target=open_one, args=(pool,))
+               for pool in [_primary] + _replicas for _ in range(size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for pool, connection in opened:
+        try:
+            pool.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+    return _primary.idle.qsize()
+
+def pool_size():
+    """Number of idle pooled primary connections"""
+    return _primary.idle.qsize() if _primary is not None else 0
+
+def pool_stats():
+    """Idle and checked-out connections per server, for /ready"""
+    if _primary is None:
+        return {}
+    return {pool.name: {'idle': pool.idle.qsize(), 'inUse': pool.in_use,
+                        'role': 'primary' if pool is _primary else 'replica',
+                        'down': pool.down_until > time.monotonic()}
+            for pool in [_primary] + _replicas}
+
+def close_pool():
+    """
+    Close every idle pooled connection; connections still checked out are
+    closed when they are returned
+    """
+    global _pool_closed
+    _pool_closed = True
+    if _primary is None:
+        return
+    for pool in [_primary] + _replicas:
+        while True:
+            try:
+                connection = pool.idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except mysql_connector.Error:
+                pass
 
 def generate_booking_reference():
     """
     Generate unique booking reference
     """
-    import hashlib
-    import time
-    random_str = hashlib.md5(str(time.time()).encode()).hexdigest()[:6]
-    return f"ITECH-{random_str.upper()}"
+    from booking_reference import generate_booking_reference as next_reference
+    return next_reference()
 
 def format_price(price):
     """
@@ -51,7 +281,7 @@ def format_price(price):
     return f"KSh {price:,.0f}"
 
 if __name__ == "__main__":
-    # Test connection
+    # Test connection, and show where reads and writes are routed
     try:
         conn = get_db_connection()
         if conn.is_connected():
@@ -61,5 +291,16 @@ if __name__ == "__main__":
             version = cursor.fetchone()
             print(f"MySQL Version: {version[0]}")
             close_connection(conn)
-    except Error as e:
+
+        for label, kwargs in [('write', {}), ('read', {'replica': True}), ('read', {'replica': True}),
+                              ('pinned read', {'replica': True, 'pin': 'check'})]:
+            if label == 'pinned read':
+                pin_to_primary('check')
+            conn = get_db_connection(**kwargs)
+            cursor = conn.cursor()
+            cursor.execute("SELECT @@hostname, @@port")
+            host, port = cursor.fetchone()
+            print(f"{label:12} -> {host}:{port}")
+            close_connection(conn)
+    except Exception as e:
         print(f"Error: {e}")
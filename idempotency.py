@@ -0,0 +1,225 @@
+"""
+Idempotency Module
+Replays stored responses for POST requests retried with an Idempotency-Key
+
+Keys are claimed in the idempotency_keys table so retries are recognised
+across processes and restarts; recent responses are also kept in a bounded
+in-memory cache so most replays never touch the database. Rows older than
+the retention period can no longer be replayed and are pruned, at most
+once every prune_interval seconds per process.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from db_connection import get_db_connection, close_connection
+
+MAX_KEY_LENGTH = 128
+
+class IdempotencyStore:
+    """
+    Runs each (route, key) at most once. Concurrent duplicates in this
+    process wait on the first attempt; duplicates in other processes poll
+    the key row until it completes.
+    """
+
+    def __init__(self, max_entries=10000, wait_timeout=10.0, lock_timeout=60, retention_hours=24,
+                 prune_interval=300.0):
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self.retention_hours = retention_hours
+        self.prune_interval = prune_interval
+        self._responses = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def run(self, route, key, body, handler):
+        """Return handler()'s result for the first request with this key, and replay it for retries"""
+        if len(key) > MAX_KEY_LENGTH:
+            return {'status': 400, 'body': {'success': False, 'message': 'Idempotency-Key is too long'}}
+
+        request_hash = hashlib.sha256(body or b'').hexdigest()
+        cache_key = (route, key)
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            with self._lock:
+                cached = self._responses.get(cache_key)
+                if cached is not None:
+                    self._responses.move_to_end(cache_key)
+                    return self._replay(cached, request_hash)
+                event = self._in_flight.get(cache_key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self._in_flight[cache_key] = event
+
+            if owner:
+                break
+            # Wait for the first attempt, then re-check the cache. If it
+            # failed without storing a response we become the owner.
+            if not event.wait(max(0, deadline - time.monotonic())):
+                return self._in_progress()
+
+        try:
+            return self._run_owner(route, key, request_hash, handler, deadline)
+        finally:
+            with self._lock:
+                del self._in_flight[cache_key]
+            event.set()
+
+    def _run_owner(self, route, key, request_hash, handler, deadline):
+        try:
+            stored = self._claim(route, key, request_hash, deadline)
+        except Exception as e:
+            return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+
+        if stored == 'busy':
+            return self._in_progress()
+        if stored is not None:
+            self._remember(route, key, stored)
+            return self._replay(stored, request_hash)
+
+        result = handler()
+        try:
+            if result['status'] < 500:
+                self._complete(route, key, result)
+                self._remember(route, key, (request_hash, result))
+            else:
+                # Let the client retry a failed attempt for real
+                self._release(route, key)
+        except Exception as e:
+            print(f"Idempotency key {key} could not be stored: {e}")
+        self._maybe_prune()
+        return result
+
+    def prune(self, limit=10000):
+        """Delete keys older than the retention period; returns how many"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL %s HOUR LIMIT %s
+            """, (self.retention_hours, limit))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            close_connection(conn)
+
+    def _maybe_prune(self):
+        with self._lock:
+            if time.monotonic() - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = time.monotonic()
+        try:
+            self.prune()
+        except Exception as e:
+            print(f"Idempotency key pruning failed: {e}")
+
+    def _claim(self, route, key, request_hash, deadline):
+        """
+        Insert an in_progress row for the key. Returns None when claimed,
+        a stored (request_hash, result) when the key already completed, or
+        'busy' when another process is still working on it.
+        """
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            while True:
+                cursor.execute("""
+                    INSERT IGNORE INTO idempotency_keys (route, idempotency_key, request_hash)
+                    VALUES (%s, %s, %s)
+                """, (route, key, request_hash))
+                conn.commit()
+                if cursor.rowcount == 1:
+                    return None
+
+                cursor.execute("""
+                    SELECT request_hash, status, response_status, response_body,
+                           TIMESTAMPDIFF(SECOND, created_at, NOW()) AS age
+                    FROM idempotency_keys WHERE route = %s AND idempotency_key = %s
+                """, (route, key))
+                row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    continue
+
+                expired = row['age'] > self.retention_hours * 3600
+                abandoned = row['status'] == 'in_progress' and row['age'] > self.lock_timeout
+                if expired or abandoned:
+                    # Take over a key whose owner crashed, or reuse an old one
+                    cursor.execute("""
+                        UPDATE idempotency_keys
+                        SET request_hash = %s, status = 'in_progress', response_status = NULL,
+                            response_body = NULL, created_at = NOW()
+                        WHERE route = %s AND idempotency_key = %s AND request_hash = %s
+                          AND status = %s
+                    """, (request_hash, route, key, row['request_hash'], row['status']))
+                    conn.commit()
+                    if cursor.rowcount == 1:
+                        return None
+                    continue
+
+                if row['status'] == 'completed':
+                    result = {'status': row['response_status'], 'body': json.loads(row['response_body'])}
+                    return (row['request_hash'], result)
+
+                if time.monotonic() >= deadline:
+                    return 'busy'
+                time.sleep(0.05)
+        finally:
+            close_connection(conn)
+
+    def _complete(self, route, key, result):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE idempotency_keys
+                SET status = 'completed', response_status = %s, response_body = %s
+                WHERE route = %s AND idempotency_key = %s
+            """, (result['status'], json.dumps(result['body'], default=str), route, key))
+            conn.commit()
+        finally:
+            close_connection(conn)
+
+    def _release(self, route, key):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM idempotency_keys
+                WHERE route = %s AND idempotency_key = %s AND status = 'in_progress'
+            """, (route, key))
+            conn.commit()
+        finally:
+            close_connection(conn)
+
+    def _remember(self, route, key, stored):
+        with self._lock:
+            self._responses[(route, key)] = stored
+            self._responses.move_to_end((route, key))
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+    def _replay(self, stored, request_hash):
+        stored_hash, result = stored
+        if stored_hash != request_hash:
+            return {'status': 422, 'body': {
+                'success': False,
+                'message': 'Idempotency-Key was already used with a different request'
+            }}
+        headers = dict(result.get('headers', {}))
+        headers['Idempotent-Replayed'] = 'true'
+        return {'status': result['status'], 'headers': headers, 'body': result['body']}
+
+    def _in_progress(self):
+        return {'status': 409, 'headers': {'Retry-After': '1'}, 'body': {
+            'success': False,
+            'message': 'A request with this Idempotency-Key is still being processed'
+        }}
@@ -0,0 +1,202 @@
+"""
+Image Variants Module
+Resized, re-encoded copies of site images, generated once and cached on disk
+
+A variant is a source image scaled down to one of WIDTHS and encoded as
+AVIF, WebP or the source's own format, whichever is best among those the
+client accepts. Variant files are named after a hash of the source bytes
+plus width and format, so replacing a source image never serves a stale
+variant. Pillow is optional: without it the original file is served.
+
+Usage: python image_variants.py   (pre-generate variants for images/)
+"""
+
+import hashlib
+import os
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Widths a requested width is rounded up to, so the cache stays small
+WIDTHS = (80, 160, 320, 480, 640, 960, 1280)
+
+SOURCE_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+# Preferred output formats, best first: (content type, Pillow format, extension, save options)
+MODERN_FORMATS = (
+    ('image/avif', 'AVIF', '.avif', {'quality': 50, 'speed': 6}),
+    ('image/webp', 'WEBP', '.webp', {'quality': 75, 'method': 4}),
+)
+FALLBACK_FORMATS = {
+    'image/jpeg': ('image/jpeg', 'JPEG', '.jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'image/png': ('image/png', 'PNG', '.png', {'optimize': True}),
+}
+
+def load_pillow():
+    """Return PIL.Image, or None if Pillow is not installed"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        # Older Pillow builds get AVIF from this plugin, when present
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return Image
+
+class Variant:
+    """A servable image file"""
+
+    __slots__ = ('path', 'content_type', 'etag')
+
+    def __init__(self, path, content_type, etag):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+
+class ImageVariants:
+    """
+    Finds or generates the variant of a source image for a width and an
+    Accept header. Sources must live under one of source_dirs.
+    """
+
+    def __init__(self, source_dirs=('images',), cache_dir='image_cache', widths=WIDTHS):
+        self.source_dirs = [os.path.join(BASE_DIR, d) for d in source_dirs]
+        self.cache_dir = os.path.join(BASE_DIR, cache_dir)
+        self.widths = tuple(sorted(widths))
+        self.Image = load_pillow()
+        self._sources = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.Image is not None
+
+    def source_path(self, src):
+        """Absolute path of a source image, or None if src is not one"""
+        src = (src or '').split('?', 1)[0].lstrip('/')
+        if os.path.splitext(src)[1].lower() not in SOURCE_TYPES:
+            return None
+        path = os.path.realpath(os.path.join(BASE_DIR, src))
+        for source_dir in self.source_dirs:
+            if path.startswith(source_dir + os.sep) and os.path.isfile(path):
+                return path
+        return None
+
+    def choose_format(self, source_type, accept):
+        """Best output format the client accepts, falling back to the source's own"""
+        for fmt in MODERN_FORMATS:
+            if fmt[0] in accept and fmt[1] in self.Image.SAVE:
+                return fmt
+        return FALLBACK_FORMATS.get(source_type)
+
+    def choose_width(self, requested):
+        """Round a requested width up to a known width (0 means the largest)"""
+        for width in self.widths:
+            if width >= requested > 0:
+                return width
+        return self.widths[-1]
+
+    def get(self, src, width, accept=''):
+        """
+        Return the Variant to serve for src at width, generating it on
+        first use. Raises FileNotFoundError if src is not a source image.
+        """
+        path = self.source_path(src)
+        if path is None:
+            raise FileNotFoundError(src)
+        source_type = SOURCE_TYPES[os.path.splitext(path)[1].lower()]
+        digest, source_width = self._source_info(path)
+        original = Variant(path, source_type, f'"{digest}"')
+        if not self.enabled:
+            return original
+
+        fmt = self.choose_format(source_type, accept or '')
+        if fmt is None:
+            # GIF or WebP source and a client without WebP support
+            return original
+        content_type, pil_format, ext, options = fmt
+
+        # Never upscale: widths past the source's share one re-encoded copy
+        width = min(self.choose_width(width), source_width)
+        name = f"{digest}-{width}{ext}"
+        cached = os.path.join(self.cache_dir, name)
+        if not os.path.exists(cached):
+            with self._key_lock(name):
+                if not os.path.exists(cached):
+                    self._generate(path, cached, width, pil_format, options)
+        return Variant(cached, content_type, f'"{name}"')
+
+    def pregenerate(self, src):
+        """Generate every width in every format for one source; returns the file count"""
+        paths = set()
+        for width in self.widths:
+            for accept in [fmt[0] for fmt in MODERN_FORMATS] + ['']:
+                paths.add(self.get(src, width, accept).path)
+        return len(paths)
+
+    def _generate(self, path, cached, width, pil_format, options):
+        Image = self.Image
+        from PIL import ImageOps
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            if width < img.width:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), Image.LANCZOS)
+            if pil_format == 'JPEG':
+                img = img.convert('RGB')
+            elif img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                img.save(temp, pil_format, **options)
+                os.replace(temp, cached)
+            finally:
+                if os.path.exists(temp):
+                    os.remove(temp)
+
+    def _source_info(self, path):
+        """(content hash, pixel width) of a source file, re-read only when it changes"""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            known = self._sources.get(path)
+        if known and known[0] == key:
+            return known[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        width = self.widths[-1]
+        if self.enabled:
+            # Only the header is read here, not the pixels
+            with self.Image.open(path) as img:
+                width = img.width
+        with self._lock:
+            self._sources[path] = (key, (digest, width))
+        return digest, width
+
+    def _key_lock(self, name):
+        with self._lock:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = self._locks[name] = threading.Lock()
+            return lock
+
+if __name__ == '__main__':
+    variants = ImageVariants()
+    if not variants.enabled:
+        print("Pillow is not installed (pip install Pillow); originals will be served as-is")
+    else:
+        for name in sorted(os.listdir(os.path.join(BASE_DIR, 'images'))):
+            src = f"images/{name}"
+            if variants.source_path(src):
+                print(f"{src}: {variants.pregenerate(src)} variants")
@@ -0,0 +1,189 @@
+"""
+Load Shedding Module
+Bounded in-flight admission per route class with CoDel-style queue delay control
+"""
+
+import math
+import os
+import threading
+import time
+
+# route class -> (max in-flight requests, max queued requests)
+DEFAULT_LIMITS = {
+    'read': (32, 64),
+    'write': (8, 32),
+    'booking': (8, 64),
+}
+
+BOOKING_ROUTES = ('/api_book_ticket.py', '/api_hold_tickets.py', '/api_release_hold.py')
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted"""
+
+    def __init__(self, route_class, reason, retry_after):
+        super().__init__(f"{route_class} overloaded: {reason}")
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+def classify_route(path, method):
+    """Map an API request onto its admission route class"""
+    if path in BOOKING_ROUTES:
+        return 'booking'
+    if method == 'POST':
+        return 'write'
+    return 'read'
+
+def parse_limits(spec):
+    """Parse an ADMISSION_LIMITS spec such as "read=32:64,write=8:32" """
+    limits = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition('=')
+        in_flight, _, queue = value.partition(':')
+        limits[name.strip()] = (int(in_flight), int(queue or 0))
+    return limits
+
+class RouteClass:
+    """Admission state for one route class"""
+
+    __slots__ = ('name', 'max_in_flight', 'max_queue', 'in_flight', 'waiting',
+                 'cond', 'first_above_time', 'dropping', 'drop_next', 'drop_count',
+                 'admitted', 'shed')
+
+    def __init__(self, name, max_in_flight, max_queue, lock):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.cond = threading.Condition(lock)
+        self.first_above_time = 0.0
+        self.dropping = False
+        self.drop_next = 0.0
+        self.drop_count = 0
+        self.admitted = 0
+        self.shed = 0
+
+class AdmissionController:
+    """
+    Caps concurrent requests per route class. Excess requests wait in a
+    bounded queue; once queue delay stays above `target` for a whole
+    `interval` the class enters CoDel's dropping state and sheds queued
+    requests at an increasing rate until delay falls back under target.
+    """
+
+    def __init__(self, limits=None, target=0.05, interval=0.5, max_wait=2.0):
+        merged = dict(DEFAULT_LIMITS)
+        if limits:
+            merged.update(limits)
+        self._lock = threading.Lock()
+        self.classes = {
+            name: RouteClass(name, in_flight, queue, self._lock)
+            for name, (in_flight, queue) in merged.items()
+        }
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+
+    def acquire(self, name):
+        """
+        Wait for an in-flight slot in route class `name`.
+        Returns the queue delay in seconds or raises Overloaded.
+        """
+        rc = self.classes[name]
+        start = time.monotonic()
+        with rc.cond:
+            if rc.in_flight >= rc.max_in_flight:
+                # Fail fast rather than queue when the queue is full or
+                # the class is already shedding
+                if rc.waiting >= rc.max_queue:
+                    self._shed(rc, 'queue full')
+                if rc.dropping:
+                    self._shed(rc, 'queue delay above target')
+
+                rc.waiting += 1
+                try:
+                    deadline = start + self.max_wait
+                    while rc.in_flight >= rc.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._shed(rc, 'timed out waiting for a slot')
+                        rc.cond.wait(remaining)
+                finally:
+                    rc.waiting -= 1
+
+            now = time.monotonic()
+            sojourn = now - start
+            if self._should_drop(rc, sojourn, now):
+                rc.cond.notify()
+                self._shed(rc, 'queue delay above target')
+
+            rc.in_flight += 1
+            rc.admitted += 1
+        return sojourn
+
+    def release(self, name):
+        """Give back the slot taken by acquire()"""
+        rc = self.classes[name]
+        with rc.cond:
+            rc.in_flight -= 1
+            rc.cond.notify()
+
+    def _should_drop(self, rc, sojourn, now):
+        """CoDel control law, evaluated when a request leaves the queue"""
+        if sojourn < self.target:
+            rc.first_above_time = 0.0
+            rc.dropping = False
+            return False
+
+        if rc.first_above_time == 0.0:
+            rc.first_above_time = now + self.interval
+            return False
+        if now < rc.first_above_time:
+            return False
+
+        if not rc.dropping:
+            rc.dropping = True
+            rc.drop_count = 1
+            rc.drop_next = now + self.interval
+            return True
+        if now >= rc.drop_next:
+            rc.drop_count += 1
+            rc.drop_next = now + self.interval / math.sqrt(rc.drop_count)
+            return True
+        return False
+
+    def _shed(self, rc, reason):
+        rc.shed += 1
+        raise Overloaded(rc.name, reason, max(self.interval, self.max_wait))
+
+    def total_in_flight(self):
+        """Requests currently admitted across all route classes"""
+        with self._lock:
+            return sum(rc.in_flight for rc in self.classes.values())
+
+    def snapshot(self):
+        """Per-class counters for diagnostics"""
+        with self._lock:
+            return {
+                rc.name: {
+                    'inFlight': rc.in_flight,
+                    'waiting': rc.waiting,
+                    'dropping': rc.dropping,
+                    'admitted': rc.admitted,
+                    'shed': rc.shed,
+                }
+                for rc in self.classes.values()
+            }
+
+def create_admission_controller():
+    """Build the controller from ADMISSION_LIMITS / CODEL_TARGET_MS / CODEL_INTERVAL_MS / ADMISSION_MAX_WAIT_MS"""
+    return AdmissionController(
+        limits=parse_limits(os.getenv('ADMISSION_LIMITS', '')),
+        target=float(os.getenv('CODEL_TARGET_MS', 50)) / 1000,
+        interval=float(os.getenv('CODEL_INTERVAL_MS', 500)) / 1000,
+        max_wait=float(os.getenv('ADMISSION_MAX_WAIT_MS', 2000)) / 1000,
+    )
@@ -0,0 +1,126 @@
+"""
+Merchant Cache Module
+Per-merchant results kept in memory, bounded by total size and age
+
+Entries are evicted least-recently-used first once their estimated size
+(their JSON encoding) would exceed max_bytes, and expire after ttl
+seconds. Writes invalidate the affected merchant's entry.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class _Load:
+    """A load in progress for one key, shared by concurrent misses"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.invalidated = False
+
+class MerchantCache:
+    """
+    LRU + TTL cache with single-flight loading per key. An invalidation
+    during a load stops that load's result from being stored, and later
+    requests start a fresh load instead of joining it.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._loads = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    value, size, expires = entry
+                    if time.monotonic() < expires:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return value
+                    self._remove(key)
+                load = self._loads.get(key)
+                owner = load is None
+                if owner:
+                    load = self._loads[key] = _Load()
+                    self.misses += 1
+                else:
+                    self.hits += 1
+
+            if owner:
+                break
+            load.done.wait()
+            if load.value is not None:
+                return load.value
+            # The shared load failed; try again ourselves
+
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                if self._loads.get(key) is load:
+                    del self._loads[key]
+            load.done.set()
+            raise
+
+        size = len(json.dumps(value, default=str))
+        with self._lock:
+            if self._loads.get(key) is load:
+                del self._loads[key]
+            if not load.invalidated:
+                self._store(key, value, size)
+        load.value = value
+        load.done.set()
+        return value
+
+    def invalidate(self, key):
+        """Drop key's entry, and keep any load already running from storing"""
+        with self._lock:
+            self.invalidations += 1
+            if key in self._entries:
+                self._remove(key)
+            load = self._loads.pop(key, None)
+            if load is not None:
+                load.invalidated = True
+
+    def stats(self):
+        """Counters and current size, for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _store(self, key, value, size):
+        """Insert an entry, evicting from the LRU end to fit (caller holds the lock)"""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        while self._bytes + size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        self._entries[key] = (value, size, time.monotonic() + self.ttl)
+        self._bytes += size
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
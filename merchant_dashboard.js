@@ -110,10 +110,16 @@ function initializeEventListeners() {
     const createEventForm = document.getElementById('createEventForm');
     createEventForm.addEventListener('submit', handleCreateEvent);
 
+    // Event image upload fills in the image URL
+    document.getElementById('eventImageFile').addEventListener('change', handleImageUpload);
+
     // Edit event form
     const editEventForm = document.getElementById('editEventForm');
     editEventForm.addEventListener('submit', handleEditEvent);
 
+    // Analytics window
+    document.getElementById('analyticsGranularity').addEventListener('change', loadAnalytics);
+
     // Delete confirmation
     document.getElementById('confirmDeleteBtn').addEventListener('click', handleConfirmDelete);
     document.getElementById('cancelDeleteBtn').addEventListener('click', closeDeleteModal);
@@ -174,6 +180,8 @@ function switchTab(tabId) {
         loadMerchantEvents();
     } else if (tabId === 'overview') {
         loadOverviewStats();
+    } else if (tabId === 'analytics') {
+        loadAnalytics();
     } else if (tabId === 'settings') {
         loadProfileData();
     }
@@ -225,6 +233,61 @@ async function loadOverviewStats() {
     }
 }
 
+/**
+ * Load sales analytics from the rollup-backed endpoint
+ */
+async function loadAnalytics() {
+    const granularity = document.getElementById('analyticsGranularity').value;
+    const ticketsChart = document.getElementById('ticketsChart');
+    const revenueChart = document.getElementById('revenueChart');
+
+    try {
+        const response = await fetch(`api_get_sales_analytics.py?merchantId=${currentMerchant.id}&granularity=${granularity}`);
+        const result = await response.json();
+
+        if (!result.success || result.data.events.length === 0) {
+            ticketsChart.innerHTML = '<p class="no-data">No data available</p>';
+            revenueChart.innerHTML = '<p class="no-data">No data available</p>';
+            return;
+        }
+
+        // Tickets per bucket across all events
+        const buckets = {};
+        result.data.events.forEach(event => {
+            event.series.forEach(point => {
+                buckets[point.bucket] = (buckets[point.bucket] || 0) + point.standard.tickets + point.vip.tickets;
+            });
+        });
+        const bucketRows = Object.keys(buckets).sort().map(bucket => ({
+            label: granularity === 'hour'
+                ? new Date(bucket).toLocaleString('en-KE', { month: 'short', day: 'numeric', hour: '2-digit' })
+                : formatDate(bucket),
+            value: buckets[bucket]
+        }));
+        ticketsChart.innerHTML = renderBarChart(bucketRows, value => value.toLocaleString());
+
+        // Revenue per event in the window
+        const revenueRows = result.data.events.map(event => ({ label: event.title, value: event.totals.revenue }));
+        revenueChart.innerHTML = renderBarChart(revenueRows, value => `KSh ${value.toLocaleString()}`);
+    } catch (error) {
+        console.error('Error loading analytics:', error);
+    }
+}
+
+/**
+ * Render rows of {label, value} as horizontal bars
+ */
+function renderBarChart(rows, formatValue) {
+    const max = Math.max(...rows.map(row => row.value), 1);
+    return `<div class="bar-chart">${rows.map(row => `
+        <div class="bar-row">
+            <span class="bar-label">${row.label}</span>
+            <div class="bar-track"><div class="bar-fill" style="width: ${(row.value / max) * 100}%"></div></div>
+            <span class="bar-value">${formatValue(row.value)}</span>
+        </div>
+    `).join('')}</div>`;
+}
+
 /**
  * Update activity list
  */
@@ -307,7 +370,7 @@ function renderEventsList(events) {
     container.innerHTML = events.map(event => `
         <div class="event-manage-card" data-event-id="${event.id}">
             <div class="event-manage-image">
-                ${event.image_url ? `<img src="${event.image_url}" alt="${event.title}">` : '<div class="no-image"><i class="fas fa-image"></i></div>'}
+                ${event.image_url ? `<img ${imageAttributes(event.image_url, '200px')} alt="${event.title}" loading="lazy" decoding="async">` : '<div class="no-image"><i class="fas fa-image"></i></div>'}
                 <span class="event-status-badge status-${event.status}">${capitalizeFirst(event.status)}</span>
             </div>
             <div class="event-manage-details">
@@ -328,6 +391,9 @@ function renderEventsList(events) {
                 <button class="btn btn-outline btn-sm" onclick="openDeleteModal(${event.id})">
                     <i class="fas fa-trash"></i> Delete
                 </button>
+                <a class="btn btn-outline btn-sm" href="api_export_bookings.py?merchantId=${currentMerchant.id}&eventId=${event.id}" download>
+                    <i class="fas fa-file-csv"></i> Export
+                </a>
             </div>
         </div>
     `).join('');
@@ -357,6 +423,26 @@ function filterEvents() {
     renderEventsList(filtered);
 }
 
+/**
+ * src/srcset for an event image: local images come as resized WebP/AVIF
+ * variants sized for the 200px card, other URLs are used as-is
+ */
+function imageAttributes(url, sizes) {
+    if (!/^\/?(images|uploads)\//.test(url)) return `src="${url}"`;
+    const variant = width => `api_image.py?src=${encodeURIComponent(url)}&w=${width}`;
+    return `src="${variant(320)}" srcset="${variant(320)} 320w, ${variant(480)} 480w" sizes="${sizes}"`;
+}
+
+/**
+ * Unique key per submission so a retried POST is not applied twice
+ */
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
 /**
  * Handle create event form submission
  */
@@ -380,6 +466,7 @@ async function handleCreateEvent(e) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/x-www-form-urlencoded',
+                'Idempotency-Key': newIdempotencyKey(),
             },
             body: new URLSearchParams(data)
         });
@@ -404,6 +491,38 @@ async function handleCreateEvent(e) {
     }
 }
 
+/**
+ * Upload the chosen event image and put its URL in the image field
+ */
+async function handleImageUpload(e) {
+    const file = e.target.files[0];
+    if (!file) return;
+
+    const urlInput = document.getElementById('eventImage');
+    const body = new FormData();
+    body.append('image', file);
+    urlInput.disabled = true;
+
+    try {
+        const response = await fetch('api_upload_image.py', { method: 'POST', body: body });
+        const result = await response.json();
+
+        if (result.success) {
+            urlInput.value = result.data.url;
+            showToast('Image uploaded', 'success');
+        } else {
+            e.target.value = '';
+            showToast(result.message || 'Failed to upload image', 'error');
+        }
+    } catch (error) {
+        console.error('Error uploading image:', error);
+        e.target.value = '';
+        showToast('Failed to upload image. Please try again.', 'error');
+    } finally {
+        urlInput.disabled = false;
+    }
+}
+
 /**
  * Open edit modal
  */
@@ -0,0 +1,243 @@
+"""
+Database Migration Script
+Brings an existing itech_events database up to date with database.sql
+Usage: python migrate_database.py
+
+Each migration runs once and is recorded in schema_migrations.
+"""
+
+from db_connection import get_db_connection, close_connection
+
+MIGRATIONS = [
+    ('001_idempotency_keys', [
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            route VARCHAR(100) NOT NULL,
+            idempotency_key VARCHAR(128) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            status ENUM('in_progress', 'completed') DEFAULT 'in_progress',
+            response_status INT,
+            response_body MEDIUMTEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (route, idempotency_key)
+        )
+        """,
+    ]),
+    ('002_sales_rollups', [
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollup_hourly (
+            organizer_id INT NOT NULL,
+            event_id INT NOT NULL,
+            ticket_type ENUM('standard', 'vip') NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            tickets INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, bucket_start, ticket_type),
+            INDEX idx_rollup_hourly_merchant (organizer_id, bucket_start)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sales_rollup_daily (
+            organizer_id INT NOT NULL,
+            event_id INT NOT NULL,
+            ticket_type ENUM('standard', 'vip') NOT NULL,
+            bucket_date DATE NOT NULL,
+            tickets INT NOT NULL DEFAULT 0,
+            revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, bucket_date, ticket_type),
+            INDEX idx_rollup_daily_merchant (organizer_id, bucket_date)
+        )
+        """,
+        # Backfill from existing bookings
+        """
+        INSERT INTO sales_rollup_hourly (organizer_id, event_id, ticket_type, bucket_start, tickets, revenue)
+        SELECT e.organizer_id, b.event_id, tt.type_name, DATE_FORMAT(b.created_at, '%Y-%m-%d %H:00:00'),
+               SUM(bt.quantity), SUM(bt.subtotal)
+        FROM booking_tickets bt
+        JOIN bookings b ON b.id = bt.booking_id
+        JOIN ticket_types tt ON tt.id = bt.ticket_type_id
+        JOIN events e ON e.id = b.event_id
+        WHERE b.payment_status NOT IN ('failed', 'refunded')
+        GROUP BY e.organizer_id, b.event_id, tt.type_name, DATE_FORMAT(b.created_at, '%Y-%m-%d %H:00:00')
+        ON DUPLICATE KEY UPDATE tickets = VALUES(tickets), revenue = VALUES(revenue)
+        """,
+        """
+        INSERT INTO sales_rollup_daily (organizer_id, event_id, ticket_type, bucket_date, tickets, revenue)
+        SELECT e.organizer_id, b.event_id, tt.type_name, DATE(b.created_at), SUM(bt.quantity), SUM(bt.subtotal)
+        FROM booking_tickets bt
+        JOIN bookings b ON b.id = bt.booking_id
+        JOIN ticket_types tt ON tt.id = bt.ticket_type_id
+        JOIN events e ON e.id = b.event_id
+        WHERE b.payment_status NOT IN ('failed', 'refunded')
+        GROUP BY e.organizer_id, b.event_id, tt.type_name, DATE(b.created_at)
+        ON DUPLICATE KEY UPDATE tickets = VALUES(tickets), revenue = VALUES(revenue)
+        """,
+    ]),
+    ('003_event_view_counts', [
+        """
+        CREATE TABLE IF NOT EXISTS event_view_counts (
+            event_id INT PRIMARY KEY,
+            views BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    ('004_unique_venue_names', [
+        # Clean names as venue_index.clean_venue_name does (trim, collapse
+        # inner whitespace), so the key below agrees with the index
+        """
+        UPDATE venues SET name = TRIM(REGEXP_REPLACE(name, '[[:space:]]+', ' '))
+        """,
+        """
+        ALTER TABLE venues ADD COLUMN name_normalized VARCHAR(150) AS (LOWER(TRIM(name))) STORED
+        """,
+        # Point events at the oldest venue of each name, then drop the duplicates
+        """
+        UPDATE events e
+        JOIN venues v ON v.id = e.venue_id
+        JOIN (SELECT name_normalized, MIN(id) AS keep_id FROM venues GROUP BY name_normalized) k
+          ON k.name_normalized = v.name_normalized
+        SET e.venue_id = k.keep_id
+        WHERE e.venue_id <> k.keep_id
+        """,
+        """
+        DELETE v FROM venues v
+        JOIN (SELECT name_normalized, MIN(id) AS keep_id FROM venues GROUP BY name_normalized) k
+          ON k.name_normalized = v.name_normalized
+        WHERE v.id <> k.keep_id
+        """,
+        """
+        ALTER TABLE venues ADD UNIQUE KEY uq_venues_name_normalized (name_normalized)
+        """,
+    ]),
+    ('005_reserved_seating', [
+        """
+        CREATE TABLE IF NOT EXISTS venue_sections (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            venue_id INT NOT NULL,
+            name VARCHAR(50) NOT NULL,
+            ticket_type ENUM('standard', 'vip') NOT NULL,
+            seat_rows INT NOT NULL,
+            seats_per_row INT NOT NULL,
+            UNIQUE KEY uq_venue_sections_name (venue_id, name),
+            FOREIGN KEY (venue_id) REFERENCES venues(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS event_seat_state (
+            event_id INT NOT NULL,
+            section_id INT NOT NULL,
+            sold MEDIUMBLOB,
+            held MEDIUMBLOB,
+            version INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, section_id),
+            FOREIGN KEY (event_id) REFERENCES events(id),
+            FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS booking_seats (
+            booking_id INT NOT NULL,
+            section_id INT NOT NULL,
+            seat_index INT NOT NULL,
+            PRIMARY KEY (booking_id, section_id, seat_index),
+            FOREIGN KEY (booking_id) REFERENCES bookings(id),
+            FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+        )
+        """,
+    ]),
+    ('006_ticket_holds', [
+        """
+        ALTER TABLE ticket_types ADD COLUMN held_quantity INT NOT NULL DEFAULT 0
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ticket_holds (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            hold_token CHAR(32) NOT NULL UNIQUE,
+            event_id INT NOT NULL,
+            standard_qty INT NOT NULL DEFAULT 0,
+            vip_qty INT NOT NULL DEFAULT 0,
+            status ENUM('active', 'booked', 'released', 'expired') DEFAULT 'active',
+            expires_at DATETIME NOT NULL,
+            booking_id INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_ticket_holds_active (status, expires_at),
+            FOREIGN KEY (event_id) REFERENCES events(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ticket_hold_seats (
+            hold_id INT NOT NULL,
+            section_id INT NOT NULL,
+            seat_index INT NOT NULL,
+            PRIMARY KEY (hold_id, section_id, seat_index),
+            FOREIGN KEY (hold_id) REFERENCES ticket_holds(id),
+            FOREIGN KEY (section_id) REFERENCES venue_sections(id)
+        )
+        """,
+    ]),
+    ('007_payment_pipeline', [
+        """
+        ALTER TABLE payments ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        """,
+        """
+        CREATE INDEX idx_payments_status ON payments(payment_status)
+        """,
+    ]),
+    ('008_change_feed', [
+        """
+        CREATE TABLE IF NOT EXISTS change_feed (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            topic VARCHAR(20) NOT NULL,
+            entity_id INT,
+            organizer_id INT,
+            origin VARCHAR(64) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_change_feed_created (created_at)
+        )
+        """,
+    ]),
+    ('009_payment_claims', [
+        """
+        ALTER TABLE payments ADD COLUMN submitted_at DATETIME NULL
+        """,
+    ]),
+    ('010_idempotency_pruning', [
+        """
+        CREATE INDEX idx_idempotency_created ON idempotency_keys(created_at)
+        """,
+    ]),
+]
+
+def migrate_database():
+    """Apply any migrations that have not run yet"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name VARCHAR(100) PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for name, statements in MIGRATIONS:
+            if name in applied:
+                continue
+            print(f"Applying {name}...")
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+            conn.commit()
+
+        print("Database is up to date.")
+        close_connection(conn)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        raise e
+
+if __name__ == '__main__':
+    migrate_database()
@@ -0,0 +1,280 @@
+"""
+Payment Pipeline Module
+Takes the payment provider off the booking path
+
+A booking is stored with payment_status 'pending' and a pending row in
+payments, and the request returns at once. A background worker then
+submits pending payments to the provider and applies the provider's
+callbacks, each kind in batches: one transaction settles a whole batch
+of callbacks, updating payments and bookings together. A failed payment
+returns the booking's tickets and seats to stock.
+
+Callbacks name our payment id (the account reference the provider echoes
+back), so one can never arrive for a payment we have not recorded, and
+settling only touches payments still pending, so a repeated callback is
+harmless. Submitting is not, so a payment is claimed (payments.submitted_at)
+in the same transaction that reads it for the provider; a payment already
+claimed by this or another process is skipped until its claim is older
+than submit_lease seconds. The queue is in memory: recover(), run at
+startup and every recover_interval seconds, queues pending payments that
+were never claimed or whose claim has lapsed, e.g. after a worker died.
+
+SimulatedProvider stands in for the M-Pesa and card gateways locally.
+"""
+
+import hashlib
+import hmac
+import queue
+import random
+import secrets
+import threading
+import time
+
+from db_connection import get_db_connection, close_connection
+from sales_analytics import record_sale
+from seat_inventory import load_sections, release_sold
+
+def callback_signature(secret, payment_id, status, transaction_id):
+    """HMAC-SHA256 a provider signs its callbacks with"""
+    message = f"{payment_id}:{status}:{transaction_id}".encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+class SimulatedProvider:
+    """
+    Local payment provider. submit_batch() accepts payments immediately and
+    reports each outcome about delay seconds later through
+    deliver(payment_id, status, transaction_id); failure_rate of them are
+    declined. Nothing leaves the machine.
+    """
+
+    def __init__(self, delay=2.0, failure_rate=0.0):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.deliver = None
+
+    def submit_batch(self, payments):
+        """Start collecting payments (rows with id, payment_method, amount, phone)"""
+        outcomes = []
+        for payment in payments:
+            prefix = 'MP' if payment['payment_method'] == 'mpesa' else 'CD'
+            transaction_id = payment.get('transaction_id') or prefix + secrets.token_hex(8).upper()
+            status = 'failed' if random.random() < self.failure_rate else 'completed'
+            outcomes.append((payment['id'], status, transaction_id))
+
+        def deliver_all():
+            for outcome in outcomes:
+                self.deliver(*outcome)
+
+        timer = threading.Timer(self.delay, deliver_all)
+        timer.daemon = True
+        timer.start()
+
+class PaymentPipeline:
+    """
+    Queue plus worker thread. submit() and callback() only enqueue; the
+    worker takes up to batch_size jobs at a time, waiting up to linger
+    seconds for a batch to fill. on_settled(rows) runs after each settled
+    batch commits, with one row per payment (booking_id, booking_reference,
+    event_id, organizer_id, status). With a change feed, each settled
+    booking is recorded in it in the same transaction.
+    """
+
+    def __init__(self, provider, batch_size=100, linger=0.05, retry_delay=5.0, on_settled=None, feed=None,
+                 submit_lease=600, recover_interval=60.0):
+        self.provider = provider
+        self.provider.deliver = self.callback
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_delay = retry_delay
+        self.on_settled = on_settled
+        self.feed = feed
+        self.submit_lease = submit_lease
+        self.recover_interval = recover_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._recovered_at = time.monotonic()
+
+    def submit(self, payment_id):
+        """Queue a recorded pending payment for the provider"""
+        self._queue.put(('submit', payment_id))
+
+    def callback(self, payment_id, status, transaction_id):
+        """Queue a provider's outcome for a payment ('completed' or 'failed')"""
+        self._queue.put(('callback', (payment_id, status, transaction_id)))
+
+    def backlog(self):
+        """Jobs waiting for the worker"""
+        return self._queue.qsize()
+
+    def recover(self):
+        """Queue pending payments that no live claim covers; returns how many"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM payments
+                WHERE payment_status = 'pending'
+                  AND (submitted_at IS NULL OR submitted_at < NOW() - INTERVAL %s SECOND)
+            """, (self.submit_lease,))
+            rows = cursor.fetchall()
+        finally:
+            close_connection(conn)
+        for (payment_id,) in rows:
+            self.submit(payment_id)
+        return len(rows)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='payments', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Finish the jobs already queued (up to timeout seconds), then stop"""
+        if self._thread is not None:
+            self._queue.put(('stop', None))
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.recover_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size and batch[-1][0] != 'stop':
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if time.monotonic() - self._recovered_at >= self.recover_interval:
+                self._recovered_at = time.monotonic()
+                try:
+                    self.recover()
+                except Exception as e:
+                    print(f"Payment recovery failed: {e}")
+            if not batch:
+                continue
+            submits = [job for kind, job in batch if kind == 'submit']
+            callbacks = [job for kind, job in batch if kind == 'callback']
+            if submits:
+                self._guard(self._submit, submits, 'submit')
+            if callbacks:
+                self._guard(self._settle, callbacks, 'callback')
+            if batch[-1][0] == 'stop':
+                return
+
+    def _guard(self, step, jobs, kind):
+        """Run a batch step; on failure queue its jobs again after retry_delay"""
+        try:
+            step(jobs)
+        except Exception as e:
+            print(f"Payment {kind} batch of {len(jobs)} failed, will retry: {e}")
+            timer = threading.Timer(self.retry_delay, lambda: [self._queue.put((kind, job)) for job in jobs])
+            timer.daemon = True
+            timer.start()
+
+    def _submit(self, payment_ids):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ', '.join(['%s'] * len(payment_ids))
+            # Claim the payments first: the locking read sees other
+            # processes' committed claims, so each payment is sent once per lease
+            cursor.execute(f"""
+                SELECT p.id, p.amount, p.payment_method, p.transaction_id, b.phone
+                FROM payments p JOIN bookings b ON b.id = p.booking_id
+                WHERE p.id IN ({placeholders}) AND p.payment_status = 'pending'
+                  AND (p.submitted_at IS NULL OR p.submitted_at < NOW() - INTERVAL %s SECOND)
+                FOR UPDATE
+            """, (*payment_ids, self.submit_lease))
+            payments = cursor.fetchall()
+            if payments:
+                cursor.executemany("UPDATE payments SET submitted_at = NOW() WHERE id = %s",
+                                   [(payment['id'],) for payment in payments])
+            conn.commit()
+        finally:
+            close_connection(conn)
+        if payments:
+            self.provider.submit_batch(payments)
+
+    def _settle(self, callbacks):
+        # The last outcome reported for a payment wins
+        outcomes = {}
+        for payment_id, status, transaction_id in callbacks:
+            if status in ('completed', 'failed'):
+                outcomes[int(payment_id)] = (status, transaction_id)
+        if not outcomes:
+            return
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ', '.join(['%s'] * len(outcomes))
+            cursor.execute(f"""
+                SELECT p.id, p.booking_id, b.booking_reference, b.created_at, b.event_id, e.organizer_id
+                FROM payments p
+                JOIN bookings b ON b.id = p.booking_id
+                JOIN events e ON e.id = b.event_id
+                WHERE p.id IN ({placeholders}) AND p.payment_status = 'pending'
+                FOR UPDATE
+            """, tuple(outcomes))
+            rows = cursor.fetchall()
+            if not rows:
+                # Every payment in the batch was already settled
+                conn.commit()
+                return
+            for row in rows:
+                row['status'] = outcomes[row['id']][0]
+
+            cursor.executemany("""
+                UPDATE payments SET payment_status = %s, transaction_id = %s WHERE id = %s
+            """, [(row['status'], outcomes[row['id']][1], row['id']) for row in rows])
+            cursor.executemany("""
+                UPDATE bookings SET payment_status = %s WHERE id = %s
+            """, [(row['status'], row['booking_id']) for row in rows])
+            for row in rows:
+                if row['status'] == 'failed':
+                    release_booking(cursor, row)
+            if self.feed:
+                for event_id, organizer_id in {(row['event_id'], row['organizer_id']) for row in rows}:
+                    self.feed.record(cursor, 'booking', event_id, organizer_id)
+            conn.commit()
+        finally:
+            close_connection(conn)
+        if self.feed:
+            self.feed.notify()
+
+        if self.on_settled:
+            self.on_settled(rows)
+
+def release_booking(cursor, booking):
+    """
+    Return an unpaid booking's tickets and seats to stock and reverse its
+    sales rollups (in the buckets of its created_at), inside the caller's
+    transaction
+    """
+    cursor.execute("""
+        SELECT bt.ticket_type_id, tt.type_name, bt.quantity, bt.subtotal
+        FROM booking_tickets bt JOIN ticket_types tt ON tt.id = bt.ticket_type_id
+        WHERE bt.booking_id = %s
+    """, (booking['booking_id'],))
+    for line in cursor.fetchall():
+        cursor.execute("UPDATE ticket_types SET sold_quantity = sold_quantity - %s WHERE id = %s",
+                       (line['quantity'], line['ticket_type_id']))
+        record_sale(cursor, booking['organizer_id'], booking['event_id'], line['type_name'],
+                    -line['quantity'], -float(line['subtotal']), at=booking['created_at'])
+
+    cursor.execute("SELECT section_id, seat_index FROM booking_seats WHERE booking_id = %s",
+                   (booking['booking_id'],))
+    by_section = {}
+    for row in cursor.fetchall():
+        by_section.setdefault(row['section_id'], []).append(row['seat_index'])
+    if by_section:
+        for section in load_sections(cursor, booking['event_id']):
+            if section.id in by_section:
+                release_sold(cursor, booking['event_id'], section, by_section[section.id])
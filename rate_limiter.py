@@ -0,0 +1,124 @@
+"""
+Rate Limiter Module
+Per-client token buckets keyed by client IP and API route
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Default buckets as route -> (tokens refilled per second, burst size).
+# '*' applies to every other /api_ route.
+DEFAULT_LIMITS = {
+    '/api_book_ticket.py': (0.5, 5),
+    '/api_hold_tickets.py': (0.5, 5),
+    '/api_login_merchant.py': (0.2, 5),
+    '/api_register_merchant.py': (0.1, 3),
+    '/api_create_event.py': (0.5, 10),
+    '/api_export_bookings.py': (0.05, 3),
+    '/api_upload_image.py': (0.2, 10),
+    '/api_email_receipt.py': (0.1, 3),
+    # Provider callbacks arrive from a few addresses in bursts
+    '/api_payment_callback.py': (100.0, 500),
+    # A page of event cards requests one image each
+    '/api_image.py': (50.0, 200),
+    '*': (10.0, 40),
+}
+
+def parse_limits(spec):
+    """
+    Parse a RATE_LIMITS spec such as
+    "/api_book_ticket.py=0.5:5,*=10:40" into {route: (rate, burst)}
+    """
+    limits = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        route, _, value = item.partition('=')
+        rate, _, burst = value.partition(':')
+        limits[route.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+class TokenBucketLimiter:
+    """
+    Token bucket per (client, route). Buckets are stored as (tokens, stamp)
+    tuples in an OrderedDict ordered by last use, so idle clients can be
+    evicted from the front in O(1) without scanning.
+    """
+
+    def __init__(self, limits=None, max_keys=100000, idle_ttl=300):
+        self.limits = dict(DEFAULT_LIMITS)
+        if limits:
+            self.limits.update(limits)
+        self.max_keys = max_keys
+        # A bucket is only dropped once it would have refilled completely,
+        # so eviction never hands a client extra tokens.
+        slowest_refill = max((burst / rate for rate, burst in self.limits.values() if rate > 0), default=0)
+        self.idle_ttl = max(idle_ttl, slowest_refill)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def limit_for(self, route):
+        """Return the (rate, burst) bucket configured for a route"""
+        return self.limits.get(route) or self.limits.get('*')
+
+    def check(self, client, route):
+        """
+        Take one token for client on route.
+        Returns (allowed, retry_after_seconds).
+        """
+        limit = self.limit_for(route)
+        if not limit:
+            return True, 0
+        rate, burst = limit
+        key = (client, route)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                tokens = float(burst)
+            else:
+                tokens, stamp = bucket
+                tokens = min(float(burst), tokens + (now - stamp) * rate)
+
+            if tokens >= 1:
+                allowed = True
+                tokens -= 1
+                retry_after = 0
+            else:
+                allowed = False
+                retry_after = (1 - tokens) / rate if rate > 0 else self.idle_ttl
+
+            self._buckets[key] = (tokens, now)
+            self._evict(now)
+
+        return allowed, retry_after
+
+    def _evict(self, now):
+        """Drop idle buckets from the least recently used end"""
+        buckets = self._buckets
+        while buckets:
+            key, (tokens, stamp) = next(iter(buckets.items()))
+            if len(buckets) <= self.max_keys and now - stamp < self.idle_ttl:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+def retry_after_header(seconds):
+    """Format seconds as a Retry-After header value (whole seconds, at least 1)"""
+    return str(max(1, int(math.ceil(seconds))))
+
+def create_limiter():
+    """Build the limiter from RATE_LIMITS / RATE_LIMIT_MAX_KEYS / RATE_LIMIT_IDLE_TTL"""
+    limits = parse_limits(os.getenv('RATE_LIMITS', ''))
+    return TokenBucketLimiter(
+        limits=limits,
+        max_keys=int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000)),
+        idle_ttl=float(os.getenv('RATE_LIMIT_IDLE_TTL', 300)),
+    )
@@ -0,0 +1,434 @@
+"""
+Receipts Module
+Receipt documents rendered on a worker pool and cached per booking
+
+When a booking's payment completes, a render job goes into a durable job
+queue: a SQLite file in the receipt directory, shared by every process
+on the host, so queued work survives a restart. Worker threads render an
+HTML and a PDF receipt with a QR code of the booking reference and keep
+them there as <reference>.html and .pdf; later requests and emails reuse
+those files. Email jobs render if needed and hand the receipt to a
+sender, which by default writes it to outbox/ in that directory instead
+of sending it (set RECEIPT_SMTP_HOST to deliver for real).
+
+The directory must stay outside any statically served tree: receipts are
+only handed out through api_core.handle_receipt, which checks the
+booking's email. It defaults to a directory under the system temp dir.
+
+The qrcode package is optional: without it receipts show the reference
+as text only. The PDF is written directly, so no PDF library is needed.
+"""
+
+import html
+import os
+import re
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+from email.message import EmailMessage
+
+from db_connection import get_db_connection, close_connection
+from seat_inventory import row_label
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'itech-events-receipts')
+
+REFERENCE = re.compile(r'^[A-Za-z0-9-]{1,40}$')
+FORMATS = {'html': 'text/html; charset=utf-8', 'pdf': 'application/pdf'}
+
+def load_qrcode():
+    """Return the qrcode module, or None if it is not installed"""
+    try:
+        import qrcode
+    except ImportError:
+        return None
+    return qrcode
+
+def qr_matrix(text):
+    """QR code modules for text as rows of booleans, or None without qrcode"""
+    qrcode = load_qrcode()
+    if qrcode is None:
+        return None
+    qr = qrcode.QRCode(border=2, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(text)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+# --- Job queue ---
+
+class JobQueue:
+    """
+    Durable FIFO of (kind, booking reference) jobs in a SQLite file. A
+    claimed job is leased for lease seconds; if its worker dies it is
+    handed out again. Failed jobs are retried with exponential backoff
+    up to max_attempts times.
+    """
+
+    def __init__(self, path, lease=60.0, max_attempts=5):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_until REAL,
+                last_error TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, available_at)")
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections are not shared
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind, reference):
+        self._conn().execute("INSERT INTO jobs (kind, reference, available_at) VALUES (?, ?, ?)",
+                             (kind, reference, time.time()))
+
+    def claim(self):
+        """Lease the oldest ready job; returns (id, kind, reference, attempts) or None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND lease_until < ?", (now,))
+            row = conn.execute("""
+                SELECT id, kind, reference, attempts FROM jobs
+                WHERE status = 'queued' AND available_at <= ?
+                ORDER BY id LIMIT 1
+            """, (now,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                             (now + self.lease, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], row[1], row[2], row[3] + 1)
+
+    def complete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def fail(self, job_id, attempts, error):
+        """Retry a job later, or park it as failed after max_attempts"""
+        if attempts >= self.max_attempts:
+            self._conn().execute("UPDATE jobs SET status = 'failed', last_error = ? WHERE id = ?",
+                                 (error, job_id))
+        else:
+            self._conn().execute("""
+                UPDATE jobs SET status = 'queued', available_at = ?, last_error = ? WHERE id = ?
+            """, (time.time() + 2 ** attempts, error, job_id))
+
+    def counts(self):
+        """{status: number of jobs}"""
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+# --- Rendering ---
+
+def load_receipt(reference):
+    """Everything a receipt shows for a paid booking, or None"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT b.id, b.booking_reference, b.full_name, b.email, b.phone, b.id_number,
+                   b.total_amount, b.payment_method, b.payment_status, b.created_at,
+                   e.title, e.event_date, v.name AS venue_name, v.city
+            FROM bookings b
+            JOIN events e ON e.id = b.event_id
+            JOIN venues v ON v.id = e.venue_id
+            WHERE b.booking_reference = %s
+        """, (reference,))
+        receipt = cursor.fetchone()
+        if receipt is None or receipt['payment_status'] != 'completed':
+            return None
+        cursor.execute("""
+            SELECT tt.type_name, bt.quantity, bt.unit_price, bt.subtotal
+            FROM booking_tickets bt JOIN ticket_types tt ON tt.id = bt.ticket_type_id
+            WHERE bt.booking_id = %s
+        """, (receipt['id'],))
+        receipt['lines'] = cursor.fetchall()
+        cursor.execute("""
+            SELECT s.name, s.seats_per_row, bs.seat_index
+            FROM booking_seats bs JOIN venue_sections s ON s.id = bs.section_id
+            WHERE bs.booking_id = %s ORDER BY s.id, bs.seat_index
+        """, (receipt['id'],))
+        seats = {}
+        for row in cursor.fetchall():
+            row_number, seat = divmod(row['seat_index'], row['seats_per_row'])
+            seats.setdefault(row['name'], []).append(f"{row_label(row_number)}{seat + 1}")
+        receipt['seats'] = seats
+    finally:
+        close_connection(conn)
+    return receipt
+
+def receipt_rows(receipt):
+    """(label, value) pairs shown on every receipt format"""
+    rows = [
+        ('Booking Reference', receipt['booking_reference']),
+        ('Event', receipt['title']),
+        ('Date', receipt['event_date'].strftime('%d %B %Y, %H:%M')),
+        ('Venue', f"{receipt['venue_name']}, {receipt['city']}"),
+        ('Name', receipt['full_name']),
+        ('Email', receipt['email']),
+        ('Phone', receipt['phone']),
+    ]
+    for line in receipt['lines']:
+        label = 'VIP' if line['type_name'] == 'vip' else 'Standard'
+        rows.append((f"{label} tickets", f"{line['quantity']} x KSh {float(line['unit_price']):,.0f}"))
+    for section, labels in receipt['seats'].items():
+        rows.append((f"Seats ({section})", ', '.join(labels)))
+    rows.append(('Total Paid', f"KSh {float(receipt['total_amount']):,.0f}"))
+    rows.append(('Payment Method', 'M-Pesa' if receipt['payment_method'] == 'mpesa' else receipt['payment_method'].title()))
+    rows.append(('Booked', receipt['created_at'].strftime('%d %B %Y')))
+    return rows
+
+def render_html(receipt, matrix):
+    rows = ''.join(f"<tr><th>{html.escape(label)}</th><td>{html.escape(str(value))}</td></tr>"
+                   for label, value in receipt_rows(receipt))
+    qr = ''
+    if matrix:
+        size = len(matrix)
+        cells = ''.join(f'M{x},{y}h1v1h-1z' for y, row in enumerate(matrix) for x, dark in enumerate(row) if dark)
+        qr = (f'<svg class="qr" viewBox="0 0 {size} {size}" width="160" height="160" shape-rendering="crispEdges">'
+              f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{cells}" fill="#000"/></svg>')
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Receipt {html.escape(receipt['booking_reference'])}</title>
+<style>
+body {{ font-family: Arial, sans-serif; color: #222; max-width: 640px; margin: 40px auto; }}
+h1 {{ color: #6c5ce7; font-size: 24px; }}
+table {{ border-collapse: collapse; width: 100%; }}
+th, td {{ text-align: left; padding: 8px; border-bottom: 1px solid #eee; }}
+th {{ width: 40%; color: #666; font-weight: normal; }}
+.qr {{ display: block; margin: 24px auto; }}
+</style>
+</head>
+<body>
+<h1>iTech Events - Ticket Receipt</h1>
+{qr}
+<table>{rows}</table>
+<p>Please present this receipt at the venue entry.</p>
+</body>
+</html>
+"""
+
+def _pdf_text(value):
+    text = str(value).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def render_pdf(receipt, matrix):
+    """A one-page A4 PDF: heading, details and the QR code drawn as squares"""
+    ops = ['BT /F2 20 Tf 50 780 Td (iTech Events - Ticket Receipt) Tj ET']
+    y = 730
+    for label, value in receipt_rows(receipt):
+        ops.append(f'BT /F1 11 Tf 50 {y} Td ({_pdf_text(label)}) Tj 170 0 Td ({_pdf_text(value)}) Tj ET')
+        y -= 20
+    ops.append(f'BT /F1 10 Tf 50 {y - 20} Td (Please present this receipt at the venue entry.) Tj ET')
+    if matrix:
+        module = 120 / len(matrix)
+        top = 800
+        squares = [f'{420 + x * module:.2f} {top - (r + 1) * module:.2f} {module:.2f} {module:.2f} re'
+                   for r, row in enumerate(matrix) for x, dark in enumerate(row) if dark]
+        ops.append('0 g ' + ' '.join(squares) + ' f')
+    content = '\n'.join(ops).encode('latin-1')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+        b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+# --- Sending ---
+
+class OutboxSender:
+    """Local stand-in for email: writes each message to a .eml file"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def send(self, message):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{message['X-Booking-Reference']}.eml"
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(bytes(message))
+
+class SmtpSender:
+    """Delivers messages through an SMTP server (STARTTLS when port is 587)"""
+
+    def __init__(self, host, port=587, username='', password=''):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+
+    def send(self, message):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.port == 587:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+def create_sender(outbox):
+    """SMTP sender from RECEIPT_SMTP_* settings, else the local outbox"""
+    host = os.getenv('RECEIPT_SMTP_HOST')
+    if not host:
+        return OutboxSender(outbox)
+    return SmtpSender(host, int(os.getenv('RECEIPT_SMTP_PORT', 587)),
+                      os.getenv('RECEIPT_SMTP_USER', ''), os.getenv('RECEIPT_SMTP_PASSWORD', ''))
+
+# --- Service ---
+
+class ReceiptService:
+    """Queues receipt work and runs it on a pool of worker threads"""
+
+    def __init__(self, directory=DEFAULT_DIR, workers=2, sender=None, from_address='receipts@itech-events.local'):
+        self.directory = directory
+        self.workers = workers
+        self.sender = sender or create_sender(os.path.join(self.directory, 'outbox'))
+        self.from_address = from_address
+        self._queue = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def queue(self):
+        # Opened on first use, so importing this module touches no files
+        if self._queue is None:
+            self._queue = JobQueue(os.path.join(self.directory, 'jobs.sqlite3'))
+        return self._queue
+
+    def path(self, reference, fmt):
+        return os.path.join(self.directory, f"{reference}.{fmt}")
+
+    def cached(self, reference, fmt):
+        """Path of a rendered receipt, or None if it has not been rendered yet"""
+        if not REFERENCE.match(reference or '') or fmt not in FORMATS:
+            return None
+        path = self.path(reference, fmt)
+        return path if os.path.exists(path) else None
+
+    def request_render(self, reference):
+        self.queue.enqueue('render', reference)
+        self._wake.set()
+
+    def request_email(self, reference):
+        self.queue.enqueue('email', reference)
+        self._wake.set()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'receipts-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the workers after their current job; queued jobs stay in the queue"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def stats(self):
+        return self.queue.counts()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"Receipt queue unavailable: {e}")
+                job = None
+            if job is None:
+                # Woken by a local enqueue; jobs queued by other processes are polled
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            job_id, kind, reference, attempts = job
+            try:
+                if kind == 'render':
+                    self.render(reference)
+                elif kind == 'email':
+                    self.email(reference)
+                self.queue.complete(job_id)
+            except Exception as e:
+                print(f"Receipt {kind} for {reference} failed (attempt {attempts}): {e}")
+                self.queue.fail(job_id, attempts, str(e))
+
+    def render(self, reference):
+        """Render and cache both formats unless already cached; returns False if unpaid"""
+        if not REFERENCE.match(reference):
+            return False
+        if all(self.cached(reference, fmt) for fmt in FORMATS):
+            return True
+        receipt = load_receipt(reference)
+        if receipt is None:
+            # Not paid (yet); the payment worker queues a render when it is
+            return False
+        matrix = qr_matrix(reference)
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(reference, 'html', render_html(receipt, matrix).encode('utf-8'))
+        self._write(reference, 'pdf', render_pdf(receipt, matrix))
+        return True
+
+    def email(self, reference):
+        if not self.render(reference):
+            return
+        receipt = load_receipt(reference)
+        message = EmailMessage()
+        message['Subject'] = f"Your tickets for {receipt['title']} ({reference})"
+        message['From'] = self.from_address
+        message['To'] = receipt['email']
+        message['X-Booking-Reference'] = reference
+        message.set_content(f"Hi {receipt['full_name']},\n\nYour receipt for booking {reference} is attached.\n\niTech Events")
+        with open(self.path(reference, 'html'), 'rb') as f:
+            message.add_alternative(f.read().decode('utf-8'), subtype='html')
+        with open(self.path(reference, 'pdf'), 'rb') as f:
+            message.add_attachment(f.read(), maintype='application', subtype='pdf',
+                                   filename=f"iTech_Events_Receipt_{reference}.pdf")
+        self.sender.send(message)
+
+    def _write(self, reference, fmt, data):
+        path = self.path(reference, fmt)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
@@ -0,0 +1,107 @@
+"""
+Sales Analytics Module
+Hourly and daily sales rollups maintained by the booking path
+
+Bookings add their tickets and revenue to sales_rollup_hourly and
+sales_rollup_daily inside the booking transaction, so dashboard queries
+read a few rollup rows per event instead of scanning booking_tickets.
+"""
+
+from datetime import datetime, timedelta
+
+GRANULARITIES = {
+    # granularity -> (rollup table, bucket column, default window)
+    'hour': ('sales_rollup_hourly', 'bucket_start', timedelta(hours=48)),
+    'day': ('sales_rollup_daily', 'bucket_date', timedelta(days=30)),
+}
+
+def record_sale(cursor, organizer_id, event_id, ticket_type, quantity, revenue, at=None):
+    """
+    Add a sale (or, with negative values, a reversal) to the rollups.
+    Must run on the booking's own cursor so it commits or rolls back with it.
+    at is when the sale was made (default now); a reversal passes the
+    booking's created_at so it lands in the sale's own hour and day.
+    """
+    hour = at.replace(minute=0, second=0, microsecond=0) if at else None
+    day = at.date() if at else None
+    cursor.execute("""
+        INSERT INTO sales_rollup_hourly (organizer_id, event_id, ticket_type, bucket_start, tickets, revenue)
+        VALUES (%s, %s, %s, COALESCE(%s, DATE_FORMAT(NOW(), '%%Y-%%m-%%d %%H:00:00')), %s, %s)
+        ON DUPLICATE KEY UPDATE tickets = tickets + VALUES(tickets), revenue = revenue + VALUES(revenue)
+    """, (organizer_id, event_id, ticket_type, hour, quantity, revenue))
+    cursor.execute("""
+        INSERT INTO sales_rollup_daily (organizer_id, event_id, ticket_type, bucket_date, tickets, revenue)
+        VALUES (%s, %s, %s, COALESCE(%s, CURDATE()), %s, %s)
+        ON DUPLICATE KEY UPDATE tickets = tickets + VALUES(tickets), revenue = revenue + VALUES(revenue)
+    """, (organizer_id, event_id, ticket_type, day, quantity, revenue))
+
+def parse_range(granularity, start, end):
+    """Resolve optional ISO from/to strings into a datetime window"""
+    window = GRANULARITIES[granularity][2]
+    end_at = datetime.fromisoformat(end) if end else datetime.now()
+    start_at = datetime.fromisoformat(start) if start else end_at - window
+    return start_at, end_at
+
+def query_sales(cursor, merchant_id, granularity, start_at, end_at, event_id=None):
+    """
+    Return per-event time series and merchant totals for the window,
+    plus all-time merchant totals
+    """
+    table, bucket, _ = GRANULARITIES[granularity]
+    if granularity == 'day':
+        params = [merchant_id, start_at.date(), end_at.date()]
+    else:
+        params = [merchant_id, start_at, end_at]
+    event_filter = ''
+    if event_id:
+        event_filter = 'AND r.event_id = %s'
+        params.append(event_id)
+
+    cursor.execute(f"""
+        SELECT r.event_id, e.title, r.{bucket} AS bucket, r.ticket_type, r.tickets, r.revenue
+        FROM {table} r
+        JOIN events e ON e.id = r.event_id
+        WHERE r.organizer_id = %s AND r.{bucket} >= %s AND r.{bucket} <= %s {event_filter}
+        ORDER BY r.event_id, r.{bucket}
+    """, tuple(params))
+
+    events = {}
+    window_totals = {'tickets': 0, 'revenue': 0.0}
+    for row in cursor.fetchall():
+        event = events.setdefault(row['event_id'], {
+            'eventId': row['event_id'],
+            'title': row['title'],
+            'totals': {'tickets': 0, 'revenue': 0.0},
+            'series': {}
+        })
+        key = row['bucket'].isoformat()
+        point = event['series'].setdefault(key, {
+            'bucket': key,
+            'standard': {'tickets': 0, 'revenue': 0.0},
+            'vip': {'tickets': 0, 'revenue': 0.0}
+        })
+        tickets = int(row['tickets'])
+        revenue = float(row['revenue'])
+        point[row['ticket_type']] = {'tickets': tickets, 'revenue': revenue}
+        event['totals']['tickets'] += tickets
+        event['totals']['revenue'] += revenue
+        window_totals['tickets'] += tickets
+        window_totals['revenue'] += revenue
+
+    for event in events.values():
+        event['series'] = list(event['series'].values())
+
+    cursor.execute("""
+        SELECT COALESCE(SUM(tickets), 0) AS tickets, COALESCE(SUM(revenue), 0) AS revenue
+        FROM sales_rollup_daily WHERE organizer_id = %s
+    """, (merchant_id,))
+    all_time = cursor.fetchone()
+
+    return {
+        'granularity': granularity,
+        'from': start_at.isoformat(),
+        'to': end_at.isoformat(),
+        'totals': window_totals,
+        'allTime': {'tickets': int(all_time['tickets']), 'revenue': float(all_time['revenue'])},
+        'events': list(events.values())
+    }
@@ -50,8 +50,17 @@ document.addEventListener('DOMContentLoaded', function() {
         vipQty: 0,
         ticketType: 'mixed',
         idNumber: '',
-        totalPrice: 0
+        totalPrice: 0,
+        holdToken: null,
+        holdExpiresAt: 0,
+        checkoutKey: null
     };
+    let holdTimer = null;
+    
+    // Idempotency-Key for a POST, so the server replays the first result to a retry
+    function newIdempotencyKey() {
+        return (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
     
     // Update UI based on merchant login state
     function updateMerchantUI() {
@@ -112,6 +121,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Show modal
                 modal.style.display = 'block';
                 document.body.style.overflow = 'hidden';
+                recordView(eventId);
                 
                 // Reset to booking step
                 showBookingStep();
@@ -128,6 +138,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Back button handler
         backToBooking.addEventListener('click', function() {
+            releaseHold();
             showBookingStep();
         });
         
@@ -152,7 +163,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             
-            // Calculate total price
+            // Calculate total price (replaced by the server's once the tickets are held)
             currentBooking.totalPrice = (currentBooking.standardQty * currentBooking.price) + (currentBooking.vipQty * currentBooking.vipPrice);
             
             // Determine ticket type for display
@@ -167,8 +178,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentBooking.quantity = currentBooking.standardQty;
             }
             
-            // Show payment step
-            showPaymentStep();
+            // Hold the tickets while the customer pays, then show payment step
+            holdTickets();
         });
         
         // Quantity and ticket type change handlers
@@ -246,44 +257,247 @@ document.addEventListener('DOMContentLoaded', function() {
         downloadReceipt.addEventListener('click', downloadReceiptFn);
         
         // Email receipt handler
-        emailReceipt.addEventListener('click', function() {
-            alert('Receipt has been sent to ' + currentBooking.email);
-        });
+        emailReceipt.addEventListener('click', emailReceiptFn);
     }
     
-    // Fetch events from API
-    function fetchEvents() {
+    // Catalog paging: the first page is embedded in index.html by the
+    // server, later pages are fetched when the visitor asks for them
+    const EVENTS_PAGE_SIZE = 12;
+    let nextEventsOffset = null;
+    
+    // The first page and its ETag are also kept in localStorage, so a visit
+    // without the embedded page draws the last catalog at once and then
+    // revalidates it with a conditional request
+    const CATALOG_CACHE_KEY = 'catalogFirstPage';
+    
+    function readCachedCatalog() {
+        try {
+            return JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY));
+        } catch (error) {
+            return null;
+        }
+    }
+    
+    function saveCachedCatalog(page, etag) {
+        if (!etag) return;
+        try {
+            localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify({ etag: etag, page: page }));
+        } catch (error) {
+            // Storage full or disabled; the catalog still works without it
+        }
+    }
+    
+    function eventsPageUrl(offset) {
         // API URL - change localhost to your server IP if needed
-        const apiUrl = 'http://localhost:8000/api_get_events.py';
+        return `http://localhost:8000/api_get_events.py?offset=${offset}&limit=${EVENTS_PAGE_SIZE}`;
+    }
+    
+    // Show events: the embedded first page, else the cached one, else fetch
+    function fetchEvents() {
+        const bootstrap = document.getElementById('catalogBootstrap');
+        const cached = bootstrap ? null : readCachedCatalog();
         
-        fetch(apiUrl)
-            .then(response => response.json())
-            .then(data => {
-                const eventsGrid = document.querySelector('#eventsGrid');
-                const noEventsMessage = document.getElementById('noEventsMessage');
-                
-                if (data.success && data.data.length > 0) {
-                    // Hide the no events message
-                    if (noEventsMessage) {
-                        noEventsMessage.style.display = 'none';
+        if (bootstrap) {
+            // Only the first render uses it; later refreshes go to the API
+            bootstrap.remove();
+        }
+        if (bootstrap || (cached && cached.page)) {
+            // Render once this script has finished initialising, still before first paint
+            Promise.resolve()
+                .then(() => {
+                    if (bootstrap) {
+                        const page = JSON.parse(bootstrap.textContent);
+                        showEventsPage(page, false);
+                        saveCachedCatalog(page, page.etag);
+                    } else {
+                        showEventsPage(cached.page, false);
+                        revalidateFirstPage(cached);
                     }
-                    generateEventCards(data.data);
-                } else {
-                    // Show the no events message
+                })
+                .catch(error => {
+                    console.log('Could not show saved events, fetching instead:', error);
+                    loadEventsPage(0);
+                });
+            return;
+        }
+        loadEventsPage(0);
+    }
+    
+    // Fetch one page of events from the API
+    function loadEventsPage(offset) {
+        return fetch(eventsPageUrl(offset))
+            .then(response => response.json().then(data => {
+                if (!data.success) throw new Error(data.message);
+                showEventsPage(data, offset > 0);
+                if (offset === 0) {
+                    saveCachedCatalog(data, response.headers.get('ETag'));
+                }
+            }))
+            .catch(error => {
+                if (offset === 0) {
+                    // Show the no events message on error
+                    const noEventsMessage = document.getElementById('noEventsMessage');
                     if (noEventsMessage) {
                         noEventsMessage.style.display = 'block';
                     }
-                    console.log('No events in database');
                 }
+                console.log('API not available, showing no events message:', error);
+            });
+    }
+    
+    // Check a cached first page against the server; usually a 304
+    function revalidateFirstPage(cached) {
+        const shownOffset = nextEventsOffset;
+        
+        fetch(eventsPageUrl(0), { headers: { 'If-None-Match': cached.etag } })
+            .then(response => {
+                if (response.status === 304) return;
+                return response.json().then(data => {
+                    if (!data.success) return;
+                    patchEventCards(cached.page.data, data.data);
+                    // Leave paging alone if more pages were loaded meanwhile
+                    if (nextEventsOffset === shownOffset) {
+                        showPagingState(data, false);
+                    }
+                    saveCachedCatalog(data, response.headers.get('ETag'));
+                });
             })
             .catch(error => {
-                // Show the no events message on error
-                const noEventsMessage = document.getElementById('noEventsMessage');
-                if (noEventsMessage) {
-                    noEventsMessage.style.display = 'block';
+                console.log('Could not revalidate events, showing saved ones:', error);
+            });
+    }
+    
+    function showEventsPage(page, append) {
+        if (page.data.length > 0) {
+            generateEventCards(page.data, append);
+            subscribeAvailability();
+        }
+        showPagingState(page, append);
+    }
+    
+    function showPagingState(page, append) {
+        const noEventsMessage = document.getElementById('noEventsMessage');
+        
+        if (page.data.length > 0) {
+            // Hide the no events message
+            if (noEventsMessage) {
+                noEventsMessage.style.display = 'none';
+            }
+        } else if (!append) {
+            // Show the no events message
+            if (noEventsMessage) {
+                noEventsMessage.style.display = 'block';
+            }
+            console.log('No events in database');
+        }
+        
+        nextEventsOffset = page.nextOffset;
+        if (loadMoreEventsBtn) {
+            loadMoreEventsBtn.style.display = nextEventsOffset === null ? 'none' : '';
+        }
+    }
+    
+    // What a card shows: its event, and whether it is one of the top three
+    function cardVersion(event, position) {
+        return JSON.stringify(event) + (position < 3 ? ':top' : '');
+    }
+    
+    // Bring the first page's cards up to date: rebuild only cards whose
+    // content changed, add new ones, drop removed ones
+    function patchEventCards(oldEvents, newEvents) {
+        const eventsGrid = document.querySelector('.events-grid');
+        if (!eventsGrid) return;
+        
+        const before = new Map(oldEvents.map((event, position) => [String(event.id), cardVersion(event, position)]));
+        const cards = new Map();
+        eventsGrid.querySelectorAll('.event-card').forEach(card => cards.set(card.dataset.eventId, card));
+        const current = new Set(newEvents.map(event => String(event.id)));
+        
+        before.forEach((_, id) => {
+            if (!current.has(id) && cards.has(id)) {
+                cards.get(id).remove();
+            }
+        });
+        
+        let previous = null;
+        newEvents.forEach((event, position) => {
+            const id = String(event.id);
+            let card = cards.get(id);
+            if (!card || before.get(id) !== cardVersion(event, position)) {
+                const fresh = createEventCard(event, position);
+                if (card) {
+                    card.replaceWith(fresh);
                 }
-                console.log('API not available, showing no events message:', error);
+                card = fresh;
+            }
+            // Keep the server's order
+            const expected = previous ? previous.nextElementSibling : eventsGrid.firstElementChild;
+            if (card !== expected) {
+                if (previous) {
+                    previous.after(card);
+                } else {
+                    eventsGrid.prepend(card);
+                }
+            }
+            previous = card;
+        });
+        
+        if (newEvents.length > 0) {
+            subscribeAvailability();
+        }
+    }
+    
+    const loadMoreEventsBtn = document.getElementById('loadMoreEvents');
+    if (loadMoreEventsBtn) {
+        loadMoreEventsBtn.addEventListener('click', function() {
+            if (nextEventsOffset === null) return;
+            loadMoreEventsBtn.disabled = true;
+            loadEventsPage(nextEventsOffset).finally(() => {
+                loadMoreEventsBtn.disabled = false;
             });
+        });
+    }
+    
+    // Local images are served as resized WebP/AVIF variants; other URLs as-is
+    const IMAGE_WIDTHS = [320, 480, 640, 960];
+    
+    function imageAttributes(url, sizes) {
+        if (!/^\/?(images|uploads)\//.test(url)) return `src="${url}"`;
+        const variant = width => `http://localhost:8000/api_image.py?src=${encodeURIComponent(url)}&w=${width}`;
+        const srcset = IMAGE_WIDTHS.map(width => `${variant(width)} ${width}w`).join(', ');
+        return `src="${variant(480)}" srcset="${srcset}" sizes="${sizes}"`;
+    }
+    
+    // Count an event view; fire-and-forget so opening the modal never waits on it
+    function recordView(eventId) {
+        const body = new URLSearchParams({ eventId: eventId });
+        if (navigator.sendBeacon) {
+            navigator.sendBeacon('http://localhost:8000/api_record_view.py', body);
+        } else {
+            fetch('http://localhost:8000/api_record_view.py', { method: 'POST', body: body }).catch(() => {});
+        }
+    }
+    
+    // Live remaining ticket counts pushed by the server (Server-Sent Events)
+    let availabilitySource = null;
+    
+    function subscribeAvailability() {
+        if (availabilitySource || !window.EventSource) return;
+        
+        availabilitySource = new EventSource('http://localhost:8000/api_availability_stream.py');
+        availabilitySource.addEventListener('availability', function(e) {
+            const counts = JSON.parse(e.data);
+            const label = document.querySelector(`.event-availability[data-availability-for="${counts.eventId}"]`);
+            if (!label) return;
+            
+            const standardLeft = counts.standard || 0;
+            const vipLeft = counts.vip || 0;
+            if (standardLeft + vipLeft === 0) {
+                label.textContent = 'Sold out';
+            } else {
+                label.textContent = standardLeft.toLocaleString() + ' Standard · ' + vipLeft.toLocaleString() + ' VIP left';
+            }
+        });
     }
     
     // Animate Happy Users counter (counts from 0 to 50K and loops)
@@ -328,98 +542,107 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize counter animation
     animateHappyUsersCounter();
     
-    // Generate event cards dynamically
-    function generateEventCards(events) {
+    // Category icons mapping
+    const categoryIcons = {
+        'music': 'fa-guitar',
+        'sports': 'fa-running',
+        'arts': 'fa-mask',
+        'business': 'fa-briefcase',
+        'food': 'fa-utensils',
+        'tech': 'fa-microchip'
+    };
+    
+    // Build one event card; position is its place in the grid
+    function createEventCard(event, position) {
+        const card = document.createElement('div');
+        card.className = 'event-card';
+        card.dataset.eventId = event.id;
+        
+        const categoryIcon = categoryIcons[event.category] || 'fa-calendar-alt';
+        const imageUrl = event.image_url || 'images/event-default.jpg';
+        const formattedDate = event.event_date_formatted || new Date(event.event_date).toLocaleDateString('en-US', { month: 'short', day: 'numeric', year: 'numeric' });
+        
+        card.innerHTML = `
+            <div class="event-image">
+                <img ${imageAttributes(imageUrl, '(max-width: 768px) 100vw, 400px')} alt="${event.title}" ${position < 3 ? '' : 'loading="lazy" '}decoding="async" style="width: 100%; height: 100%; object-fit: cover; object-position: center;">
+                <span class="event-badge">${position < 3 ? 'Trending' : 'Popular'}</span>
+                <span class="event-date">${formattedDate}</span>
+            </div>
+            <div class="event-details">
+                <span class="event-category"><i class="fas ${categoryIcon}"></i> ${event.category.charAt(0).toUpperCase() + event.category.slice(1)}</span>
+                <h3>${event.title}</h3>
+                <p class="event-venue"><i class="fas fa-map-marker-alt"></i> ${event.venue_name || event.venue_name}</p>
+                <p class="event-availability" data-availability-for="${event.id}"></p>
+                <p class="event-description">${event.description.substring(0, 100)}...</p>
+                <div class="event-footer">
+                    <div class="event-price">
+                        <span class="price-from">From</span>
+                        <span class="price-amount">KSh ${parseInt(event.standard_price).toLocaleString()}</span>
+                    </div>
+                    <button class="btn btn-primary btn-sm get-tickets" 
+                        data-id="${event.id}" 
+                        data-event="${event.title}" 
+                        data-price="${event.standard_price}"
+                        data-vip-price="${event.vip_price}">
+                        Get Tickets
+                    </button>
+                </div>
+            </div>
+        `;
+        
+        card.querySelector('.get-tickets').addEventListener('click', function() {
+            const eventId = this.getAttribute('data-id');
+            const eventName = this.getAttribute('data-event');
+            const price = parseInt(this.getAttribute('data-price'));
+            const vipPrice = parseInt(this.getAttribute('data-vip-price'));
+            
+            currentBooking.eventName = eventName;
+            currentBooking.eventId = eventId;
+            currentBooking.price = price;
+            currentBooking.vipPrice = vipPrice;
+            currentBooking.totalPrice = price;
+            
+            // Update modal content
+            document.getElementById('modalEventName').textContent = eventName;
+            document.querySelector('.price-display').textContent = price.toLocaleString();
+            document.querySelector('.vip-price-display').textContent = vipPrice.toLocaleString();
+            
+            // Reset quantity inputs
+            document.getElementById('standardQty').value = 0;
+            document.getElementById('vipQty').value = 0;
+            
+            // Update price summary
+            updatePriceSummary();
+            
+            // Show modal
+            modal.style.display = 'block';
+            document.body.style.overflow = 'hidden';
+            recordView(eventId);
+            
+            // Reset to booking step
+            showBookingStep();
+        });
+        
+        return card;
+    }
+    
+    // Generate event cards dynamically, replacing the grid or appending a page
+    function generateEventCards(events, append = false) {
         const eventsGrid = document.querySelector('.events-grid');
         if (!eventsGrid) return;
         
         // Clear existing static events
-        eventsGrid.innerHTML = '';
-        
-        // Category icons mapping
-        const categoryIcons = {
-            'music': 'fa-guitar',
-            'sports': 'fa-running',
-            'arts': 'fa-mask',
-            'business': 'fa-briefcase',
-            'food': 'fa-utensils',
-            'tech': 'fa-microchip'
-        };
+        if (!append) {
+            eventsGrid.innerHTML = '';
+        }
+        const start = eventsGrid.querySelectorAll('.event-card').length;
         
         // Generate cards for each event
         events.forEach((event, index) => {
-            const card = document.createElement('div');
-            card.className = 'event-card';
+            const card = createEventCard(event, start + index);
             card.style.animationDelay = (index * 0.1) + 's';
-            
-            const categoryIcon = categoryIcons[event.category] || 'fa-calendar-alt';
-            const imageUrl = event.image_url || 'images/event-default.jpg';
-            const formattedDate = event.event_date_formatted || new Date(event.event_date).toLocaleDateString('en-US', { month: 'short', day: 'numeric', year: 'numeric' });
-            
-            card.innerHTML = `
-                <div class="event-image">
-                    <img src="${imageUrl}" alt="${event.title}" style="width: 100%; height: 100%; object-fit: cover; object-position: center;">
-                    <span class="event-badge">${index < 3 ? 'Trending' : 'Popular'}</span>
-                    <span class="event-date">${formattedDate}</span>
-                </div>
-                <div class="event-details">
-                    <span class="event-category"><i class="fas ${categoryIcon}"></i> ${event.category.charAt(0).toUpperCase() + event.category.slice(1)}</span>
-                    <h3>${event.title}</h3>
-                    <p class="event-venue"><i class="fas fa-map-marker-alt"></i> ${event.venue_name || event.venue_name}</p>
-                    <p class="event-description">${event.description.substring(0, 100)}...</p>
-                    <div class="event-footer">
-                        <div class="event-price">
-                            <span class="price-from">From</span>
-                            <span class="price-amount">KSh ${parseInt(event.standard_price).toLocaleString()}</span>
-                        </div>
-                        <button class="btn btn-primary btn-sm get-tickets" 
-                            data-id="${event.id}" 
-                            data-event="${event.title}" 
-                            data-price="${event.standard_price}"
-                            data-vip-price="${event.vip_price}">
-                            Get Tickets
-                        </button>
-                    </div>
-                </div>
-            `;
-            
             eventsGrid.appendChild(card);
         });
-        
-        // Re-attach click handlers to new buttons
-        document.querySelectorAll('.get-tickets').forEach(button => {
-            button.addEventListener('click', function() {
-                const eventId = this.getAttribute('data-id');
-                const eventName = this.getAttribute('data-event');
-                const price = parseInt(this.getAttribute('data-price'));
-                const vipPrice = parseInt(this.getAttribute('data-vip-price'));
-                
-                currentBooking.eventName = eventName;
-                currentBooking.eventId = eventId;
-                currentBooking.price = price;
-                currentBooking.vipPrice = vipPrice;
-                currentBooking.totalPrice = price;
-                
-                // Update modal content
-                document.getElementById('modalEventName').textContent = eventName;
-                document.querySelector('.price-display').textContent = price.toLocaleString();
-                document.querySelector('.vip-price-display').textContent = vipPrice.toLocaleString();
-                
-                // Reset quantity inputs
-                document.getElementById('standardQty').value = 0;
-                document.getElementById('vipQty').value = 0;
-                
-                // Update price summary
-                updatePriceSummary();
-                
-                // Show modal
-                modal.style.display = 'block';
-                document.body.style.overflow = 'hidden';
-                
-                // Reset to booking step
-                showBookingStep();
-            });
-        });
     }
     
     function updatePriceSummary() {
@@ -449,13 +672,79 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('paymentAmount').textContent = 'KSh ' + currentBooking.totalPrice.toLocaleString();
     }
     
-    function showSuccessStep(paymentMethod) {
+    // Ticket holds: tickets are reserved on the server from the payment
+    // step until the booking is confirmed, released or the hold expires
+    function holdTickets() {
+        const submitButton = bookingForm.querySelector('button[type="submit"]');
+        if (submitButton) submitButton.disabled = true;
+        
+        // One key per checkout attempt, sent with the hold and the booking
+        currentBooking.checkoutKey = newIdempotencyKey();
+        fetch('http://localhost:8000/api_hold_tickets.py', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Idempotency-Key': currentBooking.checkoutKey
+            },
+            body: new URLSearchParams({
+                eventId: currentBooking.eventId,
+                standardQty: currentBooking.standardQty,
+                vipQty: currentBooking.vipQty
+            })
+        })
+            .then(response => response.json())
+            .then(result => {
+                if (!result.success) {
+                    alert(result.message || 'These tickets are no longer available');
+                    return;
+                }
+                currentBooking.holdToken = result.data.holdToken;
+                currentBooking.holdExpiresAt = Date.now() + result.data.ttlSeconds * 1000;
+                currentBooking.totalPrice = result.data.totalAmount;
+                currentBooking.seats = result.data.seats;
+                showPaymentStep();
+                startHoldTimer();
+            })
+            .catch(() => alert('Could not reach the booking server, please try again'))
+            .finally(() => {
+                if (submitButton) submitButton.disabled = false;
+            });
+    }
+    
+    function startHoldTimer() {
+        const timer = document.getElementById('holdTimer');
+        clearInterval(holdTimer);
+        const tick = () => {
+            const left = Math.max(0, Math.round((currentBooking.holdExpiresAt - Date.now()) / 1000));
+            if (timer) {
+                timer.textContent = `Tickets held for ${Math.floor(left / 60)}:${String(left % 60).padStart(2, '0')}`;
+            }
+            if (left === 0) {
+                clearInterval(holdTimer);
+                currentBooking.holdToken = null;
+                alert('Your ticket hold has expired, please start again');
+                showBookingStep();
+            }
+        };
+        tick();
+        holdTimer = setInterval(tick, 1000);
+    }
+    
+    // Give held tickets back, e.g. when the customer goes back or closes the modal
+    function releaseHold() {
+        clearInterval(holdTimer);
+        if (!currentBooking.holdToken) return;
+        const body = new URLSearchParams({ holdToken: currentBooking.holdToken });
+        currentBooking.holdToken = null;
+        fetch('http://localhost:8000/api_release_hold.py', { method: 'POST', body: body, keepalive: true }).catch(() => {});
+    }
+    
+    function showSuccessStep(paymentMethod, booking) {
         bookingStep.style.display = 'none';
         paymentStep.style.display = 'none';
         successStep.style.display = 'block';
         
-        // Generate booking reference
-        const bookingRef = 'ITECH-' + Date.now().toString().slice(-6);
+        const bookingRef = booking.bookingReference;
         
         // Get current date
         const today = new Date();
@@ -475,6 +764,10 @@ document.addEventListener('DOMContentLoaded', function() {
             ticketTypeStr = currentBooking.standardQty + ' Standard';
         }
         
+        (booking.seats || []).forEach(block => {
+            ticketTypeStr += ` (${block.section}: ${block.seats.join(', ')})`;
+        });
+        
         // Populate receipt
         document.getElementById('bookingRef').textContent = bookingRef;
         document.getElementById('receiptEvent').textContent = currentBooking.eventName;
@@ -499,17 +792,81 @@ document.addEventListener('DOMContentLoaded', function() {
         payButton.textContent = 'Processing...';
         payButton.disabled = true;
         
-        // Simulate payment processing delay
-        setTimeout(function() {
+        const restoreButton = () => {
             payButton.textContent = originalText;
             payButton.disabled = false;
-            
-            // Show success
-            showSuccessStep(method);
-        }, 2000);
+        };
+        
+        // Turn the hold into a booking; the server collects the payment
+        // in the background and the booking stays pending until it has.
+        // Retrying with the checkout's key replays the original booking
+        // instead of finding the hold already used.
+        fetch('http://localhost:8000/api_book_ticket.py', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'Idempotency-Key': currentBooking.checkoutKey
+            },
+            body: new URLSearchParams({
+                eventId: currentBooking.eventId,
+                holdToken: currentBooking.holdToken,
+                fullName: currentBooking.fullName,
+                email: currentBooking.email,
+                phone: currentBooking.phone,
+                idNumber: currentBooking.idNumber,
+                paymentMethod: method === 'M-Pesa' ? 'mpesa' : 'card'
+            })
+        })
+            .then(response => response.json())
+            .then(result => {
+                if (!result.success) {
+                    alert(result.message || 'Booking failed, please try again');
+                    releaseHold();
+                    showBookingStep();
+                    restoreButton();
+                    return;
+                }
+                clearInterval(holdTimer);
+                currentBooking.holdToken = null;
+                payButton.textContent = method === 'M-Pesa' ? 'Confirm on your phone...' : 'Confirming payment...';
+                waitForPayment(result.data.bookingReference, Date.now() + PAYMENT_WAIT_MS)
+                    .then(status => {
+                        if (status === 'completed') {
+                            showSuccessStep(method, result.data);
+                        } else if (status === 'failed') {
+                            alert('Payment was declined, please try again');
+                            showBookingStep();
+                        } else {
+                            alert(`Payment is still processing. Your booking reference is ${result.data.bookingReference}`);
+                        }
+                    })
+                    .finally(restoreButton);
+            })
+            .catch(() => {
+                alert('Could not reach the booking server, please try again');
+                restoreButton();
+            });
+    }
+    
+    // Poll the booking's payment status until it settles or time runs out
+    const PAYMENT_WAIT_MS = 120000;
+    const PAYMENT_POLL_MS = 1500;
+    
+    function waitForPayment(bookingReference, deadline) {
+        const url = `http://localhost:8000/api_payment_status.py?bookingReference=${encodeURIComponent(bookingReference)}`;
+        return new Promise(resolve => setTimeout(resolve, PAYMENT_POLL_MS))
+            .then(() => fetch(url, { cache: 'no-store' }))
+            .then(response => response.json())
+            .then(result => result.success ? result.data.paymentStatus : 'pending')
+            .catch(() => 'pending')
+            .then(status => {
+                if (status !== 'pending' || Date.now() >= deadline) return status;
+                return waitForPayment(bookingReference, deadline);
+            });
     }
     
     function closeModalFn() {
+        releaseHold();
         modal.style.display = 'none';
         document.body.style.overflow = 'auto';
         
@@ -518,7 +875,77 @@ document.addEventListener('DOMContentLoaded', function() {
         updatePriceSummary();
     }
     
+    // Receipts are rendered on the server after payment; a 202 means the
+    // PDF is still being prepared, so ask again shortly
+    const RECEIPT_ATTEMPTS = 10;
+    
+    function receiptParams() {
+        return `bookingReference=${encodeURIComponent(document.getElementById('bookingRef').textContent)}` +
+            `&email=${encodeURIComponent(currentBooking.email)}`;
+    }
+    
+    function fetchReceipt(attempt) {
+        return fetch(`http://localhost:8000/api_receipt.py?${receiptParams()}&format=pdf`)
+            .then(response => {
+                if (response.status === 202 && attempt < RECEIPT_ATTEMPTS) {
+                    const wait = (parseInt(response.headers.get('Retry-After'), 10) || 1) * 1000;
+                    return new Promise(resolve => setTimeout(resolve, wait)).then(() => fetchReceipt(attempt + 1));
+                }
+                if (!response.ok) {
+                    throw new Error('Receipt unavailable (' + response.status + ')');
+                }
+                return response.blob();
+            });
+    }
+    
     function downloadReceiptFn() {
+        downloadReceipt.disabled = true;
+        fetchReceipt(1)
+            .then(blob => saveBlob(blob, 'iTech_Events_Receipt_' + document.getElementById('bookingRef').textContent + '.pdf'))
+            .catch(error => {
+                console.error('Error:', error);
+                downloadTextReceipt();
+            })
+            .finally(() => {
+                downloadReceipt.disabled = false;
+            });
+    }
+    
+    function emailReceiptFn() {
+        emailReceipt.disabled = true;
+        fetch('http://localhost:8000/api_email_receipt.py', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            body: receiptParams()
+        })
+        .then(response => response.json())
+        .then(result => {
+            alert(result.success ? 'Your receipt will be sent to ' + currentBooking.email : result.message);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Could not send the receipt. Please try again.');
+        })
+        .finally(() => {
+            emailReceipt.disabled = false;
+        });
+    }
+    
+    function saveBlob(blob, filename) {
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = filename;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        window.URL.revokeObjectURL(url);
+    }
+    
+    // Plain-text receipt from the page, used when the server's is unavailable
+    function downloadTextReceipt() {
         // Create receipt content
         const receiptContent = `
 ========================================
@@ -560,16 +987,8 @@ Please present this receipt at the venue entry.
 ========================================
         `.trim();
         
-        // Create blob and download
-        const blob = new Blob([receiptContent], { type: 'text/plain' });
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = 'iTech_Events_Receipt_' + document.getElementById('bookingRef').textContent + '.txt';
-        document.body.appendChild(a);
-        a.click();
-        document.body.removeChild(a);
-        window.URL.revokeObjectURL(url);
+        saveBlob(new Blob([receiptContent], { type: 'text/plain' }),
+            'iTech_Events_Receipt_' + document.getElementById('bookingRef').textContent + '.txt');
     }
     
     // =========================================
@@ -1058,7 +1477,9 @@ Please present this receipt at the venue entry.
             fetch('http://localhost:8000/api_create_event.py', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/x-www-form-urlencoded'
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                    // One key per submission so a retried POST is not applied twice
+                    'Idempotency-Key': newIdempotencyKey()
                 },
                 body: formData.toString()
             })
@@ -0,0 +1,300 @@
+"""
+Seat Inventory Module
+Reserved seating: venue seat maps and per-event seat state as bitsets
+
+A venue is divided into rectangular sections (venue_sections) of
+seat_rows rows by seats_per_row seats; row 0 is the front. Seat i of a
+section is row i // seats_per_row, seat i % seats_per_row. An event's
+state for a section is two bitsets (event_seat_state.sold and .held),
+stored as little-endian blobs and handled as Python ints, so a 50,000
+seat section is about 6 KB per set and whole-section questions are a
+handful of big-integer operations instead of a loop over seats.
+
+Searches run on a copy of the state cached for SEAT_STATE_TTL seconds;
+they only suggest seats. Claiming locks the state row (SELECT ... FOR
+UPDATE) in the booking transaction and fails if any seat was taken.
+
+Usage: python seat_inventory.py   (time the adjacent-seat search)
+"""
+
+import threading
+import time
+
+from db_connection import get_db_connection, close_connection
+
+class SeatConflict(Exception):
+    """Requested seats are already taken, or not enough seats are free"""
+
+def to_blob(bits, size):
+    """Bitset int -> bytes for a section of size seats"""
+    return bits.to_bytes((size + 7) // 8, 'little')
+
+def from_blob(blob):
+    """Stored bytes -> bitset int (an empty or NULL blob is no seats)"""
+    return int.from_bytes(bytes(blob or b''), 'little')
+
+def bit_indexes(bits):
+    """Indexes of the set bits, lowest first"""
+    indexes = []
+    while bits:
+        low = bits & -bits
+        indexes.append(low.bit_length() - 1)
+        bits ^= low
+    return indexes
+
+def row_label(row):
+    """0 -> 'A', 25 -> 'Z', 26 -> 'AA'"""
+    label = ''
+    row += 1
+    while row:
+        row, rem = divmod(row - 1, 26)
+        label = chr(65 + rem) + label
+    return label
+
+class Section:
+    """One rectangular block of seats in a venue"""
+
+    def __init__(self, section_id, name, ticket_type, rows, width):
+        self.id = section_id
+        self.name = name
+        self.ticket_type = ticket_type
+        self.rows = rows
+        self.width = width
+        self.size = rows * width
+        self.all_seats = (1 << self.size) - 1
+        self._starts = {}
+
+    def label(self, index):
+        row, seat = divmod(index, self.width)
+        return f"{row_label(row)}{seat + 1}"
+
+    def valid_starts(self, count):
+        """Bitset of seats where a block of count seats fits without leaving the row"""
+        mask = self._starts.get(count)
+        if mask is None:
+            row = (1 << (self.width - count + 1)) - 1
+            # Repeat the one-row pattern for every row by doubling
+            mask, filled = row, 1
+            while filled < self.rows:
+                step = min(filled, self.rows - filled)
+                mask |= mask << (step * self.width)
+                filled += step
+            self._starts[count] = mask
+        return mask
+
+    def best_block(self, free, count):
+        """
+        Start of the best block of count adjacent free seats: the front-most
+        row that has one, then the block closest to the middle of that row.
+        None if there is no such block.
+        """
+        if count < 1 or count > self.width:
+            return None
+        # Bit i of runs is set when seats i .. i+length-1 are all free
+        runs, length = free, 1
+        while length < count:
+            step = min(length, count - length)
+            runs &= runs >> step
+            length += step
+        runs &= self.valid_starts(count)
+        if not runs:
+            return None
+
+        row = ((runs & -runs).bit_length() - 1) // self.width
+        base = row * self.width
+        starts = (runs >> base) & ((1 << self.width) - 1)
+        centre = (self.width - count) // 2
+        right = starts >> centre
+        left = starts & ((1 << centre) - 1)
+        best = None
+        if right:
+            best = centre + (right & -right).bit_length() - 1
+        if left:
+            nearest_left = left.bit_length() - 1
+            if best is None or centre - nearest_left < best - centre:
+                best = nearest_left
+        return base + best
+
+    def first_free(self, free, count):
+        """The count front-most free seats, adjacent or not; None if too few"""
+        if free.bit_count() < count:
+            return None
+        seats = []
+        while len(seats) < count:
+            low = free & -free
+            seats.append(low.bit_length() - 1)
+            free ^= low
+        return seats
+
+    def mask(self, seats):
+        """Bitset of seat indexes; raises ValueError for seats not in this section or repeated"""
+        bits = 0
+        for seat in seats:
+            if not 0 <= seat < self.size or bits >> seat & 1:
+                raise ValueError(f"Invalid seat {seat} in section {self.name}")
+            bits |= 1 << seat
+        return bits
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'ticketType': self.ticket_type,
+            'rows': self.rows,
+            'seatsPerRow': self.width
+        }
+
+class SeatInventory:
+    """Seat maps and cached per-event seat state for this process"""
+
+    def __init__(self, ttl=2.0):
+        self.ttl = ttl
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def event_state(self, event_id):
+        """
+        (sections, {section_id: (sold, held)}) for an event, from the cache
+        when fresh. sections is empty when the venue has no seat map.
+        """
+        with self._lock:
+            cached = self._events.get(event_id)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1], cached[2]
+
+        conn = get_db_connection(replica=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            sections = load_sections(cursor, event_id)
+            cursor.execute("SELECT section_id, sold, held FROM event_seat_state WHERE event_id = %s", (event_id,))
+            state = {row['section_id']: (from_blob(row['sold']), from_blob(row['held'])) for row in cursor.fetchall()}
+        finally:
+            close_connection(conn)
+        with self._lock:
+            self._events[event_id] = (time.monotonic(), sections, state)
+        return sections, state
+
+    def free_seats(self, section, state):
+        sold, held = state.get(section.id, (0, 0))
+        return section.all_seats & ~(sold | held)
+
+    def best_available(self, event_id, count, section_id=None, ticket_type=None):
+        """
+        Best block of count adjacent seats, searching one section or every
+        section (optionally of one ticket type) in seat-map order. Returns
+        (section, seat indexes) or None.
+        """
+        sections, state = self.event_state(event_id)
+        for section in sections:
+            if section_id is not None and section.id != section_id:
+                continue
+            if ticket_type and section.ticket_type != ticket_type:
+                continue
+            start = section.best_block(self.free_seats(section, state), count)
+            if start is not None:
+                return section, list(range(start, start + count))
+        return None
+
+    def claim(self, cursor, event_id, section, seats, hold=False):
+        """
+        Mark seats sold (or held, for a checkout hold) inside the caller's
+        transaction. Raises SeatConflict if any of them is already taken.
+        """
+        wanted = section.mask(seats)
+        sold, held = lock_state(cursor, event_id, section)
+        if wanted & (sold | held):
+            taken = [section.label(i) for i in bit_indexes(wanted & (sold | held))]
+            raise SeatConflict(f"Seats no longer available: {', '.join(taken)}")
+        if hold:
+            save_state(cursor, event_id, section, sold, held | wanted)
+        else:
+            save_state(cursor, event_id, section, sold | wanted, held)
+
+    def claim_best(self, cursor, event_id, sections, count, hold=False):
+        """
+        Assign count seats from sections (in order) inside the caller's
+        transaction: the best adjacent block if any section has one, else the
+        front-most free seats of the first section with enough. Returns
+        (section, seat indexes); raises SeatConflict if none fit.
+        """
+        locked = [(section, lock_state(cursor, event_id, section)) for section in sections]
+        for picker in ('best_block', 'first_free'):
+            for section, (sold, held) in locked:
+                free = section.all_seats & ~(sold | held)
+                found = getattr(section, picker)(free, count)
+                if found is None:
+                    continue
+                seats = list(range(found, found + count)) if picker == 'best_block' else found
+                wanted = section.mask(seats)
+                if hold:
+                    save_state(cursor, event_id, section, sold, held | wanted)
+                else:
+                    save_state(cursor, event_id, section, sold | wanted, held)
+                return section, seats
+        raise SeatConflict(f"Not enough seats left for {count} tickets")
+
+    def forget(self, event_id):
+        """Drop an event's cached state after this process changed it"""
+        with self._lock:
+            self._events.pop(event_id, None)
+
+def load_sections(cursor, event_id):
+    """Sections of an event's venue, in seat-map order"""
+    cursor.execute("""
+        SELECT s.id, s.name, s.ticket_type, s.seat_rows, s.seats_per_row
+        FROM venue_sections s
+        JOIN events e ON e.venue_id = s.venue_id
+        WHERE e.id = %s
+        ORDER BY s.id
+    """, (event_id,))
+    return [Section(row['id'], row['name'], row['ticket_type'], row['seat_rows'], row['seats_per_row'])
+            for row in cursor.fetchall()]
+
+def lock_state(cursor, event_id, section):
+    """Lock and return (sold, held) for a section, creating its empty row on first use"""
+    cursor.execute("INSERT IGNORE INTO event_seat_state (event_id, section_id) VALUES (%s, %s)",
+                   (event_id, section.id))
+    cursor.execute("""
+        SELECT sold, held FROM event_seat_state
+        WHERE event_id = %s AND section_id = %s FOR UPDATE
+    """, (event_id, section.id))
+    row = cursor.fetchone()
+    return from_blob(row['sold']), from_blob(row['held'])
+
+def save_state(cursor, event_id, section, sold, held):
+    cursor.execute("""
+        UPDATE event_seat_state SET sold = %s, held = %s, version = version + 1
+        WHERE event_id = %s AND section_id = %s
+    """, (to_blob(sold, section.size), to_blob(held, section.size), event_id, section.id))
+
+def release_held(cursor, event_id, section, seats, sell=False):
+    """Clear the held bits of seats, marking them sold instead when sell is true"""
+    wanted = section.mask(seats)
+    sold, held = lock_state(cursor, event_id, section)
+    if sell:
+        sold |= wanted & held
+    save_state(cursor, event_id, section, sold, held & ~wanted)
+
+def release_sold(cursor, event_id, section, seats):
+    """Clear the sold bits of seats, e.g. for a booking whose payment failed"""
+    wanted = section.mask(seats)
+    sold, held = lock_state(cursor, event_id, section)
+    save_state(cursor, event_id, section, sold & ~wanted, held)
+
+if __name__ == '__main__':
+    import random
+    stadium = Section(1, 'Stadium', 'standard', 250, 200)
+    random.seed(1)
+    taken = 0
+    for seat in random.sample(range(stadium.size), stadium.size * 9 // 10):
+        taken |= 1 << seat
+    free = stadium.all_seats & ~taken
+    for count in (1, 2, 4, 8):
+        stadium.best_block(free, count)
+        runs = 2000
+        started = time.perf_counter()
+        for _ in range(runs):
+            start = stadium.best_block(free, count)
+        elapsed = (time.perf_counter() - started) / runs * 1e6
+        where = stadium.label(start) if start is not None else 'none'
+        print(f"{stadium.size} seats, 90% sold, best {count} adjacent: {where} in {elapsed:.1f} us")
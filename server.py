@@ -3,509 +3,25 @@
 Madilu Event Booking System - API Server
 Run this script to start the API server
 Usage: python server.py
-"""
-
-from http.server import HTTPServer, BaseHTTPRequestHandler, SimpleHTTPRequestHandler
-import json
-import urllib.parse
-import os
-from db_connection import get_db_connection, close_connection
-from datetime import datetime
 
-# DateTime Encoder for JSON
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
-
-# API Router
-def handle_request(path, method, headers, post_data=None):
-    """Route request to appropriate handler"""
-    
-    # For GET requests, use query_string from post_data if provided
-    query_string = post_data if method == 'GET' and post_data else ''
-    
-    # For GET requests, also check path for query string (fallback)
-    if method == 'GET' and '?' in path and not query_string:
-        parts = path.split('?', 1)
-        path = parts[0]
-        query_string = parts[1] if len(parts) > 1 else ''
-    
-    # API: Get Events
-    if path == '/api_get_events.py' and method == 'GET':
-        return handle_get_events()
-    
-    # API: Get Merchant Events
-    if path == '/api_get_merchant_events.py' and method == 'GET':
-        return handle_get_merchant_events(query_string)
-    
-    # API: Create Event
-    if path == '/api_create_event.py' and method == 'POST':
-        return handle_create_event(post_data)
-    
-    # API: Update Event
-    if path == '/api_update_event.py' and method == 'POST':
-        return handle_update_event(post_data)
-    
-    # API: Delete Event
-    if path == '/api_delete_event.py' and method == 'POST':
-        return handle_delete_event(post_data)
-    
-    # API: Register Merchant
-    if path == '/api_register_merchant.py' and method == 'POST':
-        return handle_register_merchant(post_data)
-    
-    # API: Login Merchant
-    if path == '/api_login_merchant.py' and method == 'POST':
-        return handle_login_merchant(post_data)
-    
-    # API: Book Ticket
-    if path == '/api_book_ticket.py' and method == 'POST':
-        return handle_book_ticket(post_data)
-    
-    return {'status': 404, 'body': {'success': False, 'message': 'Not found'}}
-
-def handle_get_events():
-    """Handle GET /api_get_events.py"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT e.*, v.name as venue_name, v.address, v.city
-            FROM events e
-            JOIN venues v ON e.venue_id = v.id
-            WHERE e.status = 'published' AND e.event_date >= NOW()
-            ORDER BY e.event_date ASC
-        """)
-        events = cursor.fetchall()
-        
-        for event in events:
-            event['standard_price'] = float(event['standard_price'])
-            event['vip_price'] = float(event['vip_price'])
-            event['event_date_formatted'] = event['event_date'].strftime('%b %d, %Y') if event['event_date'] else ''
-            event['event_date'] = event['event_date'].isoformat() if event['event_date'] else None
-        
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {'success': True, 'data': events}}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
-
-def handle_create_event(post_data):
-    """Handle POST /api_create_event.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        required_fields = ['organizerId', 'title', 'description', 'category', 'eventDate', 'standardPrice', 'vipPrice']
-        for field in required_fields:
-            if field not in data:
-                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
-        
-        organizer_id = int(data['organizerId'])
-        venue_id = data.get('venueId')
-        venue_name = data.get('venueName', '')
-        title = data['title']
-        description = data['description']
-        category = data['category']
-        event_date = data['eventDate']
-        standard_price = float(data['standardPrice'])
-        vip_price = float(data['vipPrice'])
-        image_url = data.get('imageUrl', '')
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify organizer
-        cursor.execute("SELECT id, user_type FROM users WHERE id = %s AND user_type = 'organizer'", (organizer_id,))
-        if not cursor.fetchone():
-            close_connection(conn)
-            return {'status': 400, 'body': {'success': False, 'message': 'Organizer not found'}}
-        
-        # Verify venue
-        if venue_id and str(venue_id).isdigit():
-            cursor.execute("SELECT id FROM venues WHERE id = %s", (venue_id,))
-            if not cursor.fetchone():
-                venue_id = None
-        
-        # Handle venue by name or create default
-        if not venue_id:
-            if venue_name:
-                cursor.execute("SELECT id FROM venues WHERE name = %s", (venue_name,))
-                venue = cursor.fetchone()
-                if venue:
-                    venue_id = venue['id']
-                else:
-                    cursor.execute("""
-                        INSERT INTO venues (name, address, city, capacity, description)
-                        VALUES (%s, 'Address Pending', 'Nairobi', 1000, 'Auto-created venue')
-                    """, (venue_name,))
-                    venue_id = cursor.lastrowid
-                    conn.commit()
-            else:
-                # Create default venue
-                cursor.execute("""
-                    INSERT INTO venues (name, address, city, capacity, description)
-                    VALUES ('Default Venue', 'Nairobi', 'Nairobi', 1000, 'Auto-created default venue')
-                """)
-                venue_id = cursor.lastrowid
-                conn.commit()
-        
-        # Insert event
-        cursor.execute("""
-            INSERT INTO events (organizer_id, venue_id, title, description, category, event_date, standard_price, vip_price, image_url, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'published')
-        """, (organizer_id, venue_id, title, description, category, event_date, standard_price, vip_price, image_url))
-        
-        event_id = cursor.lastrowid
-        
-        # Insert ticket types
-        cursor.execute("""
-            INSERT INTO ticket_types (event_id, type_name, price, available_quantity, sold_quantity)
-            VALUES (%s, 'standard', %s, 1000, 0), (%s, 'vip', %s, 100, 0)
-        """, (event_id, standard_price, event_id, vip_price))
-        
-        conn.commit()
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Event created successfully',
-            'data': {'eventId': event_id, 'title': title, 'eventDate': event_date}
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
-
-def handle_register_merchant(post_data):
-    """Handle POST /api_register_merchant.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        required_fields = ['fullName', 'email', 'phone', 'idNumber', 'password', 'companyName']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
-        
-        full_name = data['fullName']
-        email = data['email']
-        phone = data['phone']
-        id_number = data['idNumber']
-        password = data['password']
-        company_name = data['companyName']
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Check email exists
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            close_connection(conn)
-            return {'status': 400, 'body': {'success': False, 'message': 'Email already registered'}}
-        
-        # Insert user
-        cursor.execute("""
-            INSERT INTO users (full_name, email, phone, id_number, password, user_type)
-            VALUES (%s, %s, %s, %s, %s, 'organizer')
-        """, (full_name, email, phone, id_number, password))
-        
-        user_id = cursor.lastrowid
-        conn.commit()
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Merchant registered successfully',
-            'data': {'id': user_id, 'fullName': full_name, 'email': email, 'companyName': company_name, 'userType': 'organizer'}
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
-
-def handle_login_merchant(post_data):
-    """Handle POST /api_login_merchant.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        required_fields = ['email', 'password']
-        for field in required_fields:
-            if field not in data:
-                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
-        
-        email = data['email']
-        password = data['password']
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify merchant credentials
-        cursor.execute("""
-            SELECT id, full_name, email, phone, user_type 
-            FROM users 
-            WHERE email = %s AND password = %s AND user_type = 'organizer'
-        """, (email, password))
-        
-        merchant = cursor.fetchone()
-        close_connection(conn)
-        
-        if not merchant:
-            return {'status': 401, 'body': {'success': False, 'message': 'Invalid email or password'}}
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Login successful',
-            'data': {
-                'id': merchant['id'],
-                'fullName': merchant['full_name'],
-                'email': merchant['email'],
-                'phone': merchant['phone'],
-                'userType': merchant['user_type']
-            }
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
-
-def handle_get_merchant_events(query_string):
-    """Handle GET /api_get_merchant_events.py"""
-    try:
-        # Parse query parameters
-        params = urllib.parse.parse_qs(query_string)
-        merchant_id = params.get('merchantId', [None])[0]
-
-        if not merchant_id:
-            return {'status': 400, 'body': {'success': False, 'message': 'Missing merchantId parameter'}}
-
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get all events for this merchant
-        cursor.execute("""
-            SELECT e.*, v.name as venue_name, v.address, v.city
-            FROM events e
-            LEFT JOIN venues v ON e.venue_id = v.id
-            WHERE e.organizer_id = %s
-            ORDER BY e.created_at DESC
-        """, (merchant_id,))
-        
-        events = cursor.fetchall()
-
-        # Get ticket sales for each event
-        for event in events:
-            event['standard_price'] = float(event['standard_price'])
-            event['vip_price'] = float(event['vip_price'])
-            event['event_date'] = event['event_date'].isoformat() if event['event_date'] else None
-            event['created_at'] = event['created_at'].isoformat() if event['created_at'] else None
-
-            # Get ticket sales count
-            cursor.execute("""
-                SELECT SUM(bt.quantity) as total_sold
-                FROM booking_tickets bt
-                JOIN ticket_types tt ON bt.ticket_type_id = tt.id
-                WHERE tt.event_id = %s
-            """, (event['id'],))
-            
-            ticket_sales = cursor.fetchone()
-            event['tickets_sold'] = ticket_sales['total_sold'] or 0
-
-            # Calculate revenue
-            event['revenue'] = float(event['standard_price']) * event['tickets_sold']
-            event['views'] = 0
-
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {'success': True, 'data': events}}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
-
-def handle_update_event(post_data):
-    """Handle POST /api_update_event.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        required_fields = ['eventId', 'title', 'description', 'category', 'eventDate', 'standardPrice', 'vipPrice']
-        for field in required_fields:
-            if field not in data:
-                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
-        
-        event_id = data['eventId']
-        title = data['title']
-        description = data['description']
-        category = data['category']
-        event_date = data['eventDate']
-        standard_price = float(data['standardPrice'])
-        vip_price = float(data['vipPrice'])
-        venue_name = data.get('venueName', '')
-        status = data.get('status', 'published')
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify event exists
-        cursor.execute("SELECT id, organizer_id, venue_id FROM events WHERE id = %s", (event_id,))
-        event = cursor.fetchone()
-        
-        if not event:
-            close_connection(conn)
-            return {'status': 404, 'body': {'success': False, 'message': 'Event not found'}}
-        
-        # Handle venue update
-        if venue_name:
-            cursor.execute("SELECT id FROM venues WHERE name = %s", (venue_name,))
-            venue = cursor.fetchone()
-            if venue:
-                venue_id = venue['id']
-            else:
-                cursor.execute("""
-                    INSERT INTO venues (name, address, city, capacity, description)
-                    VALUES (%s, 'Address Pending', 'Nairobi', 1000, 'Auto-created venue')
-                """, (venue_name,))
-                venue_id = cursor.lastrowid
-                conn.commit()
-        else:
-            venue_id = event['venue_id']
-        
-        # Update event
-        cursor.execute("""
-            UPDATE events 
-            SET title = %s, description = %s, category = %s, event_date = %s,
-                standard_price = %s, vip_price = %s, venue_id = %s, status = %s
-            WHERE id = %s
-        """, (title, description, category, event_date, standard_price, vip_price, venue_id, status, event_id))
-        
-        conn.commit()
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Event updated successfully',
-            'data': {'eventId': event_id, 'title': title, 'status': status}
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+This is the development runner: it serves the static site and the API
+from api_core on a ThreadingHTTPServer. Production deployments can run
+wsgi_app.py or asgi_app.py under a multi-worker server instead.
+"""
 
-def handle_delete_event(post_data):
-    """Handle POST /api_delete_event.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        if 'eventId' not in data:
-            return {'status': 400, 'body': {'success': False, 'message': 'Missing eventId parameter'}}
-        
-        event_id = data['eventId']
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Verify event exists
-        cursor.execute("SELECT id, title FROM events WHERE id = %s", (event_id,))
-        event = cursor.fetchone()
-        
-        if not event:
-            close_connection(conn)
-            return {'status': 404, 'body': {'success': False, 'message': 'Event not found'}}
-        
-        # Delete related booking tickets
-        cursor.execute("""
-            DELETE bt FROM booking_tickets bt
-            JOIN ticket_types tt ON bt.ticket_type_id = tt.id
-            WHERE tt.event_id = %s
-        """, (event_id,))
-        
-        # Delete ticket types
-        cursor.execute("DELETE FROM ticket_types WHERE event_id = %s", (event_id,))
-        
-        # Delete the event
-        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
-        
-        conn.commit()
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Event deleted successfully',
-            'data': {'eventId': event_id, 'title': event['title']}
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+import api_core
+import build_assets
+from uploads import RequestBody
 
-def handle_book_ticket(post_data):
-    """Handle POST /api_book_ticket.py"""
-    try:
-        data = urllib.parse.parse_qs(post_data.decode('utf-8'))
-        data = {k: v[0] for k, v in data.items()}
-        
-        required_fields = ['eventId', 'fullName', 'email', 'phone', 'idNumber', 'standardQty', 'vipQty', 'totalAmount']
-        for field in required_fields:
-            if field not in data:
-                return {'status': 400, 'body': {'success': False, 'message': f'Missing required field: {field}'}}
-        
-        event_id = int(data['eventId'])
-        full_name = data['fullName']
-        email = data['email']
-        phone = data['phone']
-        id_number = data['idNumber']
-        standard_qty = int(data['standardQty'])
-        vip_qty = int(data['vipQty'])
-        total_amount = float(data['totalAmount'])
-        payment_method = data.get('paymentMethod', 'mpesa')
-        
-        if standard_qty == 0 and vip_qty == 0:
-            return {'status': 400, 'body': {'success': False, 'message': 'At least one ticket required'}}
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Generate booking reference
-        import random
-        import string
-        ref = 'ITECH-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        
-        # Insert booking
-        cursor.execute("""
-            INSERT INTO bookings (user_id, event_id, booking_reference, full_name, email, phone, id_number, total_amount, payment_method, payment_status)
-            VALUES (1, %s, %s, %s, %s, %s, %s, %s, %s, 'completed')
-        """, (event_id, ref, full_name, email, phone, id_number, total_amount, payment_method))
-        
-        booking_id = cursor.lastrowid
-        
-        # Get ticket types
-        cursor.execute("SELECT id, type_name FROM ticket_types WHERE event_id = %s", (event_id,))
-        ticket_types = cursor.fetchall()
-        
-        for tt in ticket_types:
-            if tt['type_name'] == 'standard' and standard_qty > 0:
-                cursor.execute("""
-                    INSERT INTO booking_tickets (booking_id, ticket_type_id, quantity, unit_price, subtotal)
-                    VALUES (%s, %s, %s, (SELECT standard_price FROM ticket_types WHERE id = %s), %s)
-                """, (booking_id, tt['id'], standard_qty, tt['id'], standard_qty * float(data.get('standardPrice', 0))))
-            elif tt['type_name'] == 'vip' and vip_qty > 0:
-                cursor.execute("""
-                    INSERT INTO booking_tickets (booking_id, ticket_type_id, quantity, unit_price, subtotal)
-                    VALUES (%s, %s, %s, (SELECT vip_price FROM ticket_types WHERE id = %s), %s)
-                """, (booking_id, tt['id'], vip_qty, tt['id'], vip_qty * float(data.get('vipPrice', 0))))
-        
-        conn.commit()
-        close_connection(conn)
-        
-        return {'status': 200, 'body': {
-            'success': True,
-            'message': 'Booking successful',
-            'data': {'bookingReference': ref, 'bookingId': booking_id}
-        }}
-    
-    except Exception as e:
-        return {'status': 500, 'body': {'success': False, 'message': str(e)}}
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
 
 class APIHandler(BaseHTTPRequestHandler):
     """Custom HTTP request handler"""
@@ -522,21 +38,48 @@ class APIHandler(BaseHTTPRequestHandler):
         
         print(f"GET request: path={path}, query={query_string}")
         
+        # Readiness probe, exempt from rate limiting and admission control
+        if path == '/ready':
+            self.send_api_result(api_core.handle_ready())
+            return
+        
         # Check if it's an API endpoint
         if path.startswith('/api_'):
-            result = handle_request(path, 'GET', self.headers, query_string)
-            self.send_response(result['status'])
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
+            self.dispatch(path, 'GET', lambda: query_string)
+        elif path.startswith('/receipts/'):
+            # Receipts are only handed out by the receipt API, which checks
+            # the booking's email; never serve a local receipts/ directory
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/html')
             self.end_headers()
-            self.wfile.write(json.dumps(result['body'], cls=DateTimeEncoder).encode())
+            self.wfile.write(b'<h1>404 - Not Found</h1><p>The requested file was not found.</p>')
         else:
             # Serve static files
             file_path = '.' + path
             if path == '/':
                 file_path = './index.html'
             
+            # Pages come from the latest asset build, if it is up to date
+            cache_control = None
+            if file_path.endswith('.html'):
+                built = build_assets.built_page(file_path[2:])
+                if built:
+                    file_path = './' + built
+                    cache_control = 'no-cache'
+            elif build_assets.is_fingerprinted(path):
+                # Named by content hash, so a URL's content never changes
+                cache_control = 'public, max-age=31536000, immutable'
+            elif path.startswith('/uploads/'):
+                cache_control = 'public, max-age=31536000, immutable'
+            
             if os.path.exists(file_path) and os.path.isfile(file_path):
+                with open(file_path, 'rb') as f:
+                    content = f.read()
+                if os.path.basename(file_path) == 'index.html':
+                    # The first page of events is embedded at request time
+                    content = api_core.render_index(content.decode('utf-8')).encode('utf-8')
+                    cache_control = 'no-cache'
+                
                 self.send_response(200)
                 if file_path.endswith('.html'):
                     self.send_header('Content-Type', 'text/html')
@@ -548,11 +91,19 @@ class APIHandler(BaseHTTPRequestHandler):
                     self.send_header('Content-Type', 'image/png')
                 elif file_path.endswith('.jpg') or file_path.endswith('.jpeg'):
                     self.send_header('Content-Type', 'image/jpeg')
+                elif file_path.endswith('.gif'):
+                    self.send_header('Content-Type', 'image/gif')
+                elif file_path.endswith('.webp'):
+                    self.send_header('Content-Type', 'image/webp')
+                elif file_path.endswith('.json'):
+                    self.send_header('Content-Type', 'application/json')
                 else:
                     self.send_header('Content-Type', 'application/octet-stream')
+                if cache_control:
+                    self.send_header('Cache-Control', cache_control)
+                self.send_header('Content-Length', str(len(content)))
                 self.end_headers()
-                with open(file_path, 'rb') as f:
-                    self.wfile.write(f.read())
+                self.wfile.write(content)
             else:
                 self.send_response(404)
                 self.send_header('Content-Type', 'text/html')
@@ -561,56 +112,249 @@ class APIHandler(BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle POST requests"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        
         # Remove query parameters from path
         path = self.path
         if '?' in path:
             path = path.split('?')[0]
         
-        print(f"POST request: path={path}, data={post_data[:100]}")
-        result = handle_request(path, 'POST', self.headers, post_data)
+        def read_body():
+            content_length = int(self.headers.get('Content-Length', 0))
+            if path in api_core.UPLOAD_ROUTES:
+                # The handler streams these bodies itself
+                return RequestBody(self.rfile, content_length)
+            post_data = self.rfile.read(content_length)
+            print(f"POST request: path={path}, data={post_data[:100]}")
+            return post_data
+        
+        self.dispatch(path, 'POST', read_body)
+    
+    def dispatch(self, path, method, read_data):
+        """Run an API request through api_core and send the result"""
+        result = api_core.dispatch(path, method, self.headers, self.client_address[0], read_data)
+        if result['status'] in (429, 503):
+            # Shed requests also give up the connection
+            self.close_connection = True
+        self.send_api_result(result)
+    
+    def send_api_result(self, result):
+        """Write a handler result as a JSON response, or stream it if it carries a 'stream'"""
+        if 'stream' in result:
+            self.send_stream_result(result)
+            return
+        headers, body = api_core.encode_result(result)
         self.send_response(result['status'])
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in headers:
+            self.send_header(name, value)
+        if getattr(self.server, 'draining', False):
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
-        self.wfile.write(json.dumps(result['body'], cls=DateTimeEncoder).encode())
+        self.wfile.write(body)
+    
+    def send_stream_result(self, result):
+        """
+        Write each chunk of a streaming result as soon as it is produced.
+        HTTP/1.1 clients get chunked transfer encoding, so they can tell a
+        complete response from one cut short; HTTP/1.0 clients read until
+        the connection closes.
+        """
+        stream = result['stream']
+        self.close_connection = True
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.protocol_version = 'HTTP/1.1'
+        try:
+            self.send_response(result['status'])
+            for name, value in api_core.stream_headers(result):
+                self.send_header(name, value)
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for chunk in stream:
+                if not chunk:
+                    continue
+                if chunked:
+                    chunk = b'%x\r\n%s\r\n' % (len(chunk), chunk)
+                self.wfile.write(chunk)
+                self.wfile.flush()
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            # Headers are already sent; dropping the connection without the
+            # final chunk tells the client the response is incomplete
+            print(f"Stream aborted: {e}")
+        finally:
+            stream.close()
     
     def do_OPTIONS(self):
         """Handle CORS preflight"""
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in api_core.CORS_HEADERS:
+            self.send_header(name, value)
         self.end_headers()
     
     def log_message(self, format, *args):
         """Custom log format"""
         print(f"[{self.log_date_time_string()}] {args[0]}")
 
+class DrainingHTTPServer(ThreadingHTTPServer):
+    """
+    Threading server that tracks active connections so shutdown can wait
+    for in-flight requests to finish
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.active_requests = 0
+        self.draining = False
+        self._active_cond = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def process_request_thread(self, request, client_address):
+        with self._active_cond:
+            self.active_requests += 1
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._active_cond:
+                self.active_requests -= 1
+                self._active_cond.notify_all()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for active requests; returns how many remain"""
+        deadline = time.monotonic() + timeout
+        with self._active_cond:
+            while self.active_requests:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._active_cond.wait(remaining)
+            return self.active_requests
+
+def create_server(port):
+    """
+    Create the HTTP server, adopting the listening socket handed over by
+    the previous generation during a hot reload (MADILU_LISTEN_FD)
+    """
+    listen_fd = os.environ.pop('MADILU_LISTEN_FD', None)
+    if not listen_fd:
+        return DrainingHTTPServer(('', port), APIHandler)
+
+    httpd = DrainingHTTPServer(('', port), APIHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = socket.socket(fileno=int(listen_fd))
+    host, httpd.server_port = httpd.socket.getsockname()[:2]
+    httpd.server_name = socket.getfqdn(host)
+    httpd.server_address = (host, httpd.server_port)
+    return httpd
+
+def signal_ready():
+    """Tell the previous generation (if any) that this one is serving"""
+    ready_fd = os.environ.pop('MADILU_READY_FD', None)
+    if ready_fd:
+        os.write(int(ready_fd), b'1')
+        os.close(int(ready_fd))
+
+def spawn_next_generation(httpd):
+    """
+    Start a new server process on the same listening socket and wait until
+    it is ready. Returns True once the new generation is accepting.
+    """
+    listen_fd = httpd.socket.fileno()
+    read_fd, write_fd = os.pipe()
+    env = dict(os.environ, MADILU_LISTEN_FD=str(listen_fd), MADILU_READY_FD=str(write_fd))
+    try:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__)] + sys.argv[1:],
+                                 env=env, pass_fds=(listen_fd, write_fd))
+    finally:
+        os.close(write_fd)
+
+    try:
+        timeout = float(os.getenv('RELOAD_TIMEOUT', 30))
+        readable, _, _ = select.select([read_fd], [], [], timeout)
+        ready = bool(readable) and os.read(read_fd, 1) == b'1'
+    finally:
+        os.close(read_fd)
+
+    if not ready:
+        print("New generation failed to become ready, keeping current one")
+        child.terminate()
+    return ready
+
+def graceful_shutdown(httpd, serve_thread):
+    """Stop accepting, drain in-flight requests with a deadline, then clean up"""
+    httpd.draining = True
+    httpd.shutdown()
+    serve_thread.join()
+    httpd.server_close()
+    # Long-lived streams would otherwise hold the drain open until the deadline
+    api_core.close_streams()
+
+    remaining = httpd.drain(float(os.getenv('DRAIN_TIMEOUT', 30)))
+    if remaining:
+        print(f"Drain deadline reached with {remaining} request(s) still active")
+    api_core.shutdown_resources()
+    print("Server stopped.")
+
 def run_server(port=8000):
-    """Start the API server"""
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, APIHandler)
-    print(f"Madilu API Server running on http://localhost:{port}")
+    """
+    Start the API server.
+    SIGTERM/SIGINT drain in-flight requests and stop; SIGHUP hands the
+    listening socket to a fresh worker generation, then drains and exits.
+    """
+    httpd = create_server(port)
+    api_core.start()
+    print(f"Madilu API Server running on http://localhost:{httpd.server_port}")
     print("Available endpoints:")
     print("  GET  /api_get_events.py           - Get all published events")
     print("  GET  /api_get_merchant_events.py - Get merchant's events (requires merchantId)")
+    print("  GET  /api_get_sales_analytics.py - Hourly/daily sales per event (requires merchantId)")
+    print("  GET  /api_export_bookings.py     - Stream bookings as CSV (requires merchantId, optional eventId)")
+    print("  POST /api_record_view.py         - Count a view of an event")
     print("  POST /api_create_event.py        - Create a new event")
     print("  POST /api_update_event.py        - Update an existing event")
     print("  POST /api_delete_event.py        - Delete an event")
     print("  POST /api_register_merchant.py   - Register as merchant/organizer")
     print("  POST /api_login_merchant.py     - Login as merchant")
     print("  POST /api_book_ticket.py        - Book tickets for an event")
-    print("\nPress Ctrl+C to stop the server")
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\nServer stopped.")
-        httpd.server_close()
+    print("  GET  /api_availability_stream.py - Live remaining tickets (Server-Sent Events, optional eventId)")
+    print("  GET  /ready                      - Readiness and warm-up state")
+    print("\nPress Ctrl+C to stop the server (kill -HUP for a zero-downtime reload)")
+
+    stop_requested = threading.Event()
+    reload_requested = threading.Event()
+
+    def on_stop(signum, frame):
+        stop_requested.set()
+
+    def on_reload(signum, frame):
+        reload_requested.set()
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, on_stop)
+    signal.signal(signal.SIGINT, on_stop)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, on_reload)
+
+    serve_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    serve_thread.start()
+    signal_ready()
+
+    while True:
+        # Short waits keep the main thread responsive to signals
+        while not stop_requested.wait(0.5):
+            pass
+        if reload_requested.is_set():
+            reload_requested.clear()
+            if not spawn_next_generation(httpd):
+                stop_requested.clear()
+                continue
+            print("New generation is serving, draining this one")
+        break
+
+    graceful_shutdown(httpd, serve_thread)
 
 if __name__ == '__main__':
     run_server()
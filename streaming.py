@@ -0,0 +1,151 @@
+"""
+Streaming Module
+Query results encoded and sent as they are read, instead of all at once
+
+stream_query() reads rows through an unbuffered cursor in fetchmany()
+batches, and the encoders turn them into response chunks of roughly
+chunk_size bytes. Memory stays bounded by one batch plus one chunk no
+matter how many rows the query returns.
+"""
+
+import csv
+import io
+import json
+import os
+import re
+
+from db_connection import get_db_connection, close_connection, discard_connection
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading characters that make spreadsheet apps treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Values such as +254712345678, +254 712 345 678 or -500.50 are plain
+# numbers, not formulas
+PLAIN_NUMBER = re.compile(r'[+-]?\d[\d ]*(\.\d+)?')
+
+def stream_query(sql, params=(), batch_size=None, replica=False, pin=None):
+    """
+    Yield the rows of a query one by one, as dicts. The connection is
+    held for the life of the generator and taken from the pool only once
+    iteration starts; replica and pin route it as in get_db_connection().
+    """
+    batch_size = batch_size or int(os.getenv('DB_STREAM_BATCH', 500))
+    conn = get_db_connection(replica=replica, pin=pin)
+    finished = False
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+        finished = True
+    finally:
+        if finished:
+            close_connection(conn)
+        else:
+            # Unread rows are still on the wire; the connection cannot be reused
+            discard_connection(conn)
+
+def started(rows):
+    """
+    Advance a row generator to its first row now, so connection and query
+    errors surface before a response status has been sent. Returns a
+    generator over all rows.
+    """
+    first = next(rows, None)
+
+    def resume():
+        try:
+            if first is not None:
+                yield first
+                yield from rows
+        finally:
+            rows.close()
+    return resume()
+
+class ReleasingStream:
+    """
+    Iterate chunks and call release() exactly once when the stream is
+    closed, even if iteration never started (a generator's finally would
+    not run then). Front ends close every stream they are given.
+    """
+
+    def __init__(self, chunks, release):
+        self.chunks = chunks
+        self.release = release
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        try:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self.release()
+
+def json_chunks(rows, head=b'{"success": true, "data": [', tail=b']}', cls=None, chunk_size=CHUNK_SIZE):
+    """
+    Encode rows as the items of a JSON array wrapped in head and tail,
+    one row at a time; yields byte chunks.
+    """
+    parts = [head]
+    size = len(head)
+    separator = b''
+    try:
+        for row in rows:
+            encoded = separator + json.dumps(row, cls=cls).encode('utf-8')
+            separator = b','
+            parts.append(encoded)
+            size += len(encoded)
+            if size >= chunk_size:
+                yield b''.join(parts)
+                parts = []
+                size = 0
+        parts.append(tail)
+        yield b''.join(parts)
+    finally:
+        if hasattr(rows, 'close'):
+            rows.close()
+
+def csv_cell(value):
+    """Format a value for CSV, neutralising spreadsheet formulas"""
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not PLAIN_NUMBER.fullmatch(value):
+        return "'" + value
+    return str(value)
+
+def csv_chunks(columns, rows, chunk_size=CHUNK_SIZE):
+    """
+    Encode dict rows as CSV. columns is a list of (header, key) pairs;
+    yields UTF-8 byte chunks.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    try:
+        for row in rows:
+            writer.writerow([csv_cell(row[key]) for _, key in columns])
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    finally:
+        # Release the rows' database connection as soon as we stop
+        if hasattr(rows, 'close'):
+            rows.close()
@@ -0,0 +1,22 @@
+"""Uniqueness checks for booking references, run with pytest"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from booking_reference import PREFIX, _generate_many
+
+def test_references_fit_the_column():
+    for ref in _generate_many(1000):
+        assert ref.startswith(PREFIX)
+        assert len(ref) == 20
+
+def test_no_duplicates_across_processes():
+    workers = max(4, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        refs = [ref for batch in pool.map(_generate_many, [50000] * workers) for ref in batch]
+    assert len(set(refs)) == len(refs)
+
+def test_no_duplicates_across_threads():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        refs = [ref for batch in pool.map(_generate_many, [20000] * 8) for ref in batch]
+    assert len(set(refs)) == len(refs)
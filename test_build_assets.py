@@ -0,0 +1,84 @@
+"""Minifier checks for build_assets, run with pytest
+
+The syntax checks on the shipped scripts need node and are skipped
+without it.
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from build_assets import BASE_DIR, fingerprint, minify_css, minify_js, rewrite_references
+
+NODE = shutil.which('node')
+
+def test_css_comments_and_whitespace_are_stripped():
+    source = 'a  >  b {\n  color : red ;  /* note */\n  margin: 0 auto;\n}\n\n.x , .y { padding: 0; }\n'
+    assert minify_css(source) == 'a > b{color :red;margin:0 auto}.x,.y{padding:0}\n'
+
+def test_css_strings_are_kept_verbatim():
+    source = '.q::before { content: "a  /* not a comment */  b"; font-family: \'Open  Sans\'; }'
+    assert minify_css(source) == '.q::before{content:"a  /* not a comment */  b";font-family:\'Open  Sans\'}\n'
+
+def test_css_descendant_space_is_kept():
+    assert minify_css('nav  a:hover { x: 1 }') == 'nav a:hover{x:1}\n'
+
+def test_js_comments_are_stripped_outside_strings():
+    source = 'const s = "// not a comment /* nor this */"; // trailing\n/* block */ let t = \'/*x*/\';\n'
+    assert minify_js(source) == 'const s="// not a comment /* nor this */";let t=\'/*x*/\';\n'
+
+def test_js_regex_literals_are_not_comments_or_division():
+    source = 'const re = /\\/\\*[^/]*\\//g; // strip\nlet a = b / c / d;\nif (x) return /y/.test(a);\n'
+    assert minify_js(source) == 'const re=/\\/\\*[^/]*\\//g;let a=b/c/d;if(x)return/y/.test(a);\n'
+
+def test_js_regex_character_class_may_hold_a_slash():
+    assert minify_js('x = /[/]+/.exec(s)') == 'x=/[/]+/.exec(s)\n'
+
+def test_js_line_breaks_kept_where_asi_needs_them():
+    assert minify_js('let x = a\n++y\nreturn\nz\n') == 'let x=a\n++y\nreturn\nz\n'
+
+def test_js_operators_that_would_merge_keep_a_space():
+    assert minify_js('q = x - -y; r = x + +y; s = a / /re/.source.length') == 'q=x- -y;r=x+ +y;s=a/ /re/.source.length\n'
+
+def test_js_template_literals():
+    source = 'const t = `keep  ${ a /* in */ + `${ b }` } // kept`;'
+    assert minify_js(source) == 'const t=`keep  ${a+`${b}`} // kept`;\n'
+
+def test_unterminated_literals_raise():
+    for source in ('x = "open', 'x = `open', 'x = /open\n'):
+        with pytest.raises(ValueError):
+            minify_js(source)
+
+def test_fingerprint_and_references():
+    built = fingerprint('styles.css', 'a{}')
+    assert built.startswith('dist/styles.') and built.endswith('.css')
+    assert fingerprint('styles.css', 'a{}') == built != fingerprint('styles.css', 'b{}')
+    html = '<link href="styles.css"><script src="script.js?v=1"></script>'
+    assert rewrite_references(html, {'styles.css': built}) == f'<link href="{built}"><script src="script.js?v=1"></script>'
+
+@pytest.mark.skipif(NODE is None, reason='node is not installed')
+@pytest.mark.parametrize('name', ['script.js', 'merchant_dashboard.js'])
+def test_minified_scripts_still_parse(name, tmp_path):
+    with open(os.path.join(BASE_DIR, name), encoding='utf-8') as f:
+        minified = minify_js(f.read())
+    path = tmp_path / name
+    path.write_text(minified, encoding='utf-8')
+    result = subprocess.run([NODE, '--check', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+@pytest.mark.skipif(NODE is None, reason='node is not installed')
+def test_minified_script_behaves_the_same():
+    source = '''
+        const re = /\\/\\*.*?\\*\\//g // comments
+        let a = 10, b = 2, c = 5
+        let x = a / b / c
+        let y = x
+        ++y
+        const s = `${a - -b} ${"/* s */".replace(re, "")} ${x + +y}`
+        console.log(JSON.stringify([x, y, s]))
+    '''
+    outputs = [subprocess.run([NODE, '-e', code], capture_output=True, text=True, check=True).stdout
+               for code in (source, minify_js(source))]
+    assert outputs[0] == outputs[1] == '[1,2,"12  3"]\n'
@@ -0,0 +1,149 @@
+"""Read routing checks for db_connection, run with pytest
+
+The routing tests run against in-memory pools and a fake driver. Set
+DB_REPLICAS (and the usual DB_* settings) to also check routing against
+live MySQL servers.
+"""
+
+import os
+
+import pytest
+
+import db_connection
+
+class FakeError(Exception):
+    pass
+
+class FakeConnection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.in_transaction = False
+        self.open = True
+
+    def is_connected(self):
+        return self.open
+
+    def close(self):
+        self.open = False
+
+class FakeDriver:
+    Error = FakeError
+
+    def __init__(self, down=()):
+        self.down = set(down)
+
+    def connect(self, host, port, **kwargs):
+        if host in self.down:
+            raise FakeError(f"{host} is down")
+        return FakeConnection(host, port)
+
+@pytest.fixture
+def pools(monkeypatch):
+    """A primary and two replicas behind a fake driver; returns the driver"""
+    driver = FakeDriver()
+    monkeypatch.setattr(db_connection, 'mysql_connector', driver)
+    monkeypatch.setattr(db_connection, '_primary', db_connection._Pool('primary', 3306, 4))
+    monkeypatch.setattr(db_connection, '_replicas', [db_connection._Pool('replica-a', 3306, 4),
+                                                     db_connection._Pool('replica-b', 3306, 4)])
+    monkeypatch.setattr(db_connection, '_checked_out', {})
+    monkeypatch.setattr(db_connection, '_pins', {})
+    monkeypatch.setattr(db_connection, '_pool_closed', False)
+    monkeypatch.delenv('DB_REPLICA_STRATEGY', raising=False)
+    return driver
+
+def test_parse_replicas():
+    assert db_connection.parse_replicas(' 10.0.0.2, 10.0.0.3:3307,', 3306) == [('10.0.0.2', 3306), ('10.0.0.3', 3307)]
+
+def test_writes_go_to_the_primary(pools):
+    conn = db_connection.get_db_connection()
+    assert conn.host == 'primary'
+    db_connection.close_connection(conn)
+
+def test_least_load_picks_the_idlest_replica(pools):
+    first = db_connection.get_db_connection(replica=True)
+    second = db_connection.get_db_connection(replica=True)
+    assert {first.host, second.host} == {'replica-a', 'replica-b'}
+    # first's replica is free again, so it is the only least-loaded one
+    db_connection.close_connection(first)
+    for _ in range(4):
+        conn = db_connection.get_db_connection(replica=True)
+        assert conn.host == first.host
+        db_connection.close_connection(conn)
+    db_connection.close_connection(second)
+    assert all(pool.in_use == 0 for pool in db_connection._replicas)
+
+def test_round_robin_alternates(pools, monkeypatch):
+    monkeypatch.setenv('DB_REPLICA_STRATEGY', 'round_robin')
+    hosts = []
+    for _ in range(4):
+        conn = db_connection.get_db_connection(replica=True)
+        hosts.append(conn.host)
+        db_connection.close_connection(conn)
+    assert hosts[0] != hosts[1]
+    assert hosts == hosts[:2] * 2
+
+def test_pin_sends_reads_to_the_primary_until_it_expires(pools, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(db_connection.time, 'monotonic', lambda: clock[0])
+    db_connection.pin_to_primary('merchant:1', seconds=5)
+
+    conn = db_connection.get_db_connection(replica=True, pin='merchant:1')
+    assert conn.host == 'primary'
+    db_connection.close_connection(conn)
+    conn = db_connection.get_db_connection(replica=True, pin='merchant:2')
+    assert conn.host.startswith('replica')
+    db_connection.close_connection(conn)
+
+    clock[0] += 6
+    conn = db_connection.get_db_connection(replica=True, pin='merchant:1')
+    assert conn.host.startswith('replica')
+    db_connection.close_connection(conn)
+    # The next pin drops expired ones
+    db_connection.pin_to_primary('merchant:3', seconds=5)
+    assert list(db_connection._pins) == ['merchant:3']
+
+def test_discard_connection_frees_the_slot_without_pooling(pools):
+    conn = db_connection.get_db_connection(replica=True)
+    pool = db_connection._checked_out[id(conn)]
+    assert pool.in_use == 1
+    db_connection.discard_connection(conn)
+    assert pool.in_use == 0
+    assert pool.idle.qsize() == 0
+    assert not conn.is_connected()
+
+def test_close_connection_returns_it_to_its_pool(pools):
+    conn = db_connection.get_db_connection(replica=True)
+    pool = db_connection._checked_out[id(conn)]
+    db_connection.close_connection(conn)
+    assert pool.in_use == 0
+    assert pool.idle.get_nowait() is conn
+
+def test_failing_replica_is_skipped(pools, monkeypatch):
+    monkeypatch.setenv('DB_REPLICA_STRATEGY', 'round_robin')
+    pools.down.add('replica-a')
+    hosts = set()
+    for _ in range(4):
+        conn = db_connection.get_db_connection(replica=True)
+        hosts.add(conn.host)
+        db_connection.close_connection(conn)
+    assert 'replica-a' not in hosts
+    assert db_connection._replicas[0].down_until > 0
+    assert all(pool.in_use == 0 for pool in [db_connection._primary] + db_connection._replicas)
+
+@pytest.mark.skipif(not os.getenv('DB_REPLICAS'), reason='DB_REPLICAS is not set')
+def test_live_routing():
+    """Reads reach a replica and pinned reads the primary, by @@hostname/@@port"""
+    def server(**kwargs):
+        conn = db_connection.get_db_connection(**kwargs)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT @@hostname, @@port")
+            return cursor.fetchone()
+        finally:
+            db_connection.close_connection(conn)
+
+    primary = server()
+    assert server(replica=True) != primary
+    db_connection.pin_to_primary('test-live-routing')
+    assert server(replica=True, pin='test-live-routing') == primary
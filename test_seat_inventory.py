@@ -0,0 +1,83 @@
+"""Seat bitset checks for seat_inventory, run with pytest"""
+
+import random
+
+import pytest
+
+from seat_inventory import Section, bit_indexes, from_blob, row_label, to_blob
+
+def free_bits(section, taken=()):
+    bits = section.all_seats
+    for seat in taken:
+        bits &= ~(1 << seat)
+    return bits
+
+def brute_best_block(section, free, count):
+    """Front-most row with a block, then the start closest to the middle (ties to the right)"""
+    centre = (section.width - count) // 2
+    for row in range(section.rows):
+        starts = [start for start in range(section.width - count + 1)
+                  if all(free >> (row * section.width + start + k) & 1 for k in range(count))]
+        if starts:
+            return row * section.width + min(starts, key=lambda start: (abs(start - centre), -start))
+    return None
+
+@pytest.mark.parametrize('rows, width', [(1, 1), (1, 7), (3, 4), (5, 10), (7, 9)])
+def test_valid_starts_stay_inside_rows(rows, width):
+    section = Section(1, 'A', 'standard', rows, width)
+    for count in range(1, width + 1):
+        expected = {row * width + start for row in range(rows) for start in range(width - count + 1)}
+        assert set(bit_indexes(section.valid_starts(count))) == expected
+
+def test_block_never_wraps_across_rows():
+    section = Section(1, 'A', 'standard', 2, 5)
+    # Only the last two seats of row A and the first two of row B are free
+    free = (1 << 3) | (1 << 4) | (1 << 5) | (1 << 6)
+    assert section.best_block(free, 2) == 3
+    assert section.best_block(free, 3) is None
+
+def test_block_prefers_the_front_row_then_the_middle():
+    section = Section(1, 'A', 'standard', 3, 10)
+    assert section.best_block(section.all_seats, 2) == 4
+    # Row A is full, so the best pair is in the middle of row B
+    assert section.best_block(free_bits(section, range(10)), 2) == 14
+
+def test_middle_seat_ties_go_right():
+    section = Section(1, 'A', 'standard', 1, 10)
+    # centre is seat 4; seats 2 and 6 are equally far from it
+    assert section.best_block(free_bits(section, [0, 1, 3, 4, 5, 7, 8, 9]), 1) == 6
+    assert section.best_block(free_bits(section, [0, 1, 2, 4, 5, 7, 8, 9]), 1) == 3
+
+def test_block_at_row_edges():
+    section = Section(1, 'A', 'standard', 1, 6)
+    assert section.best_block(free_bits(section, [2, 3, 4, 5]), 2) == 0
+    assert section.best_block(free_bits(section, [0, 1, 2, 3]), 2) == 4
+    assert section.best_block(section.all_seats, 6) == 0
+    assert section.best_block(section.all_seats, 7) is None
+    assert section.best_block(section.all_seats, 0) is None
+
+def test_best_block_matches_brute_force():
+    rng = random.Random(46)
+    for _ in range(300):
+        section = Section(1, 'A', 'standard', rng.randint(1, 6), rng.randint(1, 12))
+        free = free_bits(section, [seat for seat in range(section.size) if rng.random() < 0.4])
+        count = rng.randint(1, section.width)
+        assert section.best_block(free, count) == brute_best_block(section, free, count)
+
+def test_first_free_and_mask():
+    section = Section(1, 'A', 'standard', 2, 4)
+    free = free_bits(section, [0, 2, 3])
+    assert section.first_free(free, 3) == [1, 4, 5]
+    assert section.first_free(free, 6) is None
+    assert section.mask([1, 4]) == 0b10010
+    for seats in ([8], [-1], [1, 1]):
+        with pytest.raises(ValueError):
+            section.mask(seats)
+
+def test_blob_round_trip_and_labels():
+    bits = (1 << 49_999) | (1 << 8) | 1
+    assert len(to_blob(bits, 50_000)) == 6250
+    assert from_blob(to_blob(bits, 50_000)) == bits
+    assert from_blob(None) == 0
+    assert [row_label(row) for row in (0, 25, 26, 701, 702)] == ['A', 'Z', 'AA', 'ZZ', 'AAA']
+    assert Section(1, 'A', 'standard', 30, 10).label(265) == 'AA6'
@@ -0,0 +1,25 @@
+"""CSV cell escaping and stream release checks, run with pytest"""
+
+from streaming import ReleasingStream, csv_cell
+
+def test_formula_cells_are_prefixed():
+    for value in ('=1+1', '+cmd|calc', '-2+3', '@SUM(A1)', '-(1)', '\t=1'):
+        assert csv_cell(value) == "'" + value
+
+def test_plain_numbers_are_left_alone():
+    for value in ('+254712345678', '+254 712 345 678', '-500', '-500.50', 'Jane Doe', 'jane@example.com'):
+        assert csv_cell(value) == value
+
+def test_release_runs_once_when_closed():
+    released = []
+    stream = ReleasingStream(iter([b'a', b'b']), lambda: released.append(1))
+    assert list(stream) == [b'a', b'b']
+    stream.close()
+    stream.close()
+    assert released == [1]
+
+def test_release_runs_for_a_stream_never_read():
+    released = []
+    chunks = (chunk for chunk in [b'a'])
+    ReleasingStream(chunks, lambda: released.append(1)).close()
+    assert released == [1]
@@ -0,0 +1,74 @@
+"""Multipart parsing checks for uploads, run with pytest"""
+
+import io
+
+import pytest
+
+from uploads import UploadError, iter_parts, sniff_image
+
+BOUNDARY = b'----formBoundary7MA4'
+
+class SlowBody:
+    """A body whose read() returns at most step bytes, like a slow socket"""
+
+    def __init__(self, data, step):
+        self.stream = io.BytesIO(data)
+        self.step = step
+
+    def read(self, size=65536):
+        return self.stream.read(min(size, self.step))
+
+def multipart(*parts, preamble=b''):
+    body = preamble
+    for name, data in parts:
+        body += b'--' + BOUNDARY + b'\r\n'
+        body += b'Content-Disposition: form-data; name="' + name + b'"\r\n\r\n' + data + b'\r\n'
+    return body + b'--' + BOUNDARY + b'--\r\n'
+
+def parse(data, step):
+    return [(headers, b''.join(chunks)) for headers, chunks in iter_parts(SlowBody(data, step), BOUNDARY)]
+
+@pytest.mark.parametrize('step', [1, 3, 7, 64, 65536])
+def test_parts_survive_any_read_size(step):
+    image = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 20
+    data = multipart((b'title', b'Concert'), (b'image', image), preamble=b'ignored preamble\r\n')
+    parts = parse(data, step)
+    assert [body for _, body in parts] == [b'Concert', image]
+    assert b'name="image"' in parts[1][0]
+
+@pytest.mark.parametrize('step', [1, 5, 65536])
+def test_near_boundaries_in_data_are_kept(step):
+    # Prefixes of the separator inside the data must not end the part
+    tricky = b'\r\n--' + BOUNDARY[:-1] + b'x\r\n-\r\n--' + b'tail\r'
+    parts = parse(multipart((b'image', tricky), (b'after', b'ok')), step)
+    assert [body for _, body in parts] == [tricky, b'ok']
+
+def test_empty_part():
+    assert parse(multipart((b'empty', b''), (b'next', b'1')), 2) == [
+        (b'Content-Disposition: form-data; name="empty"', b''),
+        (b'Content-Disposition: form-data; name="next"', b'1'),
+    ]
+
+def test_abandoned_part_is_skipped():
+    data = multipart((b'skip', b'x' * 1000), (b'keep', b'wanted'))
+    names = []
+    for headers, chunks in iter_parts(SlowBody(data, 13), BOUNDARY):
+        names.append(headers)
+        if b'keep' in headers:
+            assert b''.join(chunks) == b'wanted'
+    assert len(names) == 2
+
+def test_truncated_body_is_rejected():
+    data = multipart((b'image', b'y' * 500))[:-60]
+    with pytest.raises(UploadError) as raised:
+        parse(data, 16)
+    assert raised.value.status == 400
+
+def test_body_without_boundary_is_rejected():
+    with pytest.raises(UploadError):
+        parse(b'no multipart here', 4)
+
+def test_sniff_image():
+    assert sniff_image(b'\xff\xd8\xff\xe0rest') == ('.jpg', 'image/jpeg')
+    assert sniff_image(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == ('.webp', 'image/webp')
+    assert sniff_image(b'<svg xmlns=') is None
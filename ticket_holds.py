@@ -0,0 +1,204 @@
+"""
+Ticket Holds Module
+Short-lived reservations that keep tickets for a customer while they pay
+
+A hold moves quantity into ticket_types.held_quantity (and sets the held
+bits of its seats, at venues with a seat map) for HOLD_TTL seconds.
+Booking with the hold's token turns the held tickets into sold ones in
+the booking transaction; releasing the hold, or letting it expire, gives
+them back.
+
+Expiry runs off an in-process timer heap: one thread sleeps until the
+earliest deadline and ends exactly the holds that are due. Each process
+schedules the holds it creates plus, at startup, every hold still active
+in the database. A process that dies takes its schedule with it, so the
+same thread also sweeps for overdue active holds every sweep_interval
+seconds, a range read on idx_ticket_holds_active; the holds of a crashed
+worker are therefore ended by its siblings. Ending a hold only acts on an
+active row, so two processes expiring the same hold is harmless.
+"""
+
+import heapq
+import secrets
+import threading
+import time
+
+from db_connection import get_db_connection, close_connection
+from seat_inventory import release_held
+
+TICKET_TYPES = ('standard', 'vip')
+
+def new_hold_token():
+    """Unguessable token that identifies a hold to its customer"""
+    return secrets.token_hex(16)
+
+class HoldExpiry:
+    """
+    Calls expire(hold_id) when each scheduled hold's deadline (a
+    time.time() timestamp) passes, and for overdue active holds found by
+    the periodic sweep. A failed expiry is retried shortly after.
+    """
+
+    def __init__(self, expire, retry_delay=5.0, sweep_interval=30.0):
+        self.expire = expire
+        self.retry_delay = retry_delay
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.time() + sweep_interval
+        self._heap = []
+        self._scheduled = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def schedule(self, hold_id, deadline):
+        """Expire hold_id at deadline, replacing any earlier schedule for it"""
+        with self._cond:
+            self._scheduled[hold_id] = deadline
+            heapq.heappush(self._heap, (deadline, hold_id))
+            if self._heap[0] == (deadline, hold_id):
+                self._cond.notify()
+
+    def cancel(self, hold_id):
+        """Forget a hold that was booked or released; its heap entry is skipped when due"""
+        with self._cond:
+            self._scheduled.pop(hold_id, None)
+
+    def pending(self):
+        """Number of holds waiting to expire"""
+        with self._cond:
+            return len(self._scheduled)
+
+    def load(self):
+        """Schedule every active hold in the database; returns how many"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, expires_at FROM ticket_holds WHERE status = 'active'")
+            rows = cursor.fetchall()
+        finally:
+            close_connection(conn)
+        for hold_id, expires_at in rows:
+            self.schedule(hold_id, expires_at.timestamp())
+        return len(rows)
+
+    def sweep(self, limit=500):
+        """Ids of active holds past their expiry, whichever process made them"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id FROM ticket_holds
+                WHERE status = 'active' AND expires_at < NOW()
+                ORDER BY expires_at LIMIT %s
+            """, (limit,))
+            rows = cursor.fetchall()
+        finally:
+            close_connection(conn)
+        return [hold_id for (hold_id,) in rows]
+
+    def start(self):
+        """Run expiries on a background thread"""
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='hold-expiry', daemon=True)
+            self._thread.start()
+
+    def _due(self):
+        """
+        Wait for the next deadline or sweep; returns the scheduled hold ids
+        now due (possibly none, when a sweep is due), or None when stopped
+        """
+        with self._cond:
+            while not self._stopped:
+                now = time.time()
+                if (self._heap and self._heap[0][0] <= now) or self._next_sweep <= now:
+                    break
+                wake = min(self._heap[0][0], self._next_sweep) if self._heap else self._next_sweep
+                self._cond.wait(wake - now)
+            if self._stopped:
+                return None
+            due = []
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, hold_id = heapq.heappop(self._heap)
+                # Skip cancelled holds and entries superseded by a later schedule
+                if self._scheduled.get(hold_id) == deadline:
+                    del self._scheduled[hold_id]
+                    due.append(hold_id)
+            return due
+
+    def _run(self):
+        while True:
+            due = self._due()
+            if due is None:
+                return
+            if self._next_sweep <= time.time():
+                self._next_sweep = time.time() + self.sweep_interval
+                try:
+                    swept = self.sweep()
+                except Exception as e:
+                    print(f"Hold sweep failed: {e}")
+                    swept = []
+                with self._cond:
+                    for hold_id in swept:
+                        self._scheduled.pop(hold_id, None)
+                due = list(dict.fromkeys(due + swept))
+            for hold_id in due:
+                try:
+                    self.expire(hold_id)
+                except Exception as e:
+                    print(f"Hold {hold_id} expiry failed, will retry: {e}")
+                    self.schedule(hold_id, time.time() + self.retry_delay)
+
+    def stop(self):
+        """Stop the background thread; holds left active expire after the next start"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+def lock_hold(cursor, token=None, hold_id=None):
+    """Lock a hold row by token or id for the rest of the transaction; None if there is none"""
+    column, value = ('hold_token', token) if token is not None else ('id', hold_id)
+    cursor.execute(f"""
+        SELECT id, event_id, standard_qty, vip_qty, status, expires_at
+        FROM ticket_holds WHERE {column} = %s FOR UPDATE
+    """, (value,))
+    return cursor.fetchone()
+
+def held_quantities(hold):
+    """{'standard': n, 'vip': n} of a hold row"""
+    return {type_name: hold[f'{type_name}_qty'] for type_name in TICKET_TYPES}
+
+def held_seats(cursor, hold, sections):
+    """[(section, seat indexes)] held by a hold"""
+    cursor.execute("SELECT section_id, seat_index FROM ticket_hold_seats WHERE hold_id = %s ORDER BY seat_index",
+                   (hold['id'],))
+    by_section = {}
+    for row in cursor.fetchall():
+        by_section.setdefault(row['section_id'], []).append(row['seat_index'])
+    return [(section, by_section[section.id]) for section in sections if section.id in by_section]
+
+def end_hold(cursor, hold, status, sections, booking_id=None):
+    """
+    Finish an active hold inside the caller's transaction. 'booked' moves
+    its tickets and seats to sold for booking_id; 'released' or 'expired'
+    returns them to stock. Returns the hold's seats as [(section, seats)].
+    """
+    cursor.execute("UPDATE ticket_holds SET status = %s, booking_id = %s WHERE id = %s AND status = 'active'",
+                   (status, booking_id, hold['id']))
+    sell = status == 'booked'
+    for type_name, quantity in held_quantities(hold).items():
+        if quantity <= 0:
+            continue
+        cursor.execute("""
+            UPDATE ticket_types
+            SET held_quantity = held_quantity - %s, sold_quantity = sold_quantity + %s
+            WHERE event_id = %s AND type_name = %s
+        """, (quantity, quantity if sell else 0, hold['event_id'], type_name))
+    seats = held_seats(cursor, hold, sections)
+    for section, indexes in seats:
+        release_held(cursor, hold['event_id'], section, indexes, sell=sell)
+    return seats
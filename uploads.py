@@ -0,0 +1,216 @@
+"""
+Uploads Module
+Event images uploaded as multipart/form-data, streamed to content-addressed files
+
+The request body is read in small chunks and the file part is written to
+a temporary file while it is hashed, so memory use does not grow with the
+upload. The finished file is stored as uploads/<sha256>.<ext>: identical
+images share one file, and since a URL's content can never change it may
+be cached forever.
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+READ_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 8 * 1024
+
+# Leading bytes of each accepted format; the client's Content-Type is not trusted
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', '.png', 'image/png'),
+    (b'GIF87a', '.gif', 'image/gif'),
+    (b'GIF89a', '.gif', 'image/gif'),
+)
+
+BOUNDARY = re.compile(r'boundary="?([^";]+)"?')
+FIELD_NAME = re.compile(rb'[;\s]name="([^"]*)"')
+
+class UploadError(Exception):
+    """Rejected upload; status is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class RequestBody:
+    """
+    A request body read incrementally. read(n) returns up to n bytes and
+    b'' once length bytes have been read; a body that ends early raises.
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=READ_SIZE):
+        if self.remaining <= 0:
+            return b''
+        data = self.stream.read(min(size, self.remaining))
+        if not data:
+            raise UploadError(400, 'Upload ended before the declared Content-Length')
+        self.remaining -= len(data)
+        return data
+
+def sniff_image(head):
+    """(extension, content type) for image bytes, or None"""
+    for signature, ext, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext, content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp', 'image/webp'
+    return None
+
+def iter_parts(body, boundary):
+    """
+    Parse a multipart body incrementally. Yields (headers bytes, chunks)
+    for each part, where chunks is an iterator over the part's data; it
+    must be consumed (or abandoned) before asking for the next part.
+    """
+    delimiter = b'--' + boundary
+    separator = b'\r\n' + delimiter
+    buffer = b''
+
+    def fill():
+        nonlocal buffer
+        data = body.read()
+        buffer += data
+        return bool(data)
+
+    # Skip the preamble up to the first delimiter
+    while delimiter not in buffer:
+        if len(buffer) > MAX_HEADER_BYTES or not fill():
+            raise UploadError(400, 'Malformed multipart body')
+    buffer = buffer[buffer.index(delimiter) + len(delimiter):]
+
+    while True:
+        while len(buffer) < 2:
+            if not fill():
+                raise UploadError(400, 'Malformed multipart body')
+        if buffer.startswith(b'--'):
+            return
+        while b'\r\n\r\n' not in buffer:
+            if len(buffer) > MAX_HEADER_BYTES or not fill():
+                raise UploadError(400, 'Malformed multipart body')
+        end = buffer.index(b'\r\n\r\n')
+        headers = buffer[2:end]
+        buffer = buffer[end + 4:]
+        finished = []
+
+        def chunks():
+            nonlocal buffer
+            while True:
+                index = buffer.find(separator)
+                if index >= 0:
+                    data, buffer = buffer[:index], buffer[index + len(separator):]
+                    if data:
+                        yield data
+                    finished.append(True)
+                    return
+                # Keep a tail that could be the start of the separator
+                keep = len(separator) - 1
+                if len(buffer) > keep:
+                    data, buffer = buffer[:-keep], buffer[-keep:]
+                    yield data
+                if not fill():
+                    raise UploadError(400, 'Malformed multipart body')
+
+        part = chunks()
+        yield headers, part
+        if not finished:
+            for _ in part:
+                pass
+
+class ImageStore:
+    """Content-addressed image files under one directory"""
+
+    def __init__(self, directory='uploads', max_bytes=5 * 1024 * 1024, max_pixels=40_000_000):
+        self.directory = os.path.join(BASE_DIR, directory)
+        self.url_prefix = directory.strip('/') + '/'
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def save_upload(self, body, content_type, field='image'):
+        """
+        Store the file in the multipart field named field. Returns a dict
+        with the file's url, sha256, size, content type and whether an
+        identical file was already stored. Raises UploadError.
+        """
+        match = BOUNDARY.search(content_type or '')
+        if not (content_type or '').startswith('multipart/form-data') or not match:
+            raise UploadError(400, 'Expected multipart/form-data')
+        if body.remaining <= 0:
+            raise UploadError(411, 'Content-Length required')
+        # Generous allowance for the other fields and part headers
+        if body.remaining > self.max_bytes + 64 * 1024:
+            raise UploadError(413, f'Image must be at most {self.max_bytes / (1024 * 1024):g} MB')
+
+        for headers, chunks in iter_parts(body, match.group(1).encode('latin-1')):
+            name = FIELD_NAME.search(headers)
+            if name and name.group(1).decode('latin-1') == field and b'filename=' in headers:
+                result = self._store(chunks)
+                # Drain the closing boundary so the connection stays usable
+                while body.read():
+                    pass
+                return result
+        raise UploadError(400, f'Missing file field: {field}')
+
+    def _store(self, chunks):
+        os.makedirs(self.directory, exist_ok=True)
+        temp = os.path.join(self.directory, f".upload-{os.getpid()}-{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        try:
+            with open(temp, 'wb') as f:
+                for data in chunks:
+                    size += len(data)
+                    if size > self.max_bytes:
+                        raise UploadError(413, f'Image must be at most {self.max_bytes / (1024 * 1024):g} MB')
+                    if len(head) < 16:
+                        head += data[:16]
+                    digest.update(data)
+                    f.write(data)
+
+            kind = sniff_image(head)
+            if kind is None:
+                raise UploadError(415, 'Only JPEG, PNG, GIF and WebP images are accepted')
+            ext, content_type = kind
+            self._check_decodes(temp)
+
+            sha256 = digest.hexdigest()
+            name = sha256 + ext
+            path = os.path.join(self.directory, name)
+            existed = os.path.exists(path)
+            if not existed:
+                os.replace(temp, path)
+            return {
+                'url': self.url_prefix + name,
+                'sha256': sha256,
+                'bytes': size,
+                'contentType': content_type,
+                'deduplicated': existed
+            }
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def _check_decodes(self, path):
+        """With Pillow installed, reject corrupt files and decompression bombs"""
+        try:
+            from PIL import Image
+        except ImportError:
+            return
+        try:
+            with Image.open(path) as img:
+                if img.width * img.height > self.max_pixels:
+                    raise UploadError(413, 'Image dimensions are too large')
+                img.verify()
+        except UploadError:
+            raise
+        except Exception:
+            raise UploadError(415, 'Image could not be decoded')
@@ -0,0 +1,106 @@
+"""
+Venue Index Module
+Resolves venue names and ids to venue rows without querying per request
+
+Venue names are unique after normalisation (venues.name_normalized, a
+generated column with a UNIQUE key), so a name maps to exactly one id.
+Names are stored cleaned (trimmed, inner whitespace collapsed; migration
+004 cleaned the existing ones), so LOWER(TRIM(name)) in the database and
+normalize_venue_name() here give the same key.
+The index is loaded at startup and updated whenever this process
+resolves a venue; a miss falls back to an insert-or-get that returns the
+existing row if another process created it first.
+"""
+
+import threading
+
+from db_connection import get_db_connection, close_connection
+
+DEFAULT_VENUE = 'Default Venue'
+
+def clean_venue_name(name):
+    """Trim and collapse whitespace, as stored in venues.name"""
+    return ' '.join((name or '').split())
+
+def normalize_venue_name(name):
+    """Key used for uniqueness; equals name_normalized for a name stored cleaned"""
+    return clean_venue_name(name).lower()
+
+class VenueIndex:
+    """Thread-safe normalized-name -> id map plus the set of known ids"""
+
+    def __init__(self):
+        self._ids_by_name = {}
+        self._ids = set()
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        """Read every venue into the index"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name_normalized FROM venues")
+            rows = cursor.fetchall()
+        finally:
+            close_connection(conn)
+        with self._lock:
+            for venue_id, name in rows:
+                self._ids_by_name[normalize_venue_name(name)] = venue_id
+                self._ids.add(venue_id)
+            self.loaded = True
+        return len(rows)
+
+    def exists(self, venue_id):
+        """True if venue_id is a venue, querying only for ids not seen yet"""
+        with self._lock:
+            if venue_id in self._ids:
+                return True
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name_normalized FROM venues WHERE id = %s", (venue_id,))
+            row = cursor.fetchone()
+        finally:
+            close_connection(conn)
+        if row is None:
+            return False
+        self._remember(normalize_venue_name(row[1]), row[0])
+        return True
+
+    def resolve(self, name):
+        """
+        Return the id of the venue called name, creating it if needed.
+        An empty name resolves to the shared default venue.
+        """
+        name = clean_venue_name(name) or DEFAULT_VENUE
+        key = name.lower()
+        with self._lock:
+            venue_id = self._ids_by_name.get(key)
+        if venue_id is not None:
+            return venue_id
+
+        if name == DEFAULT_VENUE:
+            address, description = 'Nairobi', 'Auto-created default venue'
+        else:
+            address, description = 'Address Pending', 'Auto-created venue'
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            # On a duplicate name LAST_INSERT_ID(id) makes lastrowid the existing row
+            cursor.execute("""
+                INSERT INTO venues (name, address, city, capacity, description)
+                VALUES (%s, %s, 'Nairobi', 1000, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """, (name, address, description))
+            venue_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            close_connection(conn)
+        self._remember(key, venue_id)
+        return venue_id
+
+    def _remember(self, key, venue_id):
+        with self._lock:
+            self._ids_by_name[key] = venue_id
+            self._ids.add(venue_id)
@@ -0,0 +1,103 @@
+"""
+View Counter Module
+Counts event views in memory and writes them to the database in batches
+
+Recording a view only bumps a counter in one of several shards, so page
+views never wait on the database. A background thread periodically swaps
+the shards out and adds the aggregated deltas to event_view_counts in a
+single statement; whatever is still pending is flushed on shutdown.
+"""
+
+import threading
+from collections import Counter
+
+from db_connection import get_db_connection, close_connection
+
+class ViewCounter:
+    """
+    Sharded write-behind counter. Deltas that are being flushed stay
+    visible through pending() until they are committed, and are retried
+    by the next flush if the write fails, so no views are lost.
+    """
+
+    def __init__(self, shards=16, flush_interval=5.0, max_batch=1000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._shards = [(threading.Lock(), Counter()) for _ in range(shards)]
+        self._recorded = [Counter() for _ in range(shards)]
+        self._flushing = Counter()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, event_id, views=1):
+        """Count views of an event"""
+        shard = hash(event_id) % len(self._shards)
+        lock, counts = self._shards[shard]
+        with lock:
+            counts[event_id] += views
+            self._recorded[shard][event_id] += views
+
+    def recorded(self, event_id):
+        """Views recorded for an event by this process so far, flushed or not"""
+        shard = hash(event_id) % len(self._shards)
+        lock, _ = self._shards[shard]
+        with lock:
+            return self._recorded[shard].get(event_id, 0)
+
+    def pending(self, event_id):
+        """Views recorded for an event that are not in the database yet"""
+        lock, counts = self._shards[hash(event_id) % len(self._shards)]
+        with lock:
+            unflushed = counts[event_id] if event_id in counts else 0
+        return unflushed + self._flushing.get(event_id, 0)
+
+    def flush(self):
+        """Write all pending deltas to event_view_counts; returns the number of events written"""
+        with self._flush_lock:
+            for lock, counts in self._shards:
+                with lock:
+                    if counts:
+                        self._flushing.update(counts)
+                        counts.clear()
+            if not self._flushing:
+                return 0
+
+            rows = list(self._flushing.items())
+            try:
+                conn = get_db_connection()
+                try:
+                    cursor = conn.cursor()
+                    for start in range(0, len(rows), self.max_batch):
+                        cursor.executemany("""
+                            INSERT INTO event_view_counts (event_id, views) VALUES (%s, %s)
+                            ON DUPLICATE KEY UPDATE views = views + VALUES(views)
+                        """, rows[start:start + self.max_batch])
+                    conn.commit()
+                finally:
+                    close_connection(conn)
+            except Exception as e:
+                # Keep the deltas in _flushing; the next flush retries them
+                print(f"View count flush failed, will retry: {e}")
+                return 0
+
+            self._flushing.clear()
+            return len(rows)
+
+    def start(self):
+        """Flush every flush_interval seconds on a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the background thread and flush whatever is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
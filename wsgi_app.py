@@ -0,0 +1,77 @@
+"""
+Madilu Event Booking System - WSGI Application
+Serves the API from api_core under any WSGI server
+
+Usage: gunicorn --workers 4 --threads 8 wsgi_app:application
+
+Each worker process warms up when it imports this module, so do not use
+--preload (pooled DB connections must not be shared across a fork).
+Static files are not served here; put the site behind the web server.
+Each open availability stream holds a worker thread.
+"""
+
+import atexit
+from http import HTTPStatus
+
+import api_core
+from uploads import RequestBody
+
+def _status_line(status):
+    return f"{status} {HTTPStatus(status).phrase}"
+
+def request_headers(environ):
+    """Request headers from a WSGI environ, keyed like 'Idempotency-Key'"""
+    headers = {}
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            name = key[5:]
+        elif key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = key
+        else:
+            continue
+        headers['-'.join(part.capitalize() for part in name.split('_'))] = value
+    return headers
+
+def application(environ, start_response):
+    """WSGI entry point"""
+    path = environ.get('PATH_INFO') or '/'
+    method = environ['REQUEST_METHOD']
+
+    if method == 'OPTIONS':
+        start_response('200 OK', api_core.CORS_HEADERS + [('Content-Length', '0')])
+        return [b'']
+
+    if path == '/ready':
+        result = api_core.handle_ready()
+    elif path.startswith('/api_') and method in ('GET', 'POST'):
+        def read_data():
+            if method == 'GET':
+                return environ.get('QUERY_STRING', '')
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            if path in api_core.UPLOAD_ROUTES:
+                return RequestBody(environ['wsgi.input'], length)
+            return environ['wsgi.input'].read(length)
+
+        result = api_core.dispatch(path, method, request_headers(environ),
+                                   environ.get('REMOTE_ADDR', ''), read_data)
+    else:
+        result = {'status': 404, 'body': {'success': False, 'message': 'Not found'}}
+
+    if 'stream' in result:
+        # The server frames the body and calls close() on the generator
+        start_response(_status_line(result['status']), api_core.stream_headers(result))
+        return result['stream']
+
+    headers, body = api_core.encode_result(result)
+    start_response(_status_line(result['status']), headers)
+    return [body]
+
+def _shutdown():
+    api_core.close_streams()
+    api_core.shutdown_resources()
+
+api_core.start()
+atexit.register(_shutdown)
+
+# Some servers look for "app" by default
+app = application